@@ -0,0 +1,52 @@
+"""Confronta i backend `PICKLE` e `SQLITE` di `caching.persist_to_file` su cache miss consecutivi,
+con e senza scrittura differita (`write_behind`).
+
+Con il backend `PICKLE` ogni cache miss riscrive l'intero file (I/O quadratico nel numero
+di voci), mentre con il backend `SQLITE` viene scritta solo la riga della nuova chiave. Con
+la scrittura differita le nuove voci vengono scritte insieme ogni `DEFAULT_FLUSH_EVERY` miss.
+
+Uso:
+    python -m scripts.benchmarks.caching [numero_chiavi]
+"""
+
+from pathlib import Path
+import sys
+import tempfile
+import time
+
+from veryeasyfatt.app import caching
+from scripts.benchmarks.documenti_cache import dimensione
+
+
+def misura_miss(
+    file_name: Path, backend: caching.Backend, chiavi: int, write_behind: bool = False
+) -> float:
+    """Esegue `chiavi` cache miss consecutivi e restituisce il tempo impiegato (scrittura finale compresa)."""
+
+    @caching.persist_to_file(file_name, backend=backend, write_behind=write_behind)
+    def geocodifica(indirizzo: str) -> tuple[float, float, float]:
+        return (len(indirizzo) / 10, len(indirizzo) / 20, 0.0)
+
+    inizio = time.perf_counter()
+    for numero in range(chiavi):
+        geocodifica(f"VIA DEL CORSO, {numero} 00186 ROMA RM")
+    geocodifica.flush()
+
+    return time.perf_counter() - inizio
+
+
+def main(chiavi: int) -> None:
+    print(f"Cache miss consecutivi: {chiavi}\n")
+
+    with tempfile.TemporaryDirectory() as cartella:
+        for backend in [caching.Backend.PICKLE, caching.Backend.SQLITE]:
+            for write_behind in [False, True]:
+                nome = f"{backend.name}{' (write-behind)' if write_behind else ''}"
+                file_name = Path(cartella) / f"locations-{write_behind}.{backend.value}"
+                tempo = misura_miss(file_name, backend, chiavi, write_behind)
+
+                print(f"{nome:<26} {tempo:8.3f}s  ({dimensione(file_name):.2f} MB)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
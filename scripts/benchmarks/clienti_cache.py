@@ -0,0 +1,124 @@
+"""Confronta la cache colonnare dei dati cliente con la cache precedente (pickle di una lista di dizionari),
+e la lettura completa del file (`pd.read_excel`) con quella delle sole colonne usate (`leggi_foglio`).
+
+Se non viene passato un file, ne viene generato uno sintetico (`.xlsx`) con il numero di clienti indicato.
+
+Uso:
+    python -m scripts.benchmarks.clienti_cache [numero_clienti | Soggetti.xlsx]
+"""
+
+from pathlib import Path
+import pickle
+import sys
+import tempfile
+
+import pandas as pd
+
+from veryeasyfatt.app.clienti import (
+    CACHE_DIRNAME,
+    COLONNE_IDENTIFICATIVE,
+    get_customers_dataframe,
+)
+from veryeasyfatt.app.fogli import leggi_foglio
+from scripts.benchmarks.documenti_cache import dimensione
+from scripts.benchmarks.xml_parser import misura
+
+COLONNE_EXPORT = [
+    "Cod.",
+    "Denominazione",
+    "Indirizzo",
+    "Cap",
+    "Città",
+    "Prov.",
+    "Regione",
+    "Nazione",
+    "Referente",
+    "Tel.",
+    "Cell",
+    "Fax",
+    "e-mail",
+    "Pec",
+    "Codice fiscale",
+    "Partita Iva",
+    "Sconti",
+    "Listino",
+    "Fido",
+    "Pagamento",
+    "Banca",
+    "Agente",
+    "Note",
+    "Extra 1",
+    "Extra 2",
+    "Extra 3",
+    "Extra 4",
+    "Extra 5",
+    "Extra 6",
+]
+""" Colonne principali dell'export dei clienti di Easyfatt. """
+
+
+def genera_export(destinazione: Path, clienti: int) -> None:
+    """Genera un export sintetico dei clienti di Easyfatt con il numero di clienti indicato."""
+    pd.DataFrame(
+        {
+            colonna: [
+                (
+                    f"{codice:05d}"
+                    if colonna == "Cod."
+                    else (
+                        ["8 a 12", "7-16", "", "14 >> 18"][codice % 4]
+                        if colonna == "Extra 1"
+                        else f"{colonna} {codice % 500}"
+                    )
+                )
+                for codice in range(clienti)
+            ]
+            for colonna in COLONNE_EXPORT
+        }
+    ).to_excel(destinazione, index=False)
+
+
+def main(export: Path) -> None:
+    print(f"File: {export} ({dimensione(export):.1f} MB)\n")
+
+    misura("pd.read_excel (tutte le colonne)", lambda: pd.read_excel(export, dtype=str))
+    misura(
+        "leggi_foglio (colonne usate)",
+        lambda: leggi_foglio(export, ["Cod.", "Extra 1", *COLONNE_IDENTIFICATIVE]),
+    )
+    print()
+
+    with tempfile.TemporaryDirectory() as cartella:
+        dataframe = get_customers_dataframe(export, cache_path=cartella)
+
+        # Cache precedente: pickle della lista di dizionari
+        pickle_file = Path(cartella) / "customer_info.pickle"
+        with open(pickle_file, "wb") as file:
+            pickle.dump({"data": dataframe.to_dict("records")}, file)
+
+        misura(
+            "pickle lista di dizionari -> DataFrame",
+            lambda: pd.DataFrame(pickle.loads(pickle_file.read_bytes())["data"]),
+        )
+        misura(
+            "cache colonnare -> DataFrame",
+            lambda: get_customers_dataframe(export, cache_path=cartella),
+        )
+
+        print()
+        print(f"Dimensione pickle:          {dimensione(pickle_file):.2f} MB")
+        print(
+            f"Dimensione cache colonnare: {dimensione(Path(cartella) / CACHE_DIRNAME):.2f} MB"
+        )
+
+
+if __name__ == "__main__":
+    argomento = sys.argv[1] if len(sys.argv) > 1 else "20000"
+
+    if argomento.isdigit():
+        with tempfile.TemporaryDirectory() as cartella:
+            export = Path(cartella) / "Soggetti.xlsx"
+            genera_export(export, int(argomento))
+            main(export)
+    else:
+        main(Path(argomento))
@@ -0,0 +1,65 @@
+"""Confronta la lettura dei documenti dall'XML con il caricamento dalla cache dei documenti.
+
+Se non viene passato un file, ne viene generato uno sintetico con il numero di documenti indicato.
+
+Uso:
+    python -m scripts.benchmarks.documenti_cache [numero_documenti | file.DefXml]
+"""
+
+from pathlib import Path
+import pickle
+import sys
+import tempfile
+
+from veryeasyfatt.app.documenti import CacheDocumenti, DocumentiEasyfatt
+from scripts.benchmarks.xml_parser import genera_export, misura
+
+
+def dimensione(percorso: Path) -> float:
+    """Dimensione (in MB) di un file o di una cartella."""
+    file = [percorso] if percorso.is_file() else percorso.rglob("*")
+    return sum(f.stat().st_size for f in file if f.is_file()) / 1024 / 1024
+
+
+def main(export: Path, copia: Path) -> None:
+    print(f"File: {export} ({dimensione(export):.1f} MB)\n")
+
+    with tempfile.TemporaryDirectory() as cartella:
+        cache = CacheDocumenti(Path(cartella) / "documenti")
+        documenti = DocumentiEasyfatt(export)
+        for _ in cache.salva(export, documenti.blocchi()):
+            pass
+        dataframe = documenti.dataframe
+
+        pickle_file = Path(cartella) / "documenti.pickle"
+        with open(pickle_file, "wb") as file:
+            pickle.dump(dataframe, file)
+
+        misura("lettura XML", lambda: DocumentiEasyfatt(export).dataframe)
+        misura(
+            "cache (dimensione e data di modifica)",
+            lambda: list(cache.carica(export) or []),
+        )
+        misura("cache (hash del contenuto)", lambda: list(cache.carica(copia) or []))
+        misura("pickle del DataFrame", lambda: pickle.loads(pickle_file.read_bytes()))
+
+        print()
+        print(f"Dimensione cache:  {dimensione(cache.cartella):.1f} MB")
+        print(f"Dimensione pickle: {dimensione(pickle_file):.1f} MB")
+
+
+if __name__ == "__main__":
+    argomento = sys.argv[1] if len(sys.argv) > 1 else "50000"
+
+    with tempfile.TemporaryDirectory() as cartella:
+        if argomento.isdigit():
+            export = Path(cartella) / "Documenti.DefXml"
+            genera_export(export, int(argomento))
+        else:
+            export = Path(argomento)
+
+        # Stesso contenuto, data di modifica diversa (es. export ripetuto)
+        copia = Path(cartella) / "Copia.DefXml"
+        copia.write_bytes(export.read_bytes())
+
+        main(export, copia)
@@ -0,0 +1,71 @@
+"""Confronta il calcolo del peso totale con `pint` (riga per riga) e con `parse_weights`.
+
+Uso:
+    python -m scripts.benchmarks.weights [numero_righe]
+"""
+
+import random
+import sys
+import timeit
+
+import pandas as pd
+
+from veryeasyfatt.shared.measuring import get_unit_registry
+from veryeasyfatt.shared.weights import parse_weights
+
+
+def genera_pesi(righe: int) -> pd.Series:
+    """Genera una colonna di pesi nel formato esportato da Easyfatt."""
+    random.seed(0)
+    unita = ["Kg", "kg", "g", "q", "t"]
+
+    return pd.Series(
+        [
+            (
+                None
+                if random.random() < 0.1
+                else f"{random.randint(0, 2000):,}".replace(",", ".")
+                + f",{random.randint(0, 99)} {random.choice(unita)}"
+            )
+            for _ in range(righe)
+        ],
+        dtype=object,
+    )
+
+
+def con_pint(pesi: pd.Series) -> float:
+    """Implementazione precedente: un `Quantity` di `pint` per ogni riga."""
+    unit_registry = get_unit_registry()
+
+    return pesi.map(
+        lambda v: (
+            v
+            if (v is None or pd.isnull(v))
+            else unit_registry.Quantity(
+                str(v).replace(".", "").replace(",", ".").lower()
+            )
+            .to("g")
+            .magnitude
+        )
+    ).sum()
+
+
+def main(righe: int = 100_000) -> None:
+    pesi = genera_pesi(righe)
+    get_unit_registry()  # Escludo dalla misura la creazione del registro
+
+    assert abs(con_pint(pesi) - parse_weights(pesi).sum()) < 1e-6 * abs(con_pint(pesi))
+
+    tempo_pint = min(timeit.repeat(lambda: con_pint(pesi), number=1, repeat=3))
+    tempo_vettoriale = min(
+        timeit.repeat(lambda: parse_weights(pesi).sum(), number=1, repeat=3)
+    )
+
+    print(f"Righe:          {righe}")
+    print(f"pint:           {tempo_pint:.3f}s")
+    print(f"parse_weights:  {tempo_vettoriale:.3f}s")
+    print(f"Speed-up:       {tempo_pint / tempo_vettoriale:.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
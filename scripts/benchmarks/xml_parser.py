@@ -0,0 +1,85 @@
+"""Confronta le librerie XML supportate (`lxml` e `xml.etree`) su un export di Easyfatt.
+
+Se non viene passato un file, ne viene generato uno sintetico con il numero di documenti indicato.
+
+Uso:
+    python -m scripts.benchmarks.xml_parser [numero_documenti | file.DefXml]
+"""
+
+from pathlib import Path
+import sys
+import tempfile
+import timeit
+
+from veryeasyfatt.app.documenti import leggi_documenti
+from veryeasyfatt.app.xml_parser import carica_backend, lxml_disponibile
+
+DOCUMENTO = """
+    <Document>
+        <CustomerCode>{codice:05d}</CustomerCode>
+        <CustomerName>Cliente {codice}</CustomerName>
+        <CustomerAddress>VIA TUSCOLANA, {codice}</CustomerAddress>
+        <CustomerPostcode>00182</CustomerPostcode>
+        <CustomerCity>ROMA</CustomerCity>
+        <CustomerProvince>RM</CustomerProvince>
+        <DeliveryAddress>VIA APPIA, {codice}</DeliveryAddress>
+        <DeliveryPostcode>00179</DeliveryPostcode>
+        <DeliveryCity>ROMA</DeliveryCity>
+        <DocumentType>C</DocumentType>
+        <Date>2023-01-30</Date>
+        <Number>{codice}</Number>
+        <TransportedWeight>12,5 Kg</TransportedWeight>
+        <CustomField4>8 a 12</CustomField4>
+        <Rows>
+            <Row><Code>A{codice}</Code><Description>Articolo di prova</Description><Qty>1</Qty><Price>10</Price></Row>
+            <Row><Code>B{codice}</Code><Description>Articolo di prova</Description><Qty>2</Qty><Price>20</Price></Row>
+        </Rows>
+    </Document>"""
+
+
+def genera_export(destinazione: Path, documenti: int) -> None:
+    """Genera un export sintetico di Easyfatt con il numero di documenti indicato."""
+    with open(destinazione, "w", encoding="utf-8") as file:
+        file.write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n<EasyfattDocuments AppVersion="2">\n'
+        )
+        file.write("<Company><Name>ACME Inc.</Name></Company>\n<Documents>")
+        for codice in range(documenti):
+            file.write(DOCUMENTO.format(codice=codice))
+        file.write("\n</Documents>\n</EasyfattDocuments>\n")
+
+
+def misura(descrizione: str, funzione) -> None:
+    print(f"{descrizione:<40} {min(timeit.repeat(funzione, number=1, repeat=3)):.3f}s")
+
+
+def main(export: Path) -> None:
+    print(f"File: {export} ({export.stat().st_size / 1024 / 1024:.1f} MB)\n")
+
+    backends = ["etree", "lxml"] if lxml_disponibile() else ["etree"]
+    for backend in backends:
+        etree = carica_backend(backend)
+
+        misura(
+            f"[{backend}] lettura incrementale documenti",
+            lambda: sum(
+                len(blocco) for blocco in leggi_documenti(export, backend=backend)
+            ),
+        )
+        misura(f"[{backend}] parse albero completo", lambda: etree.parse(str(export)))
+
+        albero = etree.parse(str(export))
+        misura(f"[{backend}] serializzazione", lambda: etree.tostring(albero.getroot()))
+        print()
+
+
+if __name__ == "__main__":
+    argomento = sys.argv[1] if len(sys.argv) > 1 else "50000"
+
+    if argomento.isdigit():
+        with tempfile.TemporaryDirectory() as cartella:
+            export = Path(cartella) / "Documenti.DefXml"
+            genera_export(export, int(argomento))
+            main(export)
+    else:
+        main(Path(argomento))
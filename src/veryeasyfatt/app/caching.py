@@ -1,20 +1,124 @@
+import atexit
+import dataclasses
 import enum
 import logging
+import os
+import stat
+import tempfile
+import threading
+import time
 import types
-from typing import Any as _Any, Literal as _Literal, Union as _Union
+from typing import (
+    Any as _Any,
+    Literal as _Literal,
+    Union as _Union,
+    Optional as _Optional,
+)
 from pathlib import Path as _Path
 import datetime as _datetime
 
 import pickle as _pickle
 import json as _json
+import sqlite3 as _sqlite3
 
 logger = logging.getLogger("danea-easyfatt.caching")
 logger.addHandler(logging.NullHandler())
 
+CACHE_VERSION = "1"
+""" Version of the cache format (stored in the metadata of every backend). """
+
+DEFAULT_FLUSH_EVERY = 100
+""" Number of pending entries written together in write-behind mode. """
+
+DEFAULT_FLUSH_INTERVAL = 30.0
+""" Maximum number of seconds (between two misses) new entries are kept pending in write-behind mode. """
+
+
+def _current_umask() -> int:
+    # The umask can only be read by replacing it
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+_UMASK = _current_umask()
+""" Umask of the process (read once, as reading it is not thread-safe). """
+
+
+def file_mode(file_name: _Path) -> int:
+    """Returns the permissions of the file, or the default ones if it does not exist."""
+    try:
+        return stat.S_IMODE(os.stat(file_name).st_mode)
+    except FileNotFoundError:
+        return 0o666 & ~_UMASK
+
 
 class Backend(enum.Enum):
     JSON = "json"
     PICKLE = "pickle"
+    SQLITE = "sqlite"
+
+
+@dataclasses.dataclass(frozen=True)
+class CacheStats:
+    """Statistics of a cache, as returned by the `stats()` method of a decorated function."""
+
+    entries: int
+    """ Number of entries in the cache (including the ones not written yet). """
+
+    bytes_on_disk: int
+    """ Size of the cache file(s). """
+
+    evictions: int
+    """ Number of entries evicted since the function was decorated. """
+
+
+@dataclasses.dataclass
+class CacheMetrics:
+    """Counters of a cached function, available as the `metrics` attribute of the decorated function."""
+
+    hits: int = 0
+    misses: int = 0
+
+    disabled: int = 0
+    """ Calls with the cache disabled (also counted as hits or misses). """
+
+    compute_seconds: float = 0.0
+    """ Time spent in the decorated function (on misses). """
+
+    serialization_seconds: float = 0.0
+    """ Time spent loading, reading and writing the cache. """
+
+    bytes_written: int = 0
+    """ Bytes written to the cache file(s). """
+
+    @property
+    def calls(self) -> int:
+        return self.hits + self.misses
+
+    @property
+    def hit_ratio(self) -> float:
+        return self.hits / self.calls if self.calls else 0.0
+
+    def __sub__(self, other: "CacheMetrics") -> "CacheMetrics":
+        """Returns the counters accumulated since `other` (a copy taken earlier)."""
+        return CacheMetrics(
+            **{
+                field.name: getattr(self, field.name) - getattr(other, field.name)
+                for field in dataclasses.fields(self)
+            }
+        )
+
+    def copy(self) -> "CacheMetrics":
+        return dataclasses.replace(self)
+
+    def to_dict(self) -> dict[str, _Any]:
+        """Returns the counters (with the number of calls and the hit ratio) as a JSON serializable dictionary."""
+        return {
+            **dataclasses.asdict(self),
+            "calls": self.calls,
+            "hit_ratio": self.hit_ratio,
+        }
 
 
 def persist_to_file(
@@ -22,19 +126,64 @@ def persist_to_file(
     backend: Backend = Backend.PICKLE,
     include=[],
     enabled: bool | str = True,
+    migrate_from: _Union[str, _Path, None] = None,
+    write_behind: bool = False,
+    flush_every: _Optional[int] = DEFAULT_FLUSH_EVERY,
+    flush_interval: _Optional[float] = DEFAULT_FLUSH_INTERVAL,
+    max_entries: _Optional[int] = None,
+    max_bytes: _Optional[int] = None,
+    ttl: _Optional[float] = None,
 ):
     """Decorator that caches the result of a function to a file.
 
     Source: https://stackoverflow.com/a/16464555/8965861
 
+    With the `JSON` and `PICKLE` backends the whole cache is loaded at once and written
+    again on every cache miss. With the `SQLITE` backend every key
+    is stored as a row of a SQLite database (in WAL mode): keys are looked up through the
+    primary key index only when needed, and a cache miss only writes its own row.
+
+    Nothing is read from disk when the function is decorated (usually at import time):
+    the cache is loaded (or the database opened) on the first call, or earlier by calling
+    `warm()` on the decorated function (optionally in a background thread).
+
+    With `write_behind=True` new entries are kept in memory and written together: when
+    `flush_every` entries are pending, when `flush_interval` seconds have passed since the
+    last write (both checked when a new entry is added), when `flush()` is called on the
+    decorated function and at interpreter exit. Files are always replaced atomically
+    (written to a temporary file, then renamed), so an interrupted write can not
+    corrupt the cache.
+
+    The cache can be bounded with `max_entries`, `max_bytes` (size of the serialized keys
+    and values) and `ttl` (seconds since an entry was written, after which it is a miss).
+    The limits are applied when the cache is written: expired entries are removed first,
+    then the least recently used ones (by the time of the last hit, stored with every entry)
+    until the cache fits. When a limit is set, the time of the hits is also written at
+    interpreter exit.
+
+    Hits, misses, calls with the cache disabled, the time spent in the decorated function
+    and in (de)serialization and the bytes written are counted in the `CacheMetrics`
+    available as the `metrics` attribute of the decorated function.
+
     Args:
         file_name (str): The name of the file where to store the cache.
         backend (Backend, optional): The backend to use for caching. Defaults to Backend.PICKLE.
         include (list, optional): The list of arguments to include in the cache key. Defaults to all arguments.
         enabled (bool | str, optional): Whether caching is enabled. Can be a boolean or the name of a keyword argument. Defaults to True.
+        migrate_from (str | Path, optional): A pickle cache (written by this decorator with `Backend.PICKLE`) whose entries
+            are imported when the `SQLITE` database is created. Defaults to None.
+        write_behind (bool, optional): Whether to write new entries in batches instead of on every miss. Defaults to False.
+        flush_every (int, optional): Number of pending entries that triggers a write (`None` to disable). Defaults to DEFAULT_FLUSH_EVERY.
+        flush_interval (float, optional): Seconds since the last write after which a new entry triggers a write (`None` to disable). Defaults to DEFAULT_FLUSH_INTERVAL.
+        max_entries (int, optional): Maximum number of entries kept in the cache. Defaults to None (no limit).
+        max_bytes (int, optional): Maximum size (in bytes) of the entries kept in the cache. Defaults to None (no limit).
+        ttl (float, optional): Seconds after which an entry expires. Defaults to None (never).
 
     Returns:
-        function: The decorated function.
+        function: The decorated function, with a `flush()` method that writes the pending entries,
+            a `warm(background=False)` method that loads the cache before the first call,
+            a `stats()` method that returns the `CacheStats` of the cache and a `metrics`
+            attribute with its `CacheMetrics`.
 
     Example:
         ```python
@@ -62,37 +211,60 @@ def persist_to_file(
         def yet_another_expensive_function(x, use_cache=True):
             # Expensive computation here
             return x * 2
+
+        # Store every key as a row of a SQLite database, importing the old pickle cache
+        @persist_to_file(
+            "cache.sqlite",
+            backend=Backend.SQLITE,
+            migrate_from="cache.pickle",
+        )
+        def one_more_expensive_function(x):
+            # Expensive computation here
+            return x ** 2
+
+        # Write the new entries every 100 misses (or 30 seconds), and at exit
+        @persist_to_file(
+            "cache.pickle",
+            write_behind=True,
+            flush_every=100,
+            flush_interval=30,
+        )
+        def batched_expensive_function(x):
+            # Expensive computation here
+            return x + 1
+
+        batched_expensive_function.flush()  # Write the pending entries now
+
+        # Keep at most 1000 entries, recomputing the ones older than a day
+        @persist_to_file("cache.pickle", max_entries=1000, ttl=24 * 60 * 60)
+        def bounded_expensive_function(x):
+            # Expensive computation here
+            return x - 1
+
+        bounded_expensive_function.stats()  # CacheStats(entries=..., bytes_on_disk=..., evictions=...)
+        bounded_expensive_function.metrics.hits  # Number of cache hits
+
+        # Load the cache in a background thread, while doing something else
+        expensive_function.warm(background=True)
         ```
     """
-    cache_backend: types.ModuleType
-    read_mode: _Literal["r", "rb"]
-    write_mode: _Literal["w", "wb"]
-
-    if backend == Backend.PICKLE:
-        cache_backend = _pickle
-        read_mode = "rb"
-        write_mode = "wb"
-    elif backend == Backend.JSON:
-        cache_backend = _json
-        read_mode = "r"
-        write_mode = "w"
-    else:
+    if not isinstance(backend, Backend):
         raise ValueError(f"Invalid backend: {backend}")
 
     def decorator(original_func):
-        cache = {
-            "data": {},
-            "metadata": {
-                "version": "1",
-                "date": _datetime.datetime.now(),
-            },
-        }
+        store: _Store
+        if backend == Backend.SQLITE:
+            store = _SQLiteStore(file_name, migrate_from=migrate_from)
+        else:
+            store = _FileStore(file_name, backend)
 
-        try:
-            with open(file_name, read_mode) as f:
-                cache = cache_backend.load(f)
-        except (IOError, ValueError):
-            pass
+        if write_behind:
+            store.write_behind(flush_every, flush_interval)
+
+        store.evict_when(max_entries=max_entries, max_bytes=max_bytes, ttl=ttl)
+
+        if write_behind or store.evicting:
+            atexit.register(store.flush_at_exit)
 
         def new_func(*args, **kwargs):
             nonlocal enabled
@@ -120,23 +292,621 @@ def persist_to_file(
                     ]
                 )
 
-            if key not in cache["data"].keys():
+            metrics = store.metrics
+            if not cache_enabled:
+                metrics.disabled += 1
+
+            found, value = store.get(key)
+            if not found:
                 logger.debug(f'Cache miss for "{key}"')
-                cache["data"][key] = original_func(*args, **kwargs)
+                metrics.misses += 1
 
-                if cache_enabled:
-                    if not _Path(file_name).parent.exists():
-                        _Path(file_name).parent.mkdir(parents=True, exist_ok=True)
+                start = time.perf_counter()
+                try:
+                    value = original_func(*args, **kwargs)
+                finally:
+                    metrics.compute_seconds += time.perf_counter() - start
 
-                    with open(file_name, write_mode) as f:
-                        cache_backend.dump(cache, f)
-                else:
+                store.set(key, value, persist=cache_enabled)
+
+                if not cache_enabled:
                     logger.debug(f'Cache disabled for key "{key}"')
             else:
                 logger.debug(f'Cache hit for "{key}"')
+                metrics.hits += 1
 
-            return cache["data"][key]
+            return value
 
+        new_func.flush = store.flush
+        new_func.warm = store.warm
+        new_func.stats = store.stats
+        new_func.metrics = store.metrics
         return new_func
 
     return decorator
+
+
+class _Store:
+    """Base class of the backends: loads the cache on first use, keeps the values in memory
+    and decides when to write them.
+
+    Subclasses implement `_load`, `_get` (which treats expired entries as misses and records
+    the hits when evicting), `_remember` (which stores a value in memory only), `_write`
+    (which persists the given pending entries and the recorded hits, then evicts) and
+    `_count`. All of them are called while holding the store lock, so the cache can be
+    warmed from another thread. Timestamps (`now`) are seconds since the epoch.
+
+    The time spent in `_load`, `_get` and `_write` (which returns the number of bytes
+    written) is added to the serialization time of the `metrics`.
+    """
+
+    def __init__(self, file_name: _Union[str, _Path]):
+        self.file_name = _Path(file_name)
+        self.pending: dict[_Any, _Any] = {}
+        self.loaded = False
+        self.batched = False
+        self.flush_every: _Optional[int] = None
+        self.flush_interval: _Optional[float] = None
+        self.last_flush = time.monotonic()
+        self.max_entries: _Optional[int] = None
+        self.max_bytes: _Optional[int] = None
+        self.ttl: _Optional[float] = None
+        self.touched = False
+        """ Whether hits were recorded since the last write. """
+        self.evictions = 0
+        self.metrics = CacheMetrics()
+        self._lock = threading.RLock()
+
+    def write_behind(
+        self, flush_every: _Optional[int], flush_interval: _Optional[float]
+    ) -> None:
+        """Keeps the new entries pending until one of the limits is reached."""
+        self.batched = True
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+
+    def evict_when(
+        self,
+        max_entries: _Optional[int] = None,
+        max_bytes: _Optional[int] = None,
+        ttl: _Optional[float] = None,
+    ) -> None:
+        """Sets the limits applied when the cache is written."""
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+    @property
+    def evicting(self) -> bool:
+        return (
+            self.max_entries is not None
+            or self.max_bytes is not None
+            or self.ttl is not None
+        )
+
+    def load(self) -> None:
+        """Loads the cache, if not already loaded."""
+        with self._lock:
+            if not self.loaded:
+                start = time.perf_counter()
+                try:
+                    self._load()
+                finally:
+                    self.metrics.serialization_seconds += time.perf_counter() - start
+
+                self.loaded = True
+
+    def warm(self, background: bool = False) -> _Optional[threading.Thread]:
+        """Loads the cache before the first call of the decorated function.
+
+        Args:
+            background (bool, optional): Whether to load the cache in a (daemon) thread. Defaults to False.
+
+        Returns:
+            threading.Thread | None: The thread loading the cache, if `background=True`.
+        """
+        if not background:
+            self.load()
+            return None
+
+        thread = threading.Thread(target=self._warm, name="cache-warm", daemon=True)
+        thread.start()
+        return thread
+
+    def _warm(self) -> None:
+        try:
+            self.load()
+        except Exception as e:
+            logger.error(f"Unable to load the cache ({e!r})")
+
+    def get(self, key) -> tuple[bool, _Any]:
+        with self._lock:
+            self.load()
+
+            start = time.perf_counter()
+            try:
+                return self._get(key, time.time())
+            finally:
+                self.metrics.serialization_seconds += time.perf_counter() - start
+
+    def set(self, key, value, persist: bool = True) -> None:
+        with self._lock:
+            self.load()
+            self._remember(key, value, time.time())
+
+            if not persist:
+                return
+
+            self.pending[key] = value
+            if (
+                not self.batched
+                or (
+                    self.flush_every is not None
+                    and len(self.pending) >= self.flush_every
+                )
+                or (
+                    self.flush_interval is not None
+                    and time.monotonic() - self.last_flush >= self.flush_interval
+                )
+            ):
+                self.flush()
+
+    def flush(self) -> None:
+        """Writes the pending entries (and the time of the recorded hits)."""
+        with self._lock:
+            if self.pending or self.touched:
+                logger.debug(f"Writing {len(self.pending)} cache entries")
+
+                start = time.perf_counter()
+                try:
+                    self.metrics.bytes_written += self._write(self.pending, time.time())
+                finally:
+                    self.metrics.serialization_seconds += time.perf_counter() - start
+
+                self.pending = {}
+                self.touched = False
+
+            self.last_flush = time.monotonic()
+
+    def stats(self) -> CacheStats:
+        """Returns the number of entries, the size on disk and the evictions of the cache."""
+        with self._lock:
+            self.load()
+            return CacheStats(
+                entries=self._count(),
+                bytes_on_disk=sum(
+                    path.stat().st_size for path in self._files() if path.exists()
+                ),
+                evictions=self.evictions,
+            )
+
+    def flush_at_exit(self) -> None:
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Unable to write the cache at exit ({e!r})")
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created >= self.ttl
+
+    def _evicted(
+        self, entries: list[tuple[_Any, float, float, int]], now: float
+    ) -> list[_Any]:
+        """Returns the keys to evict.
+
+        Args:
+            entries (list[tuple]): The `(key, created, last_hit, size)` of every entry.
+            now (float): The current time.
+
+        Returns:
+            list: The expired keys, followed by the least recently used ones that exceed the limits.
+        """
+        evicted = [key for key, created, _, _ in entries if self._expired(created, now)]
+        if self.max_entries is None and self.max_bytes is None:
+            return evicted
+
+        remaining = [entry for entry in entries if not self._expired(entry[1], now)]
+        count = len(remaining)
+        size = sum(entry[3] for entry in remaining)
+        for key, _, _, entry_size in sorted(remaining, key=lambda entry: entry[2]):
+            if (self.max_entries is None or count <= self.max_entries) and (
+                self.max_bytes is None or size <= self.max_bytes
+            ):
+                break
+
+            evicted.append(key)
+            count -= 1
+            size -= entry_size
+
+        return evicted
+
+    def _files(self) -> list[_Path]:
+        return [self.file_name]
+
+    def _load(self) -> None:
+        raise NotImplementedError
+
+    def _get(self, key, now: float) -> tuple[bool, _Any]:
+        raise NotImplementedError
+
+    def _remember(self, key, value, now: float) -> None:
+        raise NotImplementedError
+
+    def _write(self, pending: dict[_Any, _Any], now: float) -> int:
+        raise NotImplementedError
+
+    def _count(self) -> int:
+        raise NotImplementedError
+
+
+class _FileStore(_Store):
+    """Cache kept in memory and dumped as a whole (with `pickle` or `json`) on every write.
+
+    The `(created, last_hit, size)` of every key are stored in `metadata["entries"]` (the
+    size is only computed when `max_bytes` is set).
+    """
+
+    def __init__(self, file_name: _Union[str, _Path], backend: Backend):
+        super().__init__(file_name)
+
+        self.module: types.ModuleType
+        self.read_mode: _Literal["r", "rb"]
+        self.write_mode: _Literal["w", "wb"]
+
+        if backend == Backend.PICKLE:
+            self.module = _pickle
+            self.read_mode = "rb"
+            self.write_mode = "wb"
+        elif backend == Backend.JSON:
+            self.module = _json
+            self.read_mode = "r"
+            self.write_mode = "w"
+        else:
+            raise ValueError(f"Invalid backend: {backend}")
+
+        self.cache = {
+            "data": {},
+            "metadata": {
+                "version": CACHE_VERSION,
+                "date": _datetime.datetime.now(),
+                "entries": {},
+            },
+        }
+
+    @property
+    def entries(self) -> dict[_Any, list]:
+        return self.cache["metadata"]["entries"]
+
+    def _load(self) -> None:
+        try:
+            with open(self.file_name, self.read_mode) as f:
+                self.cache = self.module.load(f)
+        except (IOError, ValueError, EOFError, _pickle.UnpicklingError):
+            # Missing, truncated or corrupted file
+            pass
+
+        # Caches written by previous versions have no timestamps
+        now = time.time()
+        entries = self.cache["metadata"].setdefault("entries", {})
+        for key in self.cache["data"].keys() - entries.keys():
+            entries[key] = [now, now, None]
+
+    def _get(self, key, now: float) -> tuple[bool, _Any]:
+        if key not in self.cache["data"]:
+            return False, None
+
+        entry = self.entries[key]
+        if self._expired(entry[0], now):
+            return False, None
+
+        if self.evicting:
+            entry[1] = now
+            self.touched = True
+
+        return True, self.cache["data"][key]
+
+    def _remember(self, key, value, now: float) -> None:
+        self.cache["data"][key] = value
+        self.entries[key] = [now, now, self._size(key, value)]
+
+    def _size(self, key, value) -> _Optional[int]:
+        if self.max_bytes is None:
+            return None
+
+        return len(_pickle.dumps((key, value)))
+
+    def _count(self) -> int:
+        return len(self.cache["data"])
+
+    def _evict(self, now: float) -> None:
+        data = self.cache["data"]
+        entries = self.entries
+        if self.max_bytes is not None:
+            for key, entry in entries.items():
+                if entry[2] is None:
+                    entry[2] = self._size(key, data[key])
+
+        evicted = self._evicted(
+            [
+                (key, created, last_hit, size or 0)
+                for key, (created, last_hit, size) in entries.items()
+            ],
+            now,
+        )
+        for key in evicted:
+            del data[key]
+            del entries[key]
+
+        if evicted:
+            logger.debug(f"Evicted {len(evicted)} cache entries")
+            self.evictions += len(evicted)
+
+    def _write(self, pending: dict[_Any, _Any], now: float) -> int:
+        # The pending entries are already part of `self.cache`
+        if self.evicting:
+            self._evict(now)
+
+        self.file_name.parent.mkdir(parents=True, exist_ok=True)
+
+        fd, temp_name = tempfile.mkstemp(
+            dir=self.file_name.parent, prefix=f"{self.file_name.name}.", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, self.write_mode) as f:
+                self.module.dump(self.cache, f)
+                written = f.tell()
+
+            # `mkstemp` creates the file readable only by the owner
+            os.chmod(temp_name, file_mode(self.file_name))
+            os.replace(temp_name, self.file_name)
+        except BaseException:
+            _Path(temp_name).unlink(missing_ok=True)
+            raise
+
+        return written
+
+
+class _SQLiteStore(_Store):
+    """Cache stored as one row per key in a SQLite database.
+
+    Loading the store opens the database (creating it and importing `migrate_from`, if
+    needed). Values read or written are also kept in memory, as are the ones computed
+    while caching is disabled (like the other backends do). Every row also stores when it
+    was written (`created`) and last hit (`last_hit`); the size of an entry is the length
+    of its serialized key and value.
+    """
+
+    def __init__(
+        self,
+        file_name: _Union[str, _Path],
+        migrate_from: _Union[str, _Path, None] = None,
+    ):
+        super().__init__(file_name)
+        self.migrate_from = _Path(migrate_from) if migrate_from else None
+
+        self.memory: dict[_Any, tuple[_Any, float]] = {}
+        """ Value and creation time of the keys read or written. """
+        self.hits: dict[_Any, float] = {}
+        """ Time of the last hit of the keys, not written yet. """
+        self._connection: _Optional[_sqlite3.Connection] = None
+
+    @staticmethod
+    def serialize_key(key) -> str:
+        """Returns a stable text representation of the key, used as primary key."""
+        return _json.dumps(key, sort_keys=True, default=repr)
+
+    def connect(self) -> _sqlite3.Connection:
+        if self._connection is not None:
+            return self._connection
+
+        self.file_name.parent.mkdir(parents=True, exist_ok=True)
+        created = not self.file_name.exists()
+
+        # Autocommit mode: transactions are opened explicitly when writing many rows.
+        # The connection may be opened by the thread warming the cache (the store lock
+        # serializes its use).
+        connection = _sqlite3.connect(
+            self.file_name, isolation_level=None, check_same_thread=False
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache "
+            "(key TEXT PRIMARY KEY, value BLOB NOT NULL, created REAL, last_hit REAL)"
+        )
+
+        # Databases written by previous versions have no timestamps
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(cache)")}
+        if not {"created", "last_hit"} <= columns:
+            now = time.time()
+            with connection:
+                connection.execute("BEGIN")
+                for column in ["created", "last_hit"]:
+                    if column not in columns:
+                        connection.execute(
+                            f"ALTER TABLE cache ADD COLUMN {column} REAL"
+                        )
+                connection.execute(
+                    "UPDATE cache SET created = ?, last_hit = ?", (now, now)
+                )
+
+        # Used to find the entries to evict
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS cache_created ON cache (created)"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS cache_last_hit ON cache (last_hit)"
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT)"
+        )
+        connection.execute(
+            "INSERT OR IGNORE INTO metadata (name, value) VALUES ('version', ?), ('date', ?)",
+            (CACHE_VERSION, _datetime.datetime.now().isoformat()),
+        )
+
+        if created and self.migrate_from is not None:
+            self.migrate(connection, self.migrate_from)
+
+        self._connection = connection
+        return connection
+
+    def migrate(self, connection: _sqlite3.Connection, source: _Path) -> None:
+        """Imports the entries of a pickle cache into the database."""
+        try:
+            with open(source, "rb") as f:
+                data = _pickle.load(f).get("data", {})
+        except (IOError, ValueError, _pickle.UnpicklingError, AttributeError) as e:
+            logger.debug(f'Nothing to migrate from "{source}" ({e!r})')
+            return
+
+        now = time.time()
+        with connection:
+            connection.execute("BEGIN")
+            connection.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, created, last_hit) VALUES (?, ?, ?, ?)",
+                (
+                    (self.serialize_key(key), _pickle.dumps(value), now, now)
+                    for key, value in data.items()
+                ),
+            )
+
+        logger.info(f'Migrated {len(data)} cache entries from "{source}"')
+
+    def _load(self) -> None:
+        self.connect()
+
+    def _get(self, key, now: float) -> tuple[bool, _Any]:
+        if key not in self.memory:
+            row = (
+                self.connect()
+                .execute(
+                    "SELECT value, created FROM cache WHERE key = ?",
+                    (self.serialize_key(key),),
+                )
+                .fetchone()
+            )
+            if row is None:
+                return False, None
+
+            self.memory[key] = (_pickle.loads(row[0]), row[1])
+
+        value, created = self.memory[key]
+        if self._expired(created, now):
+            return False, None
+
+        if self.evicting:
+            self.hits[key] = now
+            self.touched = True
+
+        return True, value
+
+    def _remember(self, key, value, now: float) -> None:
+        self.memory[key] = (value, now)
+
+    def _count(self) -> int:
+        connection = self.connect()
+        (count,) = connection.execute("SELECT COUNT(*) FROM cache").fetchone()
+
+        # The pending entries may not be in the database yet
+        for key in self.pending:
+            count += not connection.execute(
+                "SELECT 1 FROM cache WHERE key = ?", (self.serialize_key(key),)
+            ).fetchone()
+
+        return count
+
+    def _files(self) -> list[_Path]:
+        return [self.file_name, self.file_name.with_name(f"{self.file_name.name}-wal")]
+
+    def _write(self, pending: dict[_Any, _Any], now: float) -> int:
+        connection = self.connect()
+        rows = [
+            (self.serialize_key(key), _pickle.dumps(value), now, now)
+            for key, value in pending.items()
+        ]
+
+        with connection:
+            connection.execute("BEGIN")
+            connection.executemany(
+                "INSERT INTO cache (key, value, created, last_hit) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = excluded.value, "
+                "created = excluded.created, last_hit = excluded.last_hit",
+                rows,
+            )
+            connection.executemany(
+                "UPDATE cache SET last_hit = ? WHERE key = ?",
+                ((hit, self.serialize_key(key)) for key, hit in self.hits.items()),
+            )
+            self.hits = {}
+
+            if self.evicting:
+                self._evict(connection, now)
+
+        return sum(len(key.encode()) + len(value) for key, value, _, _ in rows)
+
+    def _evict(self, connection: _sqlite3.Connection, now: float) -> None:
+        """Deletes the expired entries and then the least recently used ones exceeding the limits.
+
+        The rows are selected by the indexes on `created` and `last_hit`, without reading
+        (or sorting) the whole table.
+        """
+        evicted = 0
+        if self.ttl is not None:
+            evicted += connection.execute(
+                "DELETE FROM cache WHERE created <= ?", (now - self.ttl,)
+            ).rowcount
+            self.memory = {
+                key: entry
+                for key, entry in self.memory.items()
+                if not self._expired(entry[1], now)
+            }
+
+        excess = 0
+        if self.max_entries is not None:
+            (count,) = connection.execute("SELECT COUNT(*) FROM cache").fetchone()
+            excess = max(count - self.max_entries, 0)
+
+        if self.max_bytes is not None:
+            (size,) = connection.execute(
+                "SELECT COALESCE(SUM(length(key) + length(value)), 0) FROM cache"
+            ).fetchone()
+            if size > self.max_bytes:
+                # Walks the entries from the least recently used, only until enough space is freed
+                sizes = connection.execute(
+                    "SELECT length(key) + length(value) FROM cache ORDER BY last_hit, rowid"
+                )
+                freed = 0
+                for (entry_size,) in sizes:
+                    if size <= self.max_bytes:
+                        break
+                    size -= entry_size
+                    freed += 1
+                sizes.close()
+                excess = max(excess, freed)
+
+        if excess:
+            least_recent = "SELECT key FROM cache ORDER BY last_hit, rowid LIMIT ?"
+            evicted_keys = {
+                key for (key,) in connection.execute(least_recent, (excess,))
+            }
+            connection.execute(
+                f"DELETE FROM cache WHERE key IN ({least_recent})", (excess,)
+            )
+            self.memory = {
+                key: entry
+                for key, entry in self.memory.items()
+                if self.serialize_key(key) not in evicted_keys
+            }
+            evicted += excess
+
+        if not evicted:
+            return
+
+        logger.debug(f"Evicted {evicted} cache entries")
+        self.evictions += evicted
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
@@ -1,5 +1,6 @@
+import functools
 from pathlib import Path
-from typing import Any, Hashable, Union
+from typing import Any, Hashable, Iterable, Optional, Union
 import pandas as pd
 import numpy as np
 
@@ -8,15 +9,52 @@ import logging
 
 import re
 
-import hashlib
-import pickle
+import json
 import veryeasyfatt.bundle as bundle
+from veryeasyfatt.app.fogli import leggi_foglio
+from veryeasyfatt.shared import columnar
+from veryeasyfatt.shared.fingerprint import FileFingerprint, is_unchanged
 
 logger = logging.getLogger("danea-easyfatt.clienti")
 logger.addHandler(logging.NullHandler())
 
 
-CACHE_FILENAME = "customer_info.pickle"
+CACHE_DIRNAME = "customer_info"
+""" Nome della cartella (all'interno di `.cache`) contenente i dati cliente in formato colonnare. """
+
+CACHE_METADATA_FILENAME = "metadata.json"
+
+COLONNE_IDENTIFICATIVE = [
+    "Denominazione",
+    "Partita Iva",
+    "Indirizzo",
+    "Cap",
+    "Città",
+    "Prov.",
+]
+""" Colonne usate per identificare i clienti nei messaggi di errore. """
+
+CACHE_VERSION = "2"
+""" Versione della cache dei dati cliente (la versione 1 era il file `customer_info.pickle`). """
+
+LEGACY_CACHE_FILENAME = "customer_info.pickle"
+
+COLONNE_DATABASE = {
+    "CodAnagr": "Cod.",
+    "Nome": "Denominazione",
+    "PartitaIva": "Partita Iva",
+    "Indirizzo": "Indirizzo",
+    "Cap": "Cap",
+    "Citta": "Città",
+    "Prov": "Prov.",
+}
+""" Colonne della tabella `TAnagrafica` lette dal database, con il nome della corrispondente colonna dell'export. """
+
+CACHE_INTERVALLI_FILENAME = "shipping_intervals.json"
+""" File (nella cartella di cache) con gli intervalli di consegna già ricavati dall'export. """
+
+CACHE_INTERVALLI_VERSION = "1"
+""" Versione della cache degli intervalli (da incrementare se cambia la normalizzazione). """
 
 
 def rename_extra_field(column_name):
@@ -52,9 +90,16 @@ def formatta_orario(value):
     return ":".join(map(lambda s: s.strip().zfill(2), orario))
 
 
+DIMENSIONE_CACHE_INTERVALLI = 1024
+""" Numero massimo di intervalli (già normalizzati) mantenuti in memoria. """
+
+
 def routexl_time_boundaries(string: str):
     """Generates a valid "Ready and due time" string to be used for csv import
 
+    The results (including invalid strings, for which `None` is returned) are cached,
+    since real data contains only a handful of distinct values.
+
     See also:
         https://docs.routexl.com/index.php?title=Import#Additional_fields:~:text=Ready%20and%20due%20time%20as%20hh%3Amm%20before%20and%20after%20%3E%3E
 
@@ -67,13 +112,26 @@ def routexl_time_boundaries(string: str):
     Returns:
         str | None: The time boundaries in the form "HH:MM>>HH:MM"
     """
-    REGEX_INTERVALLO = r"([0-9:]+)\s*(?:>+|-+|\s+a\s+)\s*([0-9:]+)"
-
     if not isinstance(string, str):
         raise ValueError(
             f"Input string must be of type 'str', not '{type(string).__name__}'"
         )
 
+    return normalizza_intervallo(string)
+
+
+@functools.lru_cache(maxsize=DIMENSIONE_CACHE_INTERVALLI)
+def normalizza_intervallo(string: str) -> Optional[str]:
+    """Versione con cache di `routexl_time_boundaries` (senza controllo sul tipo).
+
+    Args:
+        string (str): L'intervallo da normalizzare (es. `8 a 12`)
+
+    Returns:
+        str | None: L'intervallo nel formato "HH:MM>>HH:MM" o `None` se non valido.
+    """
+    REGEX_INTERVALLO = r"([0-9:]+)\s*(?:>+|-+|\s+a\s+)\s*([0-9:]+)"
+
     intervallo_match = re.match(REGEX_INTERVALLO, string)
     if intervallo_match is None:
         return None
@@ -81,6 +139,25 @@ def routexl_time_boundaries(string: str):
     return ">>".join(map(formatta_orario, intervallo_match.groups()))
 
 
+def normalizza_intervalli(valori: pd.Series) -> pd.Series:
+    """Normalizza un'intera colonna di intervalli, elaborando una sola volta ogni valore distinto.
+
+    Args:
+        valori (pd.Series): Gli intervalli da normalizzare. I valori che non sono stringhe (es. `NaN`) restituiscono `None`.
+
+    Returns:
+        pd.Series: Gli intervalli nel formato "HH:MM>>HH:MM" (o `None`), con lo stesso indice di `valori`.
+    """
+    mappa = {
+        valore: normalizza_intervallo(valore) if isinstance(valore, str) else None
+        for valore in pd.unique(valori.to_numpy(dtype=object))
+        if not pd.isna(valore)
+    }
+
+    normalizzati = valori.map(mappa, na_action="ignore").astype(object)
+    return normalizzati.where(normalizzati.notna(), None)
+
+
 def get_customers_data(
     filename: Union[str, Path],
     cache: bool = True,
@@ -88,63 +165,103 @@ def get_customers_data(
 ) -> list[dict[Hashable, Any]]:
     """Ricava i dati cliente dal file Excel/Libreoffice esportato da Easyfatt.
 
-    - Se `cache=True` allora viene salvata una copia dei dati recuperati dal file su
-    un file. In questo modo l'esecuzione successiva sarà molto più veloce in quanto
-    non dovrà ricaricare il file Excel ma solo leggere il file `.pickle`.
+    Vedi `get_customers_dataframe`, di cui questa funzione restituisce il contenuto come lista di dizionari.
 
     Args:
         `filename` (str | pathlib.Path): Percorso al file Excel/Libreoffice da analizzare
         `cache` (bool, optional): Se usare la cache. Defaults to True.
-        `cache_path` (str | pathlib.Path, optional): Percorso alla cartella contenente il file di cache. Defaults to None.
+        `cache_path` (str | pathlib.Path, optional): Percorso alla cartella contenente la cache. Defaults to None.
 
     Returns:
         list: Una lista di dizionari (convertibile a dataframe semplicemente passandolo come parametro) contenente tutte le voci del foglio excel.
     """
-    md5sum = ""
-    cache_file: Path | None = None
+    return get_customers_dataframe(
+        filename, cache=cache, cache_path=cache_path
+    ).to_dict("records")
+
+
+def get_customers_dataframe(
+    filename: Union[str, Path],
+    cache: bool = True,
+    cache_path: Union[str, Path, None] = None,
+    colonne: Optional[Iterable[str]] = None,
+) -> pd.DataFrame:
+    """Ricava i dati cliente dal file Excel/Libreoffice esportato da Easyfatt.
+
+    - Se `cache=True` allora viene salvata una copia dei dati recuperati dal file in
+    formato colonnare (vedi `shared.columnar`). In questo modo l'esecuzione successiva
+    sarà molto più veloce in quanto non dovrà ricaricare il file Excel, ma solo caricare
+    (direttamente come DataFrame) le colonne salvate.
+
+    Per capire se il file è cambiato vengono confrontate prima dimensione e data di
+    modifica (senza leggere il file), e solo se queste non bastano (es. il file è stato
+    esportato di nuovo) l'hash del contenuto, calcolato leggendo il file a blocchi.
+
+    - Se vengono indicate le `colonne`, vengono conservate solo quelle (vedi
+    `fogli.leggi_foglio`), e solo quelle vengono salvate nella cache.
+
+    Args:
+        `filename` (str | pathlib.Path): Percorso al file Excel/Libreoffice da analizzare
+        `cache` (bool, optional): Se usare la cache. Defaults to True.
+        `cache_path` (str | pathlib.Path, optional): Percorso alla cartella contenente la cache. Defaults to None.
+        `colonne` (Iterable[str], optional): Colonne da leggere (quelle non presenti nel file vengono ignorate). Defaults to None (tutte).
+
+    Returns:
+        pd.DataFrame: Le voci del foglio excel (tutti i valori come stringhe).
+    """
+    colonne = list(colonne) if colonne is not None else None
+    impronta: Optional[FileFingerprint] = None
+    cache_dir: Path | None = None
 
     if not cache:
         logger.warning("Cache bypassata forzatamente.")
 
     else:
         try:
-            with open(filename, "rb") as f:
-                md5sum = hashlib.md5(f.read()).hexdigest()
-
-            logger.info(f"Hash md5 file excel: '{md5sum}'")
-
-            cache_dir: Path = (
+            cache_dir = (
                 Path(cache_path)
                 if cache_path
                 else bundle.get_execution_directory() / ".cache"
-            )
-            cache_file = cache_dir / CACHE_FILENAME
-
-            # Creo il percorso se non esiste già
-            Path(cache_dir).mkdir(parents=True, exist_ok=True)
-
-            logger.debug(f"Cerco file di cache '{cache_file}'")
-            if cache_file.exists():
-                logger.debug(f"Trovato file cache '{cache_file}'")
+            ) / CACHE_DIRNAME
 
-                cached_data = {}
-                with open(cache_file, "rb") as pickle_file:
-                    cached_data = pickle.load(pickle_file)
-
-                cached_metadata: dict[str, Any] = cached_data.get("metadata", {})
-                last_update: pd.Timestamp = cached_metadata.get("date", None)
+            logger.debug(f"Cerco cache '{cache_dir}'")
+            cached_metadata = _leggi_metadati_cache(cache_dir)
+            if cached_metadata is not None:
+                logger.debug(f"Trovata cache '{cache_dir}'")
 
                 logger.debug(
-                    f"Ultima elaborazione effettuata il {last_update.strftime('%d-%m-%Y %H:%M:%S') if last_update else 'NO-DATA'}"
+                    f"Ultima elaborazione effettuata il {cached_metadata.get('date', 'NO-DATA')}"
                 )
-                logger.debug(f"Hash md5 pickle: '{cached_metadata.get('hash', None)}'")
-                if cached_metadata.get("hash", None) == md5sum:
-                    logger.info(f"Carico i dati dal file di cache.")
-                    return cached_data["data"]
 
+                impronta_salvata = FileFingerprint.from_dict(
+                    cached_metadata.get("fingerprint", None)
+                )
+                invariato, impronta = is_unchanged(impronta_salvata, filename)
                 logger.debug(
-                    f"File di cache invalidato. Necessaria rielaborazione dati."
+                    f"Impronta file excel: {impronta} (cache: {impronta_salvata})"
                 )
+
+                colonne_salvate = cached_metadata.get("columns", None)
+                if colonne_salvate is not None and (
+                    colonne is None or not set(colonne) <= set(colonne_salvate)
+                ):
+                    logger.debug(
+                        f"La cache non contiene tutte le colonne richieste ({colonne_salvate})"
+                    )
+                elif invariato:
+                    logger.info(f"Carico i dati dal file di cache.")
+                    df = columnar.read_table(cache_dir, columns=colonne)
+
+                    if impronta_salvata != impronta:
+                        # Stesso contenuto ma data di modifica diversa: aggiorno la cache,
+                        # in modo da non dover ricalcolare l'hash alla prossima esecuzione.
+                        _scrivi_metadati_cache(cache_dir, impronta, colonne_salvate)
+
+                    return df
+                else:
+                    logger.debug(
+                        f"File di cache invalidato. Necessaria rielaborazione dati."
+                    )
         except Exception as err:
             logger.error(
                 f"Errore in fase di recupero cache ({repr(err)}). Proseguo normalmente"
@@ -153,56 +270,258 @@ def get_customers_data(
     logger.debug(f"Carico file '{filename}'")
 
     # Legge sia file `*.xlsx` che `*.ods`
-    df = pd.read_excel(filename, dtype=str)
+    df = leggi_foglio(filename, colonne=colonne)
 
     logger.info(
         f"File excel caricato (trovate {df.shape[0]} righe e {df.shape[1]} colonne)"
     )
 
-    df_dict = df.to_dict("records")
-    if cache and cache_file:
-        return_data = {
-            "metadata": {"date": pd.Timestamp.now(), "hash": md5sum},
-            "data": df_dict,
-        }
+    if cache and cache_dir:
+        try:
+            columnar.write_table(df.reset_index(drop=True), cache_dir)
+            _scrivi_metadati_cache(
+                cache_dir,
+                (impronta or FileFingerprint.of(filename)).with_digest(filename),
+                colonne,
+            )
 
-        with open(cache_file, "wb") as pickle_file:
-            pickle.dump(return_data.copy(), pickle_file)
+            # La cache della versione precedente non viene più usata
+            (cache_dir.parent / LEGACY_CACHE_FILENAME).unlink(missing_ok=True)
 
-        logger.info(
-            f"Salvato file di cache '{cache_file}'. La prossima esecuzione dovrebbe essere più veloce."
+            logger.info(
+                f"Salvato file di cache '{cache_dir}'. La prossima esecuzione dovrebbe essere più veloce."
+            )
+        except Exception as err:
+            logger.error(f"Impossibile salvare il file di cache ({repr(err)})")
+
+    return df
+
+
+def _leggi_metadati_cache(cache_dir: Path) -> Optional[dict[str, Any]]:
+    try:
+        metadati = json.loads(
+            (cache_dir / CACHE_METADATA_FILENAME).read_text(encoding="utf-8")
         )
+    except FileNotFoundError:
+        return None
+
+    if metadati.get("version", None) != CACHE_VERSION:
+        return None
+
+    return metadati
+
+
+def _scrivi_metadati_cache(
+    cache_dir: Path, impronta: FileFingerprint, colonne: Optional[list[str]]
+) -> None:
+    (cache_dir / CACHE_METADATA_FILENAME).write_text(
+        json.dumps(
+            {
+                "version": CACHE_VERSION,
+                "columns": colonne,
+                "date": pd.Timestamp.now().strftime("%d-%m-%Y %H:%M:%S"),
+                "hash": impronta.digest,
+                "fingerprint": impronta.to_dict(),
+            }
+        ),
+        encoding="utf-8",
+    )
 
-    return df_dict
 
+def get_intervallo_spedizioni(
+    filename: Union[str, Path],
+    extra_field_id=1,
+    cache: bool = True,
+    cache_path: Union[str, Path, None] = None,
+) -> dict[str, str]:
+    """Ricava gli orari di consegna dei clienti dal campo extra indicato.
+
+    Solo le colonne usate vengono controllate e convertite (le altre non vengono
+    nemmeno lette), e ogni intervallo distinto viene normalizzato una sola volta.
+
+    Se `cache=True` anche il risultato viene salvato in cache, insieme all'impronta
+    dell'export e al numero del campo extra: finché entrambi non cambiano, le esecuzioni
+    successive restituiscono direttamente gli intervalli salvati, senza caricare i dati
+    cliente (vedi `get_customers_dataframe`).
+
+    Args:
+        filename (str | Path): Percorso al file Excel/Libreoffice esportato da Easyfatt.
+        extra_field_id (int, optional): Numero del campo extra contenente l'intervallo di consegna. Defaults to 1.
+        cache (bool, optional): Se usare la cache. Defaults to True.
+        cache_path (str | pathlib.Path, optional): Percorso alla cartella contenente la cache. Defaults to None.
+
+    Raises:
+        Exception: Se uno o più clienti non hanno il campo 'Cod.' valorizzato.
 
-def get_intervallo_spedizioni(filename: Union[str, Path], extra_field_id=1):
-    customer_data = get_customers_data(filename)
-    df = pd.DataFrame(customer_data)
+    Returns:
+        dict[str, str]: Gli intervalli nel formato "HH:MM>>HH:MM", per codice cliente (i clienti senza un intervallo valido vengono esclusi).
+    """
+    impronta: Optional[FileFingerprint] = None
+    cache_file: Path | None = None
+
+    if cache:
+        try:
+            cache_file = (
+                Path(cache_path)
+                if cache_path
+                else bundle.get_execution_directory() / ".cache"
+            ) / CACHE_INTERVALLI_FILENAME
+
+            cached = _leggi_cache_intervalli(cache_file)
+            if cached is not None and cached.get("extra_field_id") == extra_field_id:
+                impronta_salvata = FileFingerprint.from_dict(
+                    cached.get("fingerprint", None)
+                )
+                invariato, impronta = is_unchanged(impronta_salvata, filename)
+
+                if invariato:
+                    logger.info(f"Carico gli intervalli di consegna dal file di cache.")
+
+                    if impronta_salvata != impronta:
+                        # Stesso contenuto ma data di modifica diversa: aggiorno l'impronta
+                        _scrivi_cache_intervalli(
+                            cache_file, impronta, extra_field_id, cached["intervals"]
+                        )
+
+                    return cached["intervals"]
+
+            logger.debug(
+                f"Cache degli intervalli di consegna non valida. Necessaria rielaborazione dati."
+            )
+        except Exception as err:
+            logger.error(
+                f"Errore in fase di recupero cache ({repr(err)}). Proseguo normalmente"
+            )
+
+    # L'impronta viene calcolata prima di leggere il file: se questo cambiasse durante
+    # la lettura, la cache verrebbe comunque invalidata alla prossima esecuzione.
+    if cache and cache_file and impronta is None:
+        impronta = FileFingerprint.of(filename)
+
+    colonna_intervallo = f"Extra {extra_field_id}"
+    df = get_customers_dataframe(
+        filename,
+        cache=cache,
+        cache_path=cache_path,
+        colonne=["Cod.", colonna_intervallo, *COLONNE_IDENTIFICATIVE],
+    )
     logger.info(
         f"File excel caricato (trovate {df.shape[0]} righe e {df.shape[1]} colonne)"
     )
 
-    df = df.replace(r"^\s*$", np.nan, regex=True)
+    intervallo_spedizioni = _intervalli_da_dataframe(df, colonna_intervallo)
 
-    cod_not_present = df[df["Cod."].isnull()]
-    if not cod_not_present.empty:
-        not_present_info = cod_not_present.get(
-            ["Denominazione", "Partita Iva", "Indirizzo", "Cap", "Città", "Prov."]
-        )
-        raise Exception(
-            f"Trovati i seguenti clienti con campo 'Cod.' NON VALORIZZATO:\n{not_present_info}"
-        )
+    if cache_file and impronta:
+        try:
+            _scrivi_cache_intervalli(
+                cache_file,
+                impronta.with_digest(filename),
+                extra_field_id,
+                intervallo_spedizioni,
+            )
+        except Exception as err:
+            logger.error(f"Impossibile salvare il file di cache ({repr(err)})")
+
+    return intervallo_spedizioni
+
+
+def errori_database() -> tuple[type[Exception], ...]:
+    """Eccezioni sollevate se il database di Easyfatt non può essere letto.
+
+    Comprendono i file mancanti o non accessibili (anche la libreria client di Firebird)
+    e gli errori di connessione e lettura del driver di Firebird.
+
+    Returns:
+        tuple[type[Exception], ...]: Le classi delle eccezioni, utilizzabili in un `except`.
+    """
+    errori: list[type[Exception]] = [OSError]
+    try:
+        from firebird.driver import Error as ErroreFirebird
+    except ImportError:
+        pass
+    else:
+        errori.append(ErroreFirebird)
+
+    return tuple(errori)
+
+
+def get_intervallo_spedizioni_database(
+    database: Union[str, Path, Any], extra_field_id=1, download_firebird=False
+) -> dict[str, str]:
+    """Ricava gli orari di consegna dei clienti direttamente dal database di Easyfatt.
 
-    customer_info: pd.DataFrame = df.get(["Cod.", f"Extra {extra_field_id}"])  # type: ignore
-    logger.info(f"Trovate informazioni cliente: \n{customer_info}")
+    Alternativa a `get_intervallo_spedizioni` che non richiede l'export dei clienti:
+    il campo extra e i dati identificativi dei clienti vengono letti dalla tabella
+    `TAnagrafica` con un'unica query, e poi elaborati come le colonne dell'export.
 
-    customer_info = customer_info.rename(mapper=rename_extra_field, axis="columns")
-    logger.debug(
-        f"Rinominata colonna 'Extra {extra_field_id}' in 'IntervalloSpedizione'"
+    Args:
+        database (str | Path | EasyfattFDB): Percorso al file di database (`*.eft`) o connettore già creato (qualsiasi oggetto con un metodo `connect()` compatibile con `EasyfattFDB`).
+        extra_field_id (int, optional): Numero del campo extra contenente l'intervallo di consegna. Defaults to 1.
+        download_firebird (bool, optional): Se scaricare Firebird quando non è installato (solo se `database` è un percorso). Defaults to False.
+
+    Raises:
+        Exception: Se uno o più clienti non hanno il campo 'Cod.' valorizzato.
+        OSError, firebird.driver.Error: Se il database non può essere letto (vedi `errori_database`).
+
+    Returns:
+        dict[str, str]: Gli intervalli nel formato "HH:MM>>HH:MM", per codice cliente (i clienti senza un intervallo valido vengono esclusi).
+    """
+    if isinstance(database, (str, Path)):
+        from easyfatt_db_connector import EasyfattFDB
+
+        database = EasyfattFDB(database, download_firebird=download_firebird)
+
+    campo_extra = f"Extra{int(extra_field_id)}"
+    colonne = {**COLONNE_DATABASE, campo_extra: f"Extra {int(extra_field_id)}"}
+    query = f"""
+        SELECT {", ".join(f'anag."{colonna}"' for colonna in colonne)}
+        FROM "TAnagrafica" AS anag
+        WHERE anag."Cliente" = 1;
+    """
+
+    logger.info("Connessione al database...")
+    with database.connect() as connection:
+        logger.debug(f"Eseguo query: {query}")
+        righe = [
+            dict(riga) for riga in connection.cursor().execute(query).fetchallmap()
+        ]
+
+    df = pd.DataFrame(righe, columns=list(colonne), dtype=object).rename(
+        columns=colonne
     )
+    logger.info(f"Lette {df.shape[0]} anagrafiche cliente dal database")
+
+    return _intervalli_da_dataframe(df, colonne[campo_extra])
+
+
+def _intervalli_da_dataframe(
+    df: pd.DataFrame, colonna_intervallo: str
+) -> dict[str, str]:
+    """Ricava gli intervalli di consegna per codice cliente dai dati cliente.
+
+    Args:
+        df (pd.DataFrame): Dati cliente, con le colonne dell'export di Easyfatt (almeno `Cod.` e `colonna_intervallo`).
+        colonna_intervallo (str): Nome della colonna contenente l'intervallo di consegna (es. `Extra 1`).
+
+    Raises:
+        Exception: Se uno o più clienti non hanno il campo 'Cod.' valorizzato.
+
+    Returns:
+        dict[str, str]: Gli intervalli nel formato "HH:MM>>HH:MM", per codice cliente.
+    """
+    # Le celle vuote o contenenti solo spazi sono considerate non valorizzate
+    codici = df["Cod."]
+    codici_mancanti = codici.str.fullmatch(r"\s*", na=True).to_numpy(dtype=bool)
+    if codici_mancanti.any():
+        not_present_info = df.loc[
+            codici_mancanti, [c for c in COLONNE_IDENTIFICATIVE if c in df.columns]
+        ].replace(r"^\s*$", np.nan, regex=True)
+
+        raise Exception(
+            f"Trovati i seguenti clienti con campo 'Cod.' NON VALORIZZATO:\n{not_present_info}"
+        )
 
-    customer_info = customer_info.replace({np.nan: None})
+    logger.info(f"Trovate informazioni cliente: \n{df[['Cod.', colonna_intervallo]]}")
 
     # Supporto le seguenti sintassi:
     #     - '08 > 16' (con o senza spazi)
@@ -213,19 +532,50 @@ def get_intervallo_spedizioni(filename: Union[str, Path], extra_field_id=1):
     # Normalizzo inoltre tutti gli intervalli in modo da avere l'orario SEMPRE preceduto da uno '0'.
     # Esempio:
     # 	'08' invece di '8'
-    customer_info["IntervalloSpedizione"] = [
-        routexl_time_boundaries(value.strip()) if (value is not None) else None
-        for value in customer_info["IntervalloSpedizione"]
-    ]
-    logger.info(f"Sanificati valori della colonna 'IntervalloSpedizione'")
-
-    logger.info(f"Informazioni cliente finali: \n{customer_info}")
-
-    return {
-        customer["Cod."]: customer["IntervalloSpedizione"]
-        for customer in customer_info.to_dict("records")
-        if customer["IntervalloSpedizione"] is not None
-    }
+    intervalli = normalizza_intervalli(df[colonna_intervallo].str.strip())
+    logger.info(f"Sanificati valori della colonna '{colonna_intervallo}'")
+
+    validi = intervalli.notna().to_numpy()
+    intervallo_spedizioni = dict(
+        zip(codici.to_numpy()[validi], intervalli.to_numpy()[validi])
+    )
+    logger.info(
+        f"Trovati {len(intervallo_spedizioni)} clienti con un intervallo di consegna valido"
+    )
+
+    return intervallo_spedizioni
+
+
+def _leggi_cache_intervalli(cache_file: Path) -> Optional[dict[str, Any]]:
+    try:
+        cached = json.loads(cache_file.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+
+    if cached.get("version", None) != CACHE_INTERVALLI_VERSION:
+        return None
+
+    return cached
+
+
+def _scrivi_cache_intervalli(
+    cache_file: Path,
+    impronta: FileFingerprint,
+    extra_field_id: int,
+    intervalli: dict[str, str],
+) -> None:
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    cache_file.write_text(
+        json.dumps(
+            {
+                "version": CACHE_INTERVALLI_VERSION,
+                "extra_field_id": extra_field_id,
+                "fingerprint": impronta.to_dict(),
+                "intervals": intervalli,
+            }
+        ),
+        encoding="utf-8",
+    )
 
 
 if __name__ == "__main__":
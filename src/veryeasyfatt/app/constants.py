@@ -28,5 +28,6 @@ class SuperEnum(Enum):
 class ApplicationGoals(SuperEnum):
     CSV_GENERATOR = "csv-generator"
     KML_GENERATOR = "kml-generator"
+    BATCH_GENERATOR = "batch-generator"
     INITIALIZE_GEO_CACHE = "initialize-geo-cache"
     INITIALIZE_GEO_CACHE_DRYRUN = "initialize-geo-cache-dryrun"
@@ -0,0 +1,640 @@
+"""Lettura dei documenti (`./Documents/Document`) contenuti nell'XML di Easyfatt."""
+
+import datetime
+import io
+import json
+import os
+from pathlib import Path
+import shutil
+from typing import IO, Any, Iterable, Iterator, Optional, Union
+import xml.etree.ElementTree as ET
+import logging
+
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+from veryeasyfatt.app.xml_parser import carica_backend, is_elemento, nome_backend
+from veryeasyfatt.shared import columnar
+from veryeasyfatt.shared.fingerprint import FileFingerprint
+import veryeasyfatt.bundle as bundle
+
+logger = logging.getLogger("danea-easyfatt.documenti")
+logger.addHandler(logging.NullHandler())
+
+DIMENSIONE_BLOCCO = 1000
+""" Numero di documenti elaborati alla volta durante la lettura incrementale dell'XML. """
+
+DIMENSIONE_LETTURA = 1024 * 1024
+""" Numero di byte letti alla volta dal file XML (solo con `lxml`). """
+
+CACHE_DOCUMENTI_DIRNAME = "documenti"
+""" Nome della cartella (all'interno di `.cache`) contenente i documenti già letti. """
+
+CACHE_DOCUMENTI_MAX_VOCI = 5
+""" Numero massimo di file XML (distinti per contenuto) conservati nella cache dei documenti. """
+
+ERRORI_LETTURA_CACHE = (OSError, ValueError, KeyError)
+""" Errori sollevati leggendo una voce della cache dei documenti mancante, troncata o non valida. """
+
+
+class CacheDocumenti(object):
+    """Cache su disco dei documenti già letti, indicizzata per contenuto del file XML.
+
+    Ogni voce è una sottocartella (il cui nome è l'hash del contenuto dell'XML) contenente
+    i blocchi di documenti letti, ognuno salvato come tabella in formato colonnare (vedi
+    `shared.columnar`) nella sottocartella `0`, `1`, ecc.: un export invariato può essere
+    caricato senza analizzare di nuovo l'XML e, sia in scrittura che in lettura, in memoria
+    si trova un solo blocco alla volta.
+
+    La ricerca avviene in due livelli:
+
+    1. Dimensione e data di modifica del file (nessuna lettura del file);
+    2. Hash del contenuto, calcolato solo se il primo livello non trova nulla (es. il file
+       è stato esportato di nuovo, o è l'XML temporaneo creato aggiungendo `files.input.addition`).
+
+    Al salvataggio vengono eliminate le voci non valide e quelle usate meno di recente,
+    mantenendone al massimo `max_voci`.
+    """
+
+    VERSIONE = "3"
+    """ Versione delle voci: da aggiornare se cambia il modo in cui i documenti vengono letti o tipizzati. """
+
+    METADATI_FILENAME = "voce.json"
+
+    def __init__(
+        self, cartella: Union[str, Path], max_voci: int = CACHE_DOCUMENTI_MAX_VOCI
+    ) -> None:
+        """Inizializza la cache senza leggere nulla dal disco.
+
+        Args:
+            cartella (str | Path): Cartella contenente le voci della cache.
+            max_voci (int, optional): Numero massimo di voci da conservare. Defaults to CACHE_DOCUMENTI_MAX_VOCI.
+        """
+        self.cartella = Path(cartella)
+        self.max_voci = max_voci
+
+        # Impronte calcolate durante la ricerca, per non ricalcolare l'hash al salvataggio
+        self._impronte: dict[Path, FileFingerprint] = {}
+
+    def carica(self, source: Union[str, Path]) -> Optional[Iterator[pd.DataFrame]]:
+        """Restituisce i documenti già letti dal file indicato (`None` se non presenti in cache).
+
+        Args:
+            source (str | Path): Percorso all'XML di Easyfatt.
+
+        Returns:
+            Iterator[pd.DataFrame] | None: I blocchi di documenti (un documento per riga), letti dal disco uno alla volta.
+        """
+        source = Path(source).resolve()
+        impronta = FileFingerprint.of(source)
+
+        try:
+            # 1. Stesso file, invariato dall'ultima lettura
+            for voce, metadati in self._voci():
+                salvata = FileFingerprint.from_dict(metadati.get("fingerprint"))
+                if (
+                    metadati.get("source") == str(source)
+                    and salvata is not None
+                    and salvata.same_stat(impronta)
+                ):
+                    return self._leggi(voce, metadati, source, salvata)
+
+            # 2. Stesso contenuto (es. file esportato di nuovo)
+            impronta = impronta.with_digest(source)
+            self._impronte[source] = impronta
+
+            voce = self.cartella / str(impronta.digest)
+            metadati = self._metadati(voce)
+            if metadati is not None:
+                return self._leggi(voce, metadati, source, impronta)
+        except Exception as err:
+            logger.error(
+                f"Errore in fase di recupero cache documenti ({repr(err)}). Proseguo normalmente"
+            )
+
+        return None
+
+    def salva(
+        self, source: Union[str, Path], blocchi: Iterable[pd.DataFrame]
+    ) -> Iterator[pd.DataFrame]:
+        """Salva i blocchi di documenti letti dal file indicato man mano che vengono restituiti.
+
+        I blocchi vengono restituiti invariati: un errore durante il salvataggio viene solo
+        riportato nel log. La voce viene salvata (eliminando quelle in eccesso) solo al
+        termine della lettura, per cui una lettura interrotta non lascia voci incomplete.
+
+        Args:
+            source (str | Path): Percorso all'XML di Easyfatt da cui vengono letti i documenti.
+            blocchi (Iterable[pd.DataFrame]): I blocchi di documenti.
+
+        Yields:
+            pd.DataFrame: Gli stessi blocchi ricevuti.
+        """
+        source = Path(source).resolve()
+
+        temporanea: Optional[Path] = None
+        try:
+            impronta = FileFingerprint.of(source)
+            if source in self._impronte and self._impronte[source].same_stat(impronta):
+                impronta = self._impronte[source]
+            else:
+                impronta = impronta.with_digest(source)
+
+            temporanea = self.cartella / f"{impronta.digest}.tmp-{os.getpid()}"
+            shutil.rmtree(temporanea, ignore_errors=True)
+            temporanea.mkdir(parents=True)
+        except Exception as err:
+            logger.error(f"Impossibile salvare la cache dei documenti ({repr(err)})")
+            temporanea = None
+
+        numero_blocchi = 0
+        numero_documenti = 0
+        completata = False
+        try:
+            for blocco in blocchi:
+                if temporanea is not None:
+                    try:
+                        columnar.write_table(
+                            blocco.reset_index(drop=True),
+                            temporanea / str(numero_blocchi),
+                        )
+                        numero_blocchi += 1
+                        numero_documenti += len(blocco)
+                    except Exception as err:
+                        logger.error(
+                            f"Impossibile salvare la cache dei documenti ({repr(err)})"
+                        )
+                        shutil.rmtree(temporanea, ignore_errors=True)
+                        temporanea = None
+
+                yield blocco
+
+            completata = True
+        finally:
+            if temporanea is not None:
+                if completata:
+                    self._completa(
+                        temporanea, source, impronta, numero_blocchi, numero_documenti
+                    )
+                else:
+                    shutil.rmtree(temporanea, ignore_errors=True)
+
+    def _completa(
+        self,
+        temporanea: Path,
+        source: Path,
+        impronta: FileFingerprint,
+        numero_blocchi: int,
+        numero_documenti: int,
+    ) -> None:
+        try:
+            voce = self.cartella / str(impronta.digest)
+            self._scrivi_metadati(
+                temporanea, source, impronta, numero_blocchi, numero_documenti
+            )
+
+            if voce.exists():
+                shutil.rmtree(voce)
+            os.replace(temporanea, voce)
+            logger.debug(f"Documenti di '{source}' salvati nella cache '{voce}'")
+
+            self.pulisci()
+        except Exception as err:
+            shutil.rmtree(temporanea, ignore_errors=True)
+            logger.error(f"Impossibile salvare la cache dei documenti ({repr(err)})")
+
+    def pulisci(self) -> None:
+        """Elimina le voci non valide (es. di una versione precedente) e quelle usate meno di recente."""
+        if not self.cartella.is_dir():
+            return
+
+        valide: list[tuple[str, Path]] = []
+        for voce in self.cartella.iterdir():
+            if not voce.is_dir():
+                continue
+
+            metadati = self._metadati(voce)
+            if metadati is None:
+                # Voce non valida o scritta a metà (es. esecuzione interrotta)
+                if not voce.name.partition(".tmp-")[1]:
+                    shutil.rmtree(voce, ignore_errors=True)
+                continue
+
+            valide.append((str(metadati.get("used", "")), voce))
+
+        for _, voce in sorted(valide, reverse=True)[self.max_voci :]:
+            logger.debug(f"Elimino la voce '{voce.name}' dalla cache dei documenti")
+            shutil.rmtree(voce, ignore_errors=True)
+
+    def _voci(self) -> Iterator[tuple[Path, dict[str, Any]]]:
+        if not self.cartella.is_dir():
+            return
+
+        for voce in self.cartella.iterdir():
+            metadati = self._metadati(voce)
+            if metadati is not None:
+                yield voce, metadati
+
+    def _metadati(self, voce: Path) -> Optional[dict[str, Any]]:
+        try:
+            metadati = json.loads(
+                (voce / self.METADATI_FILENAME).read_text(encoding="utf-8")
+            )
+        except (OSError, ValueError):
+            return None
+
+        if metadati.get("version", None) != self.VERSIONE:
+            return None
+
+        return metadati
+
+    def _leggi(
+        self,
+        voce: Path,
+        metadati: dict[str, Any],
+        source: Path,
+        impronta: FileFingerprint,
+    ) -> Iterator[pd.DataFrame]:
+        numero_blocchi = int(metadati["blocks"])
+        numero_documenti = int(metadati["documents"])
+        try:
+            for indice in range(numero_blocchi):
+                columnar.verify_table(voce / str(indice))
+        except ERRORI_LETTURA_CACHE:
+            # La voce non potrà mai essere letta: viene eliminata e l'XML analizzato di nuovo
+            shutil.rmtree(voce, ignore_errors=True)
+            raise
+
+        # Aggiorno i dati del file, in modo da trovarlo subito alla prossima esecuzione
+        self._scrivi_metadati(voce, source, impronta, numero_blocchi, numero_documenti)
+        logger.info(
+            f"Documenti di '{source}' caricati dalla cache ({numero_documenti} documenti)"
+        )
+
+        return self._blocchi(voce, numero_blocchi)
+
+    def _blocchi(self, voce: Path, numero_blocchi: int) -> Iterator[pd.DataFrame]:
+        try:
+            for indice in range(numero_blocchi):
+                yield columnar.read_table(voce / str(indice))
+        except ERRORI_LETTURA_CACHE:
+            shutil.rmtree(voce, ignore_errors=True)
+            raise
+
+    def _scrivi_metadati(
+        self,
+        voce: Path,
+        source: Path,
+        impronta: FileFingerprint,
+        numero_blocchi: int,
+        numero_documenti: int,
+    ) -> None:
+        (voce / self.METADATI_FILENAME).write_text(
+            json.dumps(
+                {
+                    "version": self.VERSIONE,
+                    "source": str(source),
+                    "fingerprint": impronta.to_dict(),
+                    "used": datetime.datetime.now().isoformat(),
+                    "blocks": numero_blocchi,
+                    "documents": numero_documenti,
+                }
+            ),
+            encoding="utf-8",
+        )
+
+
+class DocumentiEasyfatt(object):
+    """Documenti di un XML di Easyfatt, letti una sola volta e condivisi tra le varie fasi.
+
+    L'XML viene analizzato solo al primo accesso (tramite `blocchi()` o una delle viste)
+    e un'unica volta. Dalla lettura vengono conservate solo le colonne indicate in
+    `conserva` (tutte se `None`), che alimentano le viste `dataframe` e `pesi`: in questo
+    modo la generazione del CSV può procedere a blocchi senza tenere in memoria l'intero
+    file, mentre le fasi successive riutilizzano i dati già letti.
+
+    Se `cache=True` e `source` è un percorso, i blocchi di documenti vengono salvati man
+    mano nella cache dei documenti (vedi `CacheDocumenti`): le esecuzioni successive sullo
+    stesso export non analizzano più l'XML e rileggono i blocchi dalla cache, uno alla volta.
+
+    Example:
+        ```python
+        documenti = DocumentiEasyfatt("Documenti.DefXml", conserva=["TransportedWeight"])
+
+        for blocco in documenti.blocchi():
+            ...  # Elaborazione a blocchi (es. generazione CSV)
+
+        peso = documenti.pesi  # Nessuna nuova lettura dell'XML
+        ```
+    """
+
+    def __init__(
+        self,
+        source: Union[str, Path, IO[bytes], IO[str], ET.Element],
+        conserva: Optional[Iterable[str]] = None,
+        dimensione_blocco: int = DIMENSIONE_BLOCCO,
+        backend: Optional[str] = None,
+        cache: bool = False,
+        cache_path: Optional[Union[str, Path]] = None,
+    ) -> None:
+        """Inizializza l'oggetto senza leggere l'XML.
+
+        Args:
+            source (str | Path | IO | ET.Element): Percorso, file o elemento radice (già analizzato) dell'XML.
+            conserva (Iterable[str], optional): Colonne da conservare per le viste successive. Defaults to None (tutte).
+            dimensione_blocco (int, optional): Numero di documenti per blocco. Defaults to DIMENSIONE_BLOCCO.
+            backend (str, optional): Libreria da usare per analizzare l'XML (vedi `xml_parser`). Defaults to None (valore di `options.xml.parser`).
+            cache (bool, optional): Se riutilizzare i documenti già letti nelle esecuzioni precedenti (solo se `source` è un percorso). Defaults to False.
+            cache_path (str | pathlib.Path, optional): Percorso alla cartella contenente la cache. Defaults to None (cartella `.cache` accanto all'eseguibile).
+        """
+        if dimensione_blocco < 1:
+            raise ValueError("La dimensione del blocco deve essere maggiore di 0")
+
+        self.source = source
+        self.conserva = list(conserva) if conserva is not None else None
+        self.dimensione_blocco = dimensione_blocco
+        self.backend = backend
+
+        self._cache: Optional[CacheDocumenti] = None
+        if cache and isinstance(source, (str, Path)):
+            self._cache = CacheDocumenti(
+                Path(
+                    cache_path
+                    if cache_path
+                    else bundle.get_execution_directory() / ".cache"
+                )
+                / CACHE_DOCUMENTI_DIRNAME
+            )
+
+        self._letto = False
+        self._conservati: list[pd.DataFrame] = []
+        self._dataframe: Optional[pd.DataFrame] = None
+
+    def blocchi(self) -> Iterator[pd.DataFrame]:
+        """Restituisce i documenti a blocchi di (al massimo) `dimensione_blocco` righe.
+
+        Raises:
+            RuntimeError: Se i documenti sono già stati letti ma non sono stati conservati tutti.
+
+        Yields:
+            pd.DataFrame: Un blocco di documenti (un documento per riga).
+        """
+        if self._letto:
+            if self.conserva is not None:
+                raise RuntimeError(
+                    "I documenti sono già stati letti e sono state conservate solo le colonne "
+                    + ", ".join(self.conserva)
+                )
+
+            dataframe = self.dataframe
+            for inizio in range(0, len(dataframe), self.dimensione_blocco):
+                yield dataframe.iloc[inizio : inizio + self.dimensione_blocco]
+            return
+
+        for blocco in self._leggi_blocchi():
+            if self.conserva is None:
+                self._conservati.append(blocco)
+            else:
+                self._conservati.append(
+                    blocco[[c for c in self.conserva if c in blocco.columns]]
+                )
+
+            yield blocco
+
+        self._letto = True
+        logger.debug(f"Lettura documenti terminata ({len(self.dataframe)} documenti)")
+
+    @property
+    def dataframe(self) -> pd.DataFrame:
+        """DataFrame con le colonne conservate di tutti i documenti."""
+        if not self._letto:
+            for _ in self.blocchi():
+                pass
+
+        if self._dataframe is None:
+            self._dataframe = (
+                pd.concat(self._conservati, ignore_index=True)
+                if self._conservati
+                else pd.DataFrame()
+            )
+            self._conservati = []
+
+        return self._dataframe
+
+    @property
+    def pesi(self) -> pd.Series:
+        """Valori (non elaborati) del tag `TransportedWeight` di tutti i documenti."""
+        dataframe = self.dataframe
+        if "TransportedWeight" not in dataframe.columns:
+            return pd.Series([None] * len(dataframe), dtype=object)
+
+        return dataframe["TransportedWeight"]
+
+    def _leggi_blocchi(self) -> Iterator[pd.DataFrame]:
+        if is_elemento(self.source):
+            elementi = self.source.findall("./Documents/Document")
+            for inizio in range(0, len(elementi), self.dimensione_blocco):
+                yield crea_dataframe(
+                    [
+                        leggi_documento(elemento)
+                        for elemento in elementi[
+                            inizio : inizio + self.dimensione_blocco
+                        ]
+                    ]
+                )
+            return
+
+        if self._cache is None:
+            yield from leggi_documenti(
+                self.source, self.dimensione_blocco, backend=self.backend
+            )
+            return
+
+        letti = 0
+        salvati = self._cache.carica(self.source)  # type: ignore[arg-type]
+        if salvati is not None:
+            while True:
+                try:
+                    blocco = next(salvati, None)
+                except ERRORI_LETTURA_CACHE as err:
+                    # Es. file della voce eliminato o troncato dopo la verifica
+                    logger.error(
+                        f"Errore in fase di lettura cache documenti ({repr(err)}). Analizzo di nuovo l'XML"
+                    )
+                    break
+
+                if blocco is None:
+                    return
+
+                # I blocchi salvati potrebbero essere stati letti con una dimensione diversa
+                for inizio in range(0, len(blocco), self.dimensione_blocco):
+                    parte = blocco.iloc[inizio : inizio + self.dimensione_blocco]
+                    yield parte
+                    letti += len(parte)
+
+        # Se la lettura della cache si è interrotta, i documenti già restituiti vengono saltati
+        yield from _salta_documenti(
+            self._cache.salva(
+                self.source,  # type: ignore[arg-type]
+                leggi_documenti(
+                    self.source, self.dimensione_blocco, backend=self.backend
+                ),
+            ),
+            letti,
+        )
+
+
+def _salta_documenti(
+    blocchi: Iterable[pd.DataFrame], numero: int
+) -> Iterator[pd.DataFrame]:
+    """Restituisce i blocchi indicati, escludendo i primi `numero` documenti."""
+    for blocco in blocchi:
+        if numero >= len(blocco):
+            numero -= len(blocco)
+            continue
+
+        yield blocco.iloc[numero:] if numero else blocco
+        numero = 0
+
+
+def leggi_documenti(
+    source: Union[str, Path, IO[bytes], IO[str]],
+    dimensione_blocco: int = DIMENSIONE_BLOCCO,
+    backend: Optional[str] = None,
+) -> Iterator[pd.DataFrame]:
+    """Legge i tag `./Documents/Document` in modo incrementale.
+
+    Ogni documento viene convertito con le stesse regole di `pd.read_xml` (testo dei
+    tag figli e attributi) e tutti i valori vengono letti come stringhe (vedi `crea_dataframe`).
+    Gli elementi già elaborati vengono rimossi dall'albero, per cui la memoria occupata
+    dipende solo da `dimensione_blocco` e non dalla dimensione del file.
+
+    Args:
+        source (str | Path | IO): Percorso o file contenente l'XML di Easyfatt.
+        dimensione_blocco (int, optional): Numero massimo di documenti per blocco. Defaults to DIMENSIONE_BLOCCO.
+        backend (str, optional): Libreria da usare per analizzare l'XML (vedi `xml_parser`). Defaults to None (valore di `options.xml.parser`).
+
+    Yields:
+        pd.DataFrame: Un blocco di documenti (un documento per riga).
+    """
+    if dimensione_blocco < 1:
+        raise ValueError("La dimensione del blocco deve essere maggiore di 0")
+
+    # `lxml` accetta solo file binari: per quelli di testo uso la libreria standard
+    if nome_backend(backend) == "lxml" and not isinstance(source, io.TextIOBase):
+        documenti = _documenti_lxml(source)
+    else:
+        documenti = _documenti_etree(source)
+
+    blocco: list[dict[str, Optional[str]]] = []
+    for documento in documenti:
+        blocco.append(documento)
+
+        if len(blocco) >= dimensione_blocco:
+            yield crea_dataframe(blocco)
+            blocco = []
+
+    if blocco:
+        yield crea_dataframe(blocco)
+
+
+def _documenti_etree(
+    source: Union[str, Path, IO[bytes], IO[str]],
+) -> Iterator[dict[str, Optional[str]]]:
+    percorso: list[ET.Element] = []
+    for evento, elemento in ET.iterparse(source, events=("start", "end")):
+        if evento == "start":
+            percorso.append(elemento)
+            continue
+
+        percorso.pop()
+        if not (
+            len(percorso) == 2
+            and elemento.tag == "Document"
+            and percorso[1].tag == "Documents"
+        ):
+            continue
+
+        yield leggi_documento(elemento)
+
+        # Libero la memoria occupata dal documento appena letto
+        elemento.clear()
+        percorso[1].remove(elemento)
+
+
+def _documenti_lxml(
+    source: Union[str, Path, IO[bytes]],
+) -> Iterator[dict[str, Optional[str]]]:
+    etree: Any = carica_backend("lxml")
+
+    # Il filtro sul tag viene applicato direttamente da `lxml`, senza passare da Python
+    parser = etree.XMLPullParser(events=("end",), tag="Document")
+
+    file = source if hasattr(source, "read") else open(source, "rb")
+    try:
+        while blocco := file.read(DIMENSIONE_LETTURA):  # type: ignore[union-attr]
+            parser.feed(blocco)
+
+            for _, elemento in parser.read_events():
+                documents = elemento.getparent()
+                if (
+                    documents is None
+                    or documents.tag != "Documents"
+                    or documents.getparent() is None
+                    or documents.getparent().getparent() is not None
+                ):
+                    continue
+
+                yield leggi_documento(
+                    elemento, figli=elemento.iterchildren(etree.Element)
+                )
+
+                # Libero la memoria occupata dal documento appena letto
+                elemento.clear()
+                documents.remove(elemento)
+
+        parser.close()
+    finally:
+        if file is not source:
+            file.close()  # type: ignore[union-attr]
+
+
+def leggi_documento(
+    elemento: ET.Element, figli: Optional[Iterable[ET.Element]] = None
+) -> dict[str, Optional[str]]:
+    """Converte un tag `Document` in un dizionario, come farebbe `pd.read_xml`.
+
+    Args:
+        elemento (ET.Element): Il tag `Document`.
+        figli (Iterable[ET.Element], optional): I tag figli, se la libreria usata offre un modo più veloce per ottenerli. Defaults to None.
+    """
+    return {
+        **elemento.attrib,
+        **(
+            {elemento.tag: elemento.text}
+            if elemento.text and not elemento.text.isspace()
+            else {}
+        ),
+        **{
+            figlio.tag: figlio.text if figlio.text else None
+            for figlio in (figli if figli is not None else elemento.findall("*"))
+        },
+    }
+
+
+def crea_dataframe(documenti: list[dict[str, Optional[str]]]) -> pd.DataFrame:
+    """Crea un DataFrame a partire dai documenti letti, come farebbe `pd.read_xml`.
+
+    Tutte le colonne vengono lette come stringhe (i tag vuoti o assenti restano `NaN`):
+    il tipo dedotto da `pd.read_xml` dipenderebbe dagli altri valori del blocco, per cui
+    lo stesso documento verrebbe convertito diversamente (es. `12` come `12.0`, `0` come
+    numero) a seconda di dove cadono i limiti dei blocchi.
+    """
+    colonne = list(dict.fromkeys(chiave for d in documenti for chiave in d.keys()))
+
+    with TextParser(
+        [[d.get(colonna, None) for colonna in colonne] for d in documenti],
+        names=colonne,
+        dtype=str,
+    ) as parser:
+        return parser.read()
@@ -0,0 +1,40 @@
+"""Lettura delle sole colonne richieste dei fogli di calcolo esportati da Easyfatt."""
+
+from pathlib import Path
+from typing import Iterable, Optional, Union
+import logging
+
+import pandas as pd
+
+logger = logging.getLogger("danea-easyfatt.fogli")
+logger.addHandler(logging.NullHandler())
+
+
+def leggi_foglio(
+    filename: Union[str, Path], colonne: Optional[Iterable[str]] = None
+) -> pd.DataFrame:
+    """Legge il primo foglio del file, conservando solo le colonne indicate.
+
+    Il file viene letto con `pd.read_excel`, per cui il risultato coincide con quello di
+    `pd.read_excel(filename, dtype=str)[colonne]`.
+
+    Args:
+        filename (str | Path): Percorso al file `.xlsx` o `.ods`.
+        colonne (Iterable[str], optional): Nomi delle colonne da leggere (quelle non presenti vengono ignorate). Defaults to None (tutte).
+
+    Returns:
+        pd.DataFrame: Le colonne lette (tutti i valori come stringhe), nell'ordine in cui compaiono nel foglio.
+    """
+    if colonne is None:
+        return pd.read_excel(filename, dtype=str)
+
+    richieste = set(colonne)
+    df = pd.read_excel(
+        filename, dtype=str, usecols=lambda colonna: colonna in richieste
+    )
+
+    logger.debug(
+        f"Lette {len(df.columns)} colonne dal file '{filename}' ({len(df)} righe)"
+    )
+
+    return df
@@ -1,15 +1,14 @@
 """Entry point of the application."""
 
-from io import StringIO
 import json
 import os
 from pathlib import Path
 import subprocess
 import sys
+import tempfile
 from typing import Optional
 import logging
 
-import pandas as pd
 import pyperclip
 
 from rich.prompt import Confirm
@@ -17,23 +16,19 @@ from veryeasyfatt.shared.ui.SelectableMenu import SelectableMenu, Option
 
 from veryeasyfatt.app.constants import ApplicationGoals
 
-from veryeasyfatt.app.process_kml import generate_kml, populate_cache
+from veryeasyfatt.app.documenti import DocumentiEasyfatt
+from veryeasyfatt.app.process_batch import genera_batch, trova_file_batch
+from veryeasyfatt.app.process_kml import generate_kml, populate_cache, search_location
 from veryeasyfatt.app.process_xml import modifica_xml
-from veryeasyfatt.app.process_csv import genera_csv
+from veryeasyfatt.app.process_csv import genera_righe_csv, scrivi_csv
 from veryeasyfatt.app.registry import find_install_location
-from veryeasyfatt.shared.measuring import unit_registry
+import veryeasyfatt.shared.measuring as measuring
+from veryeasyfatt.shared.weights import parse_weights
 
 from veryeasyfatt.configuration import settings
 
 logger = logging.getLogger("danea-easyfatt.application.core")
 
-EASYFATT_DOCUMENT_DTYPE = {
-    "CustomerCode": str,
-    "CustomerPostcode": str,
-    "CustomerVatCode": str,
-    "CustomerTel": str,
-}
-
 
 def require_files(required_files: list[Path]) -> None:
     """Verifica che i file richiesti esistano.
@@ -72,6 +67,10 @@ def main(goal: Optional[str] = None) -> bool:
                     label="Generatore KML per Google Earth",
                     value=ApplicationGoals.KML_GENERATOR.value,
                 ),
+                Option(
+                    label="Generatore CSV multiplo (batch)",
+                    value=ApplicationGoals.BATCH_GENERATOR.value,
+                ),
                 Option(
                     label="Inizializza cache geografica (Google Maps)",
                     value=ApplicationGoals.INITIALIZE_GEO_CACHE.value,
@@ -104,73 +103,67 @@ def main(goal: Optional[str] = None) -> bool:
             return False
 
         # 1. Modifico l'XML
-        nuovo_xml: str
-        if settings.files.input.addition is not None:
+        #
+        # L'XML viene analizzato una sola volta: i documenti letti vengono condivisi
+        # tra la generazione del CSV e il calcolo del peso totale, e salvati nella
+        # cache per le esecuzioni successive sullo stesso export.
+        documenti: DocumentiEasyfatt
+        cartella_temporanea: Optional[tempfile.TemporaryDirectory] = None
+        if settings.files.input.addition:
             try:
-                # Aggiunge il contenuto di `additional_xml_file` all'interno di `easyfatt_xml`
-                nuovo_xml = modifica_xml()
+                # Aggiunge il contenuto dei file `addition` all'interno di `easyfatt_xml`,
+                # salvando l'XML modificato in una cartella temporanea.
+                cartella_temporanea = tempfile.TemporaryDirectory(
+                    prefix="veryeasyfatt-"
+                )
+                xml_modificato, report = modifica_xml(
+                    Path(cartella_temporanea.name)
+                    / Path(settings.files.input.easyfatt).name
+                )
+                documenti = DocumentiEasyfatt(
+                    xml_modificato, conserva=["TransportedWeight"], cache=True
+                )
 
-                logger.info(f"Analisi e modifica XML terminata..")
+                logger.info(f"Analisi e modifica XML terminata ({report})")
             except Exception as e:
                 logger.exception(f"Errore durante la modifica del file XML: {repr(e)}")
                 return False
         else:
-            nuovo_xml = (
-                Path(settings.files.input.easyfatt).resolve().read_text(encoding="utf8")
+            documenti = DocumentiEasyfatt(
+                Path(settings.files.input.easyfatt).resolve(),
+                conserva=["TransportedWeight"],
+                cache=True,
             )
 
-        # 2. Genero il CSV sulla base del template
+        # 2. Genero il CSV sulla base del template, scrivendo le righe man mano che vengono generate
         try:
-            righe_csv = genera_csv(xml_text=nuovo_xml)
+            scrivi_csv(
+                genera_righe_csv(documenti, cache=True), settings.files.output.csv
+            )
+
+            logger.info(f"Creazione CSV '{settings.files.output.csv}' terminata..")
 
             if Confirm.ask(
                 f"Copiare negli appunti il contenuto del CSV?",
                 choices=["s", "n"],
             ):
-                pyperclip.copy("\n".join(righe_csv))
+                pyperclip.copy(Path(settings.files.output.csv).read_text())
                 logger.info("Righe CSV copiate negli appunti.")
-
-            # Salvo il csv su file
-            with open(settings.files.output.csv, "w") as csv_file:
-                csv_file.write("\n".join(righe_csv))
-
-            logger.info(f"Creazione CSV '{settings.files.output.csv}' terminata..")
         except Exception:
             logger.exception("Errore durante la generazione del file CSV.")
             return False
+        finally:
+            if cartella_temporanea is not None:
+                cartella_temporanea.cleanup()
 
         # 3. Calcolo il peso totale della spedizione
         try:
-            df = pd.read_xml(
-                StringIO(nuovo_xml),
-                parser="etree",
-                xpath="./Documents/Document",
-                dtype=EASYFATT_DOCUMENT_DTYPE,  # type: ignore
-            )
+            # Converto tutti i valori a grammi in un'unica passata sull'intera colonna,
+            # usando `pint` solo per la visualizzazione del totale.
+            pesi = parse_weights(documenti.pesi)
 
-            # Effettuo una prima pulizia dei valori a solo scopo di visualizzazione.
-            # Successivamente, per il calcolo del peso totale, converto tutti i valori a grammi.
-            #
-            # IMPORTANTE: Per evitare valori sballati nel totale sono costretto a
-            #             trasformare il separatore decimale nel formato inglese (.)
-            df["TransportedWeight"] = df["TransportedWeight"].map(
-                lambda v: (
-                    v
-                    if (v is None or pd.isnull(v))
-                    else unit_registry.Quantity(
-                        str(v).replace(".", "").replace(",", ".").lower()
-                    )
-                    .to("g")
-                    .magnitude
-                )
-            )
-
-            df_weight_sum = df["TransportedWeight"].sum()
-            peso_totale = (
-                unit_registry.Quantity(df_weight_sum, "g")
-                if not pd.isna(df_weight_sum)
-                else unit_registry.Quantity(0, "g")
-            )
+            unit_registry = measuring.get_unit_registry()
+            peso_totale = unit_registry.Quantity(pesi.sum(), "g")
             print(
                 f"Peso totale calcolato: {peso_totale.to('kg')} ({peso_totale.to('q')} / {peso_totale.to('t')})"
             )
@@ -212,6 +205,9 @@ def main(goal: Optional[str] = None) -> bool:
             logger.critical(e)
             return False
 
+        # La cache delle coordinate viene caricata mentre viene letto il file XML
+        search_location.warm(background=True)
+
         logger.info("Inizio generazione contenuto KML...")
 
         kml_string = generate_kml()
@@ -241,6 +237,49 @@ def main(goal: Optional[str] = None) -> bool:
                 "Assicurarsi che Google Earth Pro sia installato correttamente per poter aprire il file KML."
             )
 
+    elif goal == ApplicationGoals.BATCH_GENERATOR.value:
+        if settings.files.input.batch == "":
+            logger.error(
+                "La cartella o il pattern dei file da elaborare (`files.input.batch`) non è stato specificato nel file di configurazione."
+            )
+            return False
+
+        files = trova_file_batch(settings.files.input.batch)
+        if not files:
+            logger.critical(
+                f"Nessun file trovato che corrisponda a '{settings.files.input.batch}'"
+            )
+            return False
+
+        logger.info(f"Trovati {len(files)} file da elaborare")
+
+        if settings.options.batch.generate_kml:
+            if settings.easyfatt.database.filename is None:
+                logger.error(
+                    "Il file di database non è stato specificato nel file di configurazione."
+                )
+                return False
+
+            if settings.features.kml_generation.google_api_key in [None, ""]:
+                logger.error(
+                    "La chiave API di Google Geocoding non è stata specificata nel file di configurazione. "
+                    + "Seguire la guida al seguente URL: 'https://github.com/LukeSavefrogs/danea-easyfatt/issues/17#issuecomment-1699004094'"
+                )
+                return False
+
+        risultati = genera_batch(
+            files,
+            cartella_output=settings.files.output.batch,
+            genera_kml=settings.options.batch.generate_kml,
+        )
+
+        errori = [risultato for risultato in risultati if not risultato.successo]
+        logger.info(
+            f"Procedura terminata ({len(risultati) - len(errori)} file elaborati correttamente, {len(errori)} con errori)."
+        )
+
+        return not errori
+
     elif goal in [
         ApplicationGoals.INITIALIZE_GEO_CACHE.value,
         ApplicationGoals.INITIALIZE_GEO_CACHE_DRYRUN.value,
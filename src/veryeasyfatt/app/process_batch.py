@@ -0,0 +1,225 @@
+"""Generazione di CSV (ed eventualmente KML) per più file `*.DefXml` in un'unica esecuzione."""
+
+from concurrent.futures import ProcessPoolExecutor
+import dataclasses
+import glob
+import os
+from pathlib import Path
+from typing import Optional, Union
+import logging
+
+from veryeasyfatt.app.process_csv import (
+    ContestoCSV,
+    contesto_processo,
+    genera_righe_csv,
+    inizializza_processo,
+    scrivi_csv,
+)
+from veryeasyfatt.app.process_kml import generate_kml, get_all_addresses, populate_cache
+from veryeasyfatt.configuration import settings
+
+logger = logging.getLogger("danea-easyfatt.batch")
+logger.addHandler(logging.NullHandler())
+
+
+@dataclasses.dataclass
+class RisultatoBatch:
+    """Esito dell'elaborazione di un singolo file di input."""
+
+    input: Path
+    csv: Path
+    righe: int = 0
+    kml: Optional[Path] = None
+    errore: Optional[Exception] = None
+
+    @property
+    def successo(self) -> bool:
+        return self.errore is None
+
+
+def trova_file_batch(pattern: Union[str, Path]) -> list[Path]:
+    """Restituisce i file `*.DefXml` da elaborare.
+
+    Args:
+        pattern (str | Path): Cartella contenente i file `*.DefXml` oppure pattern glob (es. `export/*.DefXml`).
+
+    Returns:
+        list[Path]: I file trovati, in ordine alfabetico.
+    """
+    percorso = Path(pattern).expanduser()
+
+    if percorso.is_dir():
+        return sorted(
+            file
+            for file in percorso.iterdir()
+            if file.is_file() and file.suffix.lower() == ".defxml"
+        )
+
+    return sorted(
+        Path(file)
+        for file in glob.glob(str(percorso), recursive=True)
+        if Path(file).is_file()
+    )
+
+
+def genera_batch(
+    files: list[Path],
+    cartella_output: Union[str, Path, None] = None,
+    genera_kml: bool = False,
+    processi: Optional[int] = None,
+) -> list[RisultatoBatch]:
+    """Genera un CSV (e, se richiesto, un KML) per ognuno dei file indicati.
+
+    Il contesto del CSV (template, orari di consegna dei clienti e orario di default)
+    viene caricato una sola volta e condiviso tra tutti i file, che vengono elaborati
+    in parallelo. I KML vengono generati al termine, uno alla volta (la geocodifica può
+    richiedere l'intervento dell'utente), leggendo le anagrafiche dal database una sola volta.
+
+    Un errore su un file non interrompe l'elaborazione degli altri (e un file il cui CSV
+    coinciderebbe con quello di un file precedente non viene elaborato).
+
+    Args:
+        files (list[Path]): File `*.DefXml` da elaborare.
+        cartella_output (str | Path, optional): Cartella in cui salvare i file generati (con lo stesso percorso relativo degli input). Defaults to None (stessa cartella del file di input).
+        genera_kml (bool, optional): Se generare anche il KML di ogni file. Defaults to False.
+        processi (int, optional): Numero di file elaborati contemporaneamente (`0` per usarne uno per CPU). Defaults to None (valore di `options.output.parallel_workers`).
+
+    Returns:
+        list[RisultatoBatch]: L'esito di ogni file, nello stesso ordine di `files`.
+    """
+    if processi is None:
+        processi = settings.options.output.parallel_workers
+    if processi == 0:
+        processi = os.cpu_count() or 1
+
+    contesto = ContestoCSV.da_configurazione()
+
+    risultati = _risultati_batch(files, cartella_output)
+    da_generare = [
+        indice for indice, risultato in enumerate(risultati) if risultato.successo
+    ]
+
+    logger.info(
+        f"Generazione CSV di {len(da_generare)} file ({min(processi, len(da_generare))} alla volta)"
+    )
+    if processi <= 1:
+        for indice in da_generare:
+            _genera_csv(risultati[indice], contesto)
+    else:
+        with ProcessPoolExecutor(
+            max_workers=processi,
+            initializer=inizializza_processo,
+            initargs=(contesto,),
+        ) as executor:
+            for indice, risultato in zip(
+                da_generare,
+                executor.map(
+                    _genera_csv_processo, [risultati[indice] for indice in da_generare]
+                ),
+            ):
+                risultati[indice] = risultato
+
+    for risultato in risultati:
+        if risultato.successo:
+            logger.info(
+                f"Creazione CSV '{risultato.csv}' terminata ({risultato.righe} righe)"
+            )
+        else:
+            logger.error(
+                f"Errore durante la generazione del CSV di '{risultato.input}': {risultato.errore!r}"
+            )
+
+    if genera_kml:
+        _genera_kml(
+            [risultato for risultato in risultati if risultato.successo],
+        )
+
+    return risultati
+
+
+def _risultati_batch(
+    files: list[Path], cartella_output: Union[str, Path, None]
+) -> list[RisultatoBatch]:
+    """Restituisce i risultati (ancora da elaborare) dei file indicati, con il percorso del CSV da generare.
+
+    Nella cartella di output i file mantengono il percorso relativo alla cartella che
+    contiene tutti gli input (ad es. `2023/Documenti.DefXml` e `2024/Documenti.DefXml`
+    generano `2023/Documenti.csv` e `2024/Documenti.csv`). Se due file generano comunque
+    lo stesso CSV (ad es. `Documenti.DefXml` e `Documenti.xml`), solo il primo viene
+    elaborato e gli altri vengono segnalati come errori.
+    """
+    radice: Optional[Path] = None
+    if cartella_output and files:
+        try:
+            radice = Path(os.path.commonpath([file.resolve().parent for file in files]))
+        except ValueError:
+            # Ad es. file su unità diverse (Windows): i CSV vengono salvati tutti nella cartella di output
+            radice = None
+
+    risultati: list[RisultatoBatch] = []
+    generati: dict[str, Path] = {}
+    for file in files:
+        if not cartella_output:
+            cartella = file.parent
+        elif radice is None:
+            cartella = Path(cartella_output)
+        else:
+            cartella = Path(cartella_output) / file.resolve().parent.relative_to(radice)
+
+        risultato = RisultatoBatch(input=file, csv=cartella / f"{file.stem}.csv")
+
+        chiave = os.path.normcase(os.path.abspath(risultato.csv))
+        if chiave in generati:
+            risultato.errore = FileExistsError(
+                f"Il file '{risultato.csv}' verrebbe generato anche da '{generati[chiave]}'"
+            )
+        else:
+            generati[chiave] = file
+
+        risultati.append(risultato)
+
+    return risultati
+
+
+def _genera_csv(risultato: RisultatoBatch, contesto: ContestoCSV) -> RisultatoBatch:
+    try:
+        risultato.csv.parent.mkdir(parents=True, exist_ok=True)
+        risultato.righe = scrivi_csv(
+            genera_righe_csv(risultato.input, contesto=contesto, processi=1),
+            risultato.csv,
+        )
+    except Exception as err:
+        risultato.errore = err
+
+    return risultato
+
+
+def _genera_kml(risultati: list[RisultatoBatch]) -> None:
+    if not risultati:
+        return
+
+    # Anagrafiche e cache geografica vengono caricate una sola volta per tutti i file
+    anagrafiche = get_all_addresses(settings.easyfatt.database.filename)
+    populate_cache(
+        settings.features.kml_generation.google_api_key, addresses=anagrafiche
+    )
+
+    for risultato in risultati:
+        kml = risultato.csv.with_suffix(".kml")
+        try:
+            kml.write_text(
+                generate_kml(
+                    risultato.input, addresses=anagrafiche, report_metrics=False
+                )
+            )
+            risultato.kml = kml
+            logger.info(f"Creazione KML '{kml}' terminata")
+        except Exception as err:
+            risultato.errore = err
+            logger.error(
+                f"Errore durante la generazione del KML di '{risultato.input}': {err!r}"
+            )
+
+
+def _genera_csv_processo(risultato: RisultatoBatch) -> RisultatoBatch:
+    return _genera_csv(risultato, contesto_processo())
@@ -1,37 +1,50 @@
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+import dataclasses
+import datetime
+import hashlib
 from io import StringIO
+import os
+import pickle
 from pathlib import Path
+import tempfile
+from typing import IO, Iterable, Iterator, Optional, Union
+import numpy as np
 import pandas as pd
-import re
 import logging
 
-from veryeasyfatt.app.clienti import get_intervallo_spedizioni, routexl_time_boundaries
-from veryeasyfatt.shared.formatter import SimpleFormatter
+from veryeasyfatt.app.documenti import (
+    DIMENSIONE_BLOCCO,
+    DocumentiEasyfatt,
+)
+from veryeasyfatt.app.caching import file_mode
+from veryeasyfatt.app.clienti import (
+    errori_database,
+    get_intervallo_spedizioni,
+    get_intervallo_spedizioni_database,
+    normalizza_intervalli,
+    routexl_time_boundaries,
+)
+from veryeasyfatt.shared.formatter import CompiledTemplate, SimpleFormatter
 from veryeasyfatt.configuration import settings
+import veryeasyfatt.bundle as bundle
 
 logger = logging.getLogger("danea-easyfatt.csv")
 logger.addHandler(logging.NullHandler())
 
-EASYFATT_DOCUMENT_DTYPE = {
-    "CustomerCode": str,
-    "CustomerPostcode": str,
-    "DeliveryPostcode": str,
-    "CustomerVatCode": str,
-    "CustomerTel": str,
-}
 
+def _carica_intervallo_spedizioni() -> dict[str, str]:
+    """Carica gli intervalli di consegna dal primo file clienti trovato.
 
-def genera_csv(
-    xml_text: str,
-    extra_field_orario=4,
-):
-    lista_file_clienti = settings.easyfatt.customers.export_filename
+    Se nessun file clienti è configurato (o nessuno di quelli indicati esiste) ma è
+    configurato il database di Easyfatt, gli intervalli vengono letti dal database.
+    Se il database non può essere letto vengono usati gli orari predefiniti.
 
-    logger.debug(f"Trasformo l'XML in un dizionario")
-    safe_formatter = SimpleFormatter()
-
-    default_time_boundary = routexl_time_boundaries(
-        settings.features.shipping.default_interval
-    )
+    Returns:
+        dict[str, str]: Intervalli di consegna per codice cliente (vuoto se nessun file è stato trovato).
+    """
+    lista_file_clienti = settings.easyfatt.customers.export_filename or []
+    database = settings.easyfatt.database.filename
 
     # Trasformo il CSV in un dizionario, in modo da poterlo traversare facilmente.
     intervallo_spedizioni = {}
@@ -50,90 +63,527 @@ def genera_csv(
             )
             break
     else:
-        logger.error(
-            f"Nessun file trovato che corrisponda al pattern '{'|'.join(map(str, lista_file_clienti))}'"
-        )
-        logger.warning(f"Gestione automatica degli orari di consegna disabilitata.")
+        if database is not None:
+            logger.info(f"Leggo gli orari di consegna dal database '{database}'")
+            try:
+                intervallo_spedizioni = get_intervallo_spedizioni_database(
+                    database=database,
+                    extra_field_id=settings.easyfatt.customers.custom_field,
+                )
+            except errori_database() as err:
+                # Il database è solo un'alternativa al file clienti: se non è
+                # leggibile (o Firebird non è installato, dato che qui non viene
+                # scaricato) si procede con gli orari di consegna predefiniti.
+                logger.error(
+                    f"Impossibile leggere gli orari di consegna dal database '{database}' ({err!r})"
+                )
+                logger.warning(
+                    f"Gestione automatica degli orari di consegna disabilitata."
+                )
+            else:
+                logger.info(f"Gestione automatica degli orari di consegna abilitata.")
+        else:
+            logger.error(
+                f"Nessun file trovato che corrisponda al pattern '{'|'.join(map(str, lista_file_clienti))}'"
+            )
+            logger.warning(f"Gestione automatica degli orari di consegna disabilitata.")
 
     logger.debug(f"Intervallo spedizioni:\n {intervallo_spedizioni}")
 
-    df = pd.read_xml(
-        StringIO(xml_text),
-        parser="etree",
-        xpath="./Documents/Document",
-        dtype=EASYFATT_DOCUMENT_DTYPE,  # type: ignore
-    )
-    df = df.reset_index()  # make sure indexes pair with number of rows
-
-    # TODO: Do not use `iterrows` since it could become very slow with large datasets (see https://stackoverflow.com/a/55557758/8965861).
-    csv_lines = []
-    for index, document in df.iterrows():
-        indirizzo_spedizione = (
-            document["DeliveryAddress"]
-            if document.get("DeliveryAddress", None)
-            else document["CustomerAddress"]
-        )
-        cap_spedizione = (
-            document["DeliveryPostcode"]
-            if document.get("DeliveryAddress", None)
-            else document["CustomerPostcode"]
-        )
-        citta_spedizione = (
-            document["DeliveryCity"]
-            if document.get("DeliveryAddress", None)
-            else document["CustomerCity"]
+    return intervallo_spedizioni
+
+
+@dataclasses.dataclass(frozen=True)
+class ContestoCSV:
+    """Dati necessari per generare le righe del CSV, caricati una sola volta.
+
+    L'oggetto può essere serializzato con `pickle`, per cui può essere inviato
+    (una sola volta) ai processi usati per la generazione in parallelo.
+    """
+
+    template: CompiledTemplate
+    intervallo_spedizioni: dict[str, str]
+    default_time_boundary: Optional[str]
+    extra_field_orario: int = 4
+
+    @classmethod
+    def da_configurazione(cls, extra_field_orario=4) -> "ContestoCSV":
+        """Crea il contesto a partire dalla configurazione corrente (template, orari e file clienti)."""
+        return cls(
+            template=SimpleFormatter().compile(settings.options.output.csv_template),
+            intervallo_spedizioni=_carica_intervallo_spedizioni(),
+            default_time_boundary=routexl_time_boundaries(
+                settings.features.shipping.default_interval
+            ),
+            extra_field_orario=extra_field_orario,
         )
 
-        if document.get("TransportedWeight", None) is not None:
-            weight_matched = re.search(
-                pattern=r"([0-9,.]+)", string=str(document.get("TransportedWeight", ""))
+
+CACHE_RIGHE_FILENAME = "csv_rows.pickle"
+
+COLONNE_RIGA = [
+    "CustomerName",
+    "CustomerCode",
+    "CustomerAddress",
+    "CustomerPostcode",
+    "CustomerCity",
+    "DeliveryAddress",
+    "DeliveryPostcode",
+    "DeliveryCity",
+    "TransportedWeight",
+]
+""" Colonne del documento da cui dipende la riga del CSV (oltre al campo dell'orario). """
+
+
+class CacheRigheCSV(object):
+    """Cache su file delle righe CSV già generate, indicizzate per contenuto del documento.
+
+    La chiave di ogni riga è l'hash dei campi del documento usati per generarla, per cui
+    un documento invariato tra due export produce sempre la stessa riga e non deve essere
+    rigenerato. L'intera cache viene invalidata se cambiano il template, gli intervalli
+    di consegna dei clienti o l'intervallo di default (vedi `impronta`).
+
+    Al salvataggio vengono mantenute solo le righe dei documenti dell'ultima esecuzione,
+    per cui la dimensione del file non cresce nel tempo.
+    """
+
+    VERSIONE = "1"
+
+    def __init__(self, filename: Union[str, Path], contesto: ContestoCSV) -> None:
+        """Carica la cache dal file indicato (se esiste ed è ancora valida).
+
+        Args:
+            filename (str | Path): Percorso al file di cache.
+            contesto (ContestoCSV): Contesto usato per generare le righe.
+        """
+        self.filename = Path(filename)
+        self.impronta = CacheRigheCSV.calcola_impronta(contesto)
+        self.colonna_orario = f"CustomField{contesto.extra_field_orario}"
+
+        self.riutilizzate = 0
+        self.generate = 0
+
+        self._righe: dict[bytes, str] = {}
+        self._usate: dict[bytes, str] = {}
+
+        try:
+            if self.filename.exists():
+                with open(self.filename, "rb") as pickle_file:
+                    cached_data = pickle.load(pickle_file)
+
+                cached_metadata: dict = cached_data.get("metadata", {})
+                if (
+                    cached_metadata.get("version", None) == CacheRigheCSV.VERSIONE
+                    and cached_metadata.get("hash", None) == self.impronta
+                ):
+                    self._righe = cached_data["data"]
+                    logger.debug(
+                        f"Caricate {len(self._righe)} righe CSV dal file di cache '{self.filename}'"
+                    )
+                else:
+                    logger.debug(
+                        f"File di cache '{self.filename}' invalidato. Necessaria rigenerazione di tutte le righe."
+                    )
+        except Exception as err:
+            logger.error(
+                f"Errore in fase di recupero cache righe CSV ({repr(err)}). Proseguo normalmente"
             )
-            peso = weight_matched.group(0) if weight_matched is not None else 0
-        else:
-            peso = 0
-
-        # Orari di spedizione (il minore sovrascrive il maggiore):
-        # 1. Singolo ordine
-        # 2. Profilo clienti
-        # 3. Default
-        #
-        orario_spedizione_ordine = str(
-            document.get(f"CustomField{extra_field_orario}", "")
-        )
+
+    @staticmethod
+    def calcola_impronta(contesto: ContestoCSV) -> str:
+        """Calcola l'hash di tutto ciò che, oltre al documento, influisce sulle righe del CSV."""
+        return hashlib.blake2b(
+            repr(
+                (
+                    contesto.template.format_string,
+                    sorted(contesto.intervallo_spedizioni.items()),
+                    contesto.default_time_boundary,
+                    contesto.extra_field_orario,
+                )
+            ).encode("utf-8"),
+            digest_size=16,
+        ).hexdigest()
+
+    def chiavi(self, df: pd.DataFrame) -> list[bytes]:
+        """Calcola la chiave (hash del contenuto) di ogni documento.
+
+        NOTA: I caratteri `\\x00` e `\\x1f` non possono comparire in un XML, per cui
+              possono essere usati per rappresentare i valori mancanti e separare i campi.
+        """
+        colonne = []
+        for nome in [*COLONNE_RIGA, self.colonna_orario]:
+            colonna = _colonna(df, nome)
+            colonne.append(
+                np.where(
+                    colonna.isna().to_numpy(), "\x00", colonna.to_numpy().astype(str)
+                )
+            )
+
+        return [
+            hashlib.blake2b(
+                "\x1f".join(valori).encode("utf-8"), digest_size=16
+            ).digest()
+            for valori in zip(*colonne)
+        ]
+
+    def dividi(self, df: pd.DataFrame) -> tuple["_RigheBlocco", pd.DataFrame]:
+        """Recupera dalla cache le righe dei documenti già noti.
+
+        Returns:
+            tuple[_RigheBlocco, pd.DataFrame]: Le righe del blocco (`None` se da generare) e i documenti da generare.
+        """
+        chiavi = self.chiavi(df)
+        righe = [self._righe.get(chiave, None) for chiave in chiavi]
+        da_generare = [riga is None for riga in righe]
+
+        return _RigheBlocco(righe=righe, chiavi=chiavi), df[da_generare]
+
+    def completa(self, blocco: "_RigheBlocco", nuove: list[str]) -> list[str]:
+        """Inserisce le righe appena generate nel blocco, aggiornando la cache."""
+        righe = blocco.completa(nuove)
+
+        self.generate += len(nuove)
+        self.riutilizzate += len(righe) - len(nuove)
+        self._usate.update(zip(blocco.chiavi, righe))
+
+        return righe
+
+    def salva(self) -> None:
+        """Salva sul file le righe usate nell'esecuzione corrente."""
         try:
-            orario_spedizione = routexl_time_boundaries(orario_spedizione_ordine)
-        except ValueError:
-            orario_spedizione = None
+            self.filename.parent.mkdir(parents=True, exist_ok=True)
 
-        if orario_spedizione is not None:
-            logger.info(
-                f"Preso orario spedizione da ordine singolo: {orario_spedizione}"
+            # Il file viene scritto a parte e poi sostituito, così un'interruzione non
+            # lascia un file di cache troncato.
+            fd, temp_name = tempfile.mkstemp(
+                dir=self.filename.parent, prefix=f"{self.filename.name}.", suffix=".tmp"
             )
-        else:
-            orario_spedizione = intervallo_spedizioni.get(
-                document["CustomerCode"], None
+            try:
+                with os.fdopen(fd, "wb") as pickle_file:
+                    pickle.dump(
+                        {
+                            "data": self._usate,
+                            "metadata": {
+                                "version": CacheRigheCSV.VERSIONE,
+                                "hash": self.impronta,
+                                "date": datetime.datetime.now(),
+                            },
+                        },
+                        pickle_file,
+                    )
+
+                # `mkstemp` crea il file leggibile solo dal proprietario
+                os.chmod(temp_name, file_mode(self.filename))
+                os.replace(temp_name, self.filename)
+            except BaseException:
+                Path(temp_name).unlink(missing_ok=True)
+                raise
+        except Exception as err:
+            logger.error(f"Impossibile salvare la cache delle righe CSV ({repr(err)})")
+
+
+@dataclasses.dataclass
+class _RigheBlocco:
+    righe: list[Optional[str]]
+    """ Righe del blocco (`None` per quelle ancora da generare). """
+
+    chiavi: list[bytes] = dataclasses.field(default_factory=list)
+
+    def completa(self, nuove: list[str]) -> list[str]:
+        generate = iter(nuove)
+        return [riga if riga is not None else next(generate) for riga in self.righe]
+
+
+def genera_csv(
+    xml_text: str,
+    extra_field_orario=4,
+    cache: bool = False,
+    cache_path: Optional[Union[str, Path]] = None,
+):
+    logger.debug(f"Trasformo l'XML in un dizionario")
+
+    return list(
+        genera_righe_csv(
+            DocumentiEasyfatt(StringIO(xml_text), conserva=[]),
+            extra_field_orario=extra_field_orario,
+            cache=cache,
+            cache_path=cache_path,
+        )
+    )
+
+
+def genera_righe_csv(
+    source: Union[str, Path, IO[bytes], DocumentiEasyfatt],
+    extra_field_orario=4,
+    dimensione_blocco: int = DIMENSIONE_BLOCCO,
+    processi: Optional[int] = None,
+    contesto: Optional[ContestoCSV] = None,
+    cache: bool = False,
+    cache_path: Optional[Union[str, Path]] = None,
+) -> Iterator[str]:
+    """Genera le righe del CSV man mano che i documenti vengono letti dall'XML.
+
+    A differenza di `genera_csv`, l'XML non viene mai caricato interamente in memoria:
+    i tag `Document` vengono letti a blocchi di `dimensione_blocco` elementi, che
+    vengono scartati subito dopo averne generato le righe.
+
+    Con più di un processo i blocchi vengono elaborati in parallelo, mantenendo
+    comunque l'ordine originale dei documenti (il risultato non cambia).
+
+    Se `cache=True` le righe dei documenti invariati rispetto all'esecuzione precedente
+    vengono recuperate dal file di cache invece di essere rigenerate.
+
+    Args:
+        source (str | Path | IO[bytes] | DocumentiEasyfatt): Percorso o file (binario) contenente l'XML di Easyfatt, oppure i documenti già condivisi con le altre fasi.
+        extra_field_orario (int, optional): Numero del campo `CustomField{N}` con l'orario del singolo ordine (ignorato se viene passato `contesto`). Defaults to 4.
+        dimensione_blocco (int, optional): Numero di documenti elaborati alla volta (ignorato se `source` è un `DocumentiEasyfatt`). Defaults to DIMENSIONE_BLOCCO.
+        processi (int, optional): Numero di processi da usare (`0` per usarne uno per CPU). Defaults to None (valore di `options.output.parallel_workers`).
+        contesto (ContestoCSV, optional): Contesto già caricato da riutilizzare. Defaults to None (caricato dalla configurazione).
+        cache (bool, optional): Se riutilizzare le righe già generate nelle esecuzioni precedenti. Defaults to False.
+        cache_path (str | pathlib.Path, optional): Percorso alla cartella contenente il file di cache. Defaults to None.
+
+    Yields:
+        str: Le righe del CSV, nello stesso ordine dei documenti.
+    """
+    if contesto is None:
+        contesto = ContestoCSV.da_configurazione(extra_field_orario=extra_field_orario)
+
+    if processi is None:
+        processi = settings.options.output.parallel_workers
+    if processi == 0:
+        processi = os.cpu_count() or 1
+
+    documenti = (
+        source
+        if isinstance(source, DocumentiEasyfatt)
+        else DocumentiEasyfatt(source, conserva=[], dimensione_blocco=dimensione_blocco)
+    )
+
+    cache_righe: Optional[CacheRigheCSV] = None
+    if cache:
+        cache_righe = CacheRigheCSV(
+            Path(
+                cache_path
+                if cache_path
+                else bundle.get_execution_directory() / ".cache"
             )
-            if orario_spedizione is not None:
-                logger.debug("Preso orario spedizione da profilo cliente")
-            else:
-                orario_spedizione = default_time_boundary
-                logger.debug("Preso orario spedizione da valore di default")
+            / CACHE_RIGHE_FILENAME,
+            contesto,
+        )
+
+    def dividi(df: pd.DataFrame) -> tuple[_RigheBlocco, pd.DataFrame]:
+        if cache_righe is None:
+            return _RigheBlocco(righe=[None] * len(df)), df
+
+        return cache_righe.dividi(df)
 
-        logger.debug(
-            f"Orario di spedizione per il cliente '{document['CustomerCode']}': {orario_spedizione}"
+    def completa(blocco: _RigheBlocco, nuove: list[str]) -> list[str]:
+        if cache_righe is None:
+            return nuove
+
+        return cache_righe.completa(blocco, nuove)
+
+    if processi <= 1:
+        for df in documenti.blocchi():
+            blocco, da_generare = dividi(df)
+            yield from completa(
+                blocco,
+                _genera_righe_csv(da_generare, contesto) if len(da_generare) else [],
+            )
+
+    else:
+        logger.info(f"Generazione righe CSV in parallelo ({processi} processi)")
+        with ProcessPoolExecutor(
+            max_workers=processi,
+            initializer=inizializza_processo,
+            initargs=(contesto,),
+        ) as executor:
+            # Limito i blocchi in elaborazione, in modo da non leggere l'intero XML
+            # in anticipo: i risultati vengono restituiti nell'ordine di invio.
+            in_elaborazione: deque[tuple[_RigheBlocco, Optional[Future[list[str]]]]]
+            in_elaborazione = deque()
+            for df in documenti.blocchi():
+                blocco, da_generare = dividi(df)
+                in_elaborazione.append(
+                    (
+                        blocco,
+                        (
+                            executor.submit(_genera_righe_blocco, da_generare)
+                            if len(da_generare)
+                            else None
+                        ),
+                    )
+                )
+
+                if len(in_elaborazione) >= processi * 2:
+                    blocco, futuro = in_elaborazione.popleft()
+                    yield from completa(blocco, futuro.result() if futuro else [])
+
+            while in_elaborazione:
+                blocco, futuro = in_elaborazione.popleft()
+                yield from completa(blocco, futuro.result() if futuro else [])
+
+    if cache_righe is not None:
+        logger.info(
+            f"Righe CSV riutilizzate dalla cache: {cache_righe.riutilizzate}, generate: {cache_righe.generate}"
         )
+        cache_righe.salva()
+
+
+def scrivi_csv(righe: Iterable[str], destinazione: Union[str, Path]) -> int:
+    """Scrive le righe sul file CSV man mano che vengono generate.
+
+    Args:
+        righe (Iterable[str]): Le righe del CSV (es. restituite da `genera_righe_csv`).
+        destinazione (str | Path): Percorso al file CSV di output.
+
+    Returns:
+        int: Numero di righe scritte.
+    """
+    numero_righe = 0
+    with open(destinazione, "w") as csv_file:
+        for riga_csv in righe:
+            if numero_righe > 0:
+                csv_file.write("\n")
+            csv_file.write(riga_csv)
+            numero_righe += 1
+
+    return numero_righe
+
+
+_contesto_processo: Optional[ContestoCSV] = None
+""" Contesto ricevuto dal processo corrente (solo per i processi di generazione in parallelo). """
 
-        csv_lines.append(
-            safe_formatter.format(
-                settings.options.output.csv_template,
-                CustomerName=document["CustomerName"],
-                CustomerCode=document["CustomerCode"],
-                eval_IndirizzoSpedizione=indirizzo_spedizione,
-                eval_CAPSpedizione=str(cap_spedizione),
-                eval_CittaSpedizione=citta_spedizione,
-                eval_intervalloSpedizione=orario_spedizione,
-                eval_pesoSpedizione=str(peso),
+
+def inizializza_processo(contesto: ContestoCSV) -> None:
+    """Salva il contesto nel processo corrente (da usare come `initializer` di un `ProcessPoolExecutor`)."""
+    global _contesto_processo
+    _contesto_processo = contesto
+
+
+def contesto_processo() -> ContestoCSV:
+    """Restituisce il contesto ricevuto tramite `inizializza_processo` dal processo corrente."""
+    if _contesto_processo is None:
+        raise RuntimeError("Processo non inizializzato")
+
+    return _contesto_processo
+
+
+def _genera_righe_blocco(df: pd.DataFrame) -> list[str]:
+    return _genera_righe_csv(df, contesto_processo())
+
+
+def _colonna(df: pd.DataFrame, nome: str, default=np.nan) -> pd.Series:
+    """Restituisce la colonna `nome` come `Series` di oggetti Python.
+
+    Se la colonna non è presente (es. nessun documento ha il tag valorizzato)
+    viene restituita una colonna costante contenente `default`.
+    """
+    if nome in df.columns:
+        return df[nome].astype(object)
+
+    return pd.Series([default] * len(df), index=df.index, dtype=object)
+
+
+def _genera_righe_csv(df: pd.DataFrame, contesto: ContestoCSV) -> list[str]:
+    """Genera le righe CSV lavorando per colonne invece che riga per riga.
+
+    Args:
+        df (pd.DataFrame): Documenti letti dall'XML (un documento per riga).
+        contesto (ContestoCSV): Template, intervalli di consegna e valori di default da usare.
+
+    Returns:
+        list[str]: Le righe del CSV, nello stesso ordine dei documenti.
+    """
+    # Indirizzo di spedizione: quello di consegna ha la precedenza su quello del cliente.
+    #
+    # NOTA: Un tag vuoto o assente equivale a nessun indirizzo di consegna, per cui il
+    #       risultato di ogni documento non dipende dai tag presenti negli altri documenti.
+    indirizzo_consegna = _colonna(df, "DeliveryAddress")
+    usa_consegna = indirizzo_consegna.notna() & indirizzo_consegna.astype(bool)
+
+    indirizzo_spedizione = indirizzo_consegna.where(
+        usa_consegna, _colonna(df, "CustomerAddress")
+    )
+    cap_spedizione = _colonna(df, "DeliveryPostcode").where(
+        usa_consegna, _colonna(df, "CustomerPostcode")
+    )
+    citta_spedizione = _colonna(df, "DeliveryCity").where(
+        usa_consegna, _colonna(df, "CustomerCity")
+    )
+
+    # Peso: primo numero (con separatori `,` e `.`) presente nel campo.
+    if "TransportedWeight" in df.columns:
+        peso = (
+            pd.Series(
+                df["TransportedWeight"].to_numpy(dtype=object).astype(str),
+                index=df.index,
             )
+            .str.extract(r"([0-9,.]+)", expand=False)
+            .fillna("0")
         )
+    else:
+        peso = pd.Series("0", index=df.index, dtype=object)
 
-    return csv_lines
+    # Orari di spedizione (il minore sovrascrive il maggiore):
+    # 1. Singolo ordine
+    # 2. Profilo clienti
+    # 3. Default
+    #
+    # I valori distinti sono pochi, per cui ogni stringa viene normalizzata una sola volta.
+    orari_ordine = pd.Series(
+        _colonna(df, f"CustomField{contesto.extra_field_orario}", "")
+        .to_numpy(dtype=object)
+        .astype(str),
+        index=df.index,
+    )
+    orario_ordine = normalizza_intervalli(orari_ordine)
+    orario_cliente = (
+        _colonna(df, "CustomerCode").map(contesto.intervallo_spedizioni).astype(object)
+    )
+
+    da_ordine = orario_ordine.notna()
+    da_cliente = ~da_ordine & orario_cliente.notna()
+    logger.info(
+        f"Preso orario spedizione da ordine singolo: {da_ordine.sum()} documenti"
+    )
+    logger.debug(
+        f"Preso orario spedizione da profilo cliente: {da_cliente.sum()} documenti"
+    )
+    logger.debug(
+        f"Preso orario spedizione da valore di default: {(~da_ordine & ~da_cliente).sum()} documenti"
+    )
+
+    orario_spedizione = orario_ordine.where(da_ordine, orario_cliente)
+    orario_spedizione = orario_spedizione.where(
+        da_ordine | da_cliente, contesto.default_time_boundary
+    )
+
+    return [
+        contesto.template(
+            CustomerName=customer_name,
+            CustomerCode=customer_code,
+            eval_IndirizzoSpedizione=indirizzo,
+            eval_CAPSpedizione=cap,
+            eval_CittaSpedizione=citta,
+            eval_intervalloSpedizione=orario,
+            eval_pesoSpedizione=peso_spedizione,
+        )
+        for (
+            customer_name,
+            customer_code,
+            indirizzo,
+            cap,
+            citta,
+            orario,
+            peso_spedizione,
+        ) in zip(
+            _colonna(df, "CustomerName").tolist(),
+            _colonna(df, "CustomerCode").tolist(),
+            indirizzo_spedizione.tolist(),
+            cap_spedizione.to_numpy(dtype=object).astype(str).tolist(),
+            citta_spedizione.tolist(),
+            orario_spedizione.tolist(),
+            peso.tolist(),
+        )
+    ]
@@ -1,5 +1,6 @@
 import datetime
 from functools import partial
+import json
 import logging
 from collections import defaultdict
 from pathlib import Path
@@ -8,6 +9,7 @@ from typing import Any, Literal, Union
 from pydantic import Field, field_validator
 import rich
 from rich.panel import Panel
+from rich.table import Table
 
 import kmlb
 import xml.etree.ElementTree as ET
@@ -30,6 +32,12 @@ from veryeasyfatt.shared.ui.SelectableMenu import Option, SelectableMenu
 logger = logging.getLogger("danea-easyfatt.kml")
 logger.addHandler(logging.NullHandler())
 
+LOCATIONS_CACHE_MAX_ENTRIES = 50_000
+""" Maximum number of addresses kept in the geocoding cache (the least recently used ones are removed first). """
+
+_cache_metrics_report: dict[str, dict[str, Any]] = {}
+""" Geocoding cache metrics reported in the current run, by phase (exported to `files.output.cache_metrics`). """
+
 
 class CustomerAddress(HashableBaseModel):
     """Model for a customer address."""
@@ -71,13 +79,16 @@ class GeocodingError(Exception):
 
 
 @caching.persist_to_file(
-    file_name=(bundle.get_execution_directory() / ".cache" / "locations.pickle"),
-    backend=caching.Backend.PICKLE,
+    file_name=(bundle.get_execution_directory() / ".cache" / "locations.sqlite"),
+    backend=caching.Backend.SQLITE,
+    migrate_from=(bundle.get_execution_directory() / ".cache" / "locations.pickle"),
     include=[
         "address",
         0,
     ],  # Include the first positional argument or the keyword argument 'address'
     enabled="cache",
+    write_behind=True,
+    max_entries=LOCATIONS_CACHE_MAX_ENTRIES,
 )
 def search_location(
     address: str,
@@ -312,8 +323,24 @@ class Placemark(object):
         return placemark
 
 
-def generate_kml() -> str:
-    """Generate a KML string from an XML file and a database file."""
+def generate_kml(
+    xml_path: Union[str, Path, None] = None,
+    addresses: Union[list[CustomerAddress], None] = None,
+    report_metrics: bool = True,
+) -> str:
+    """Generate a KML string from an XML file and a database file.
+
+    Args:
+        xml_path (str | Path, optional): XML file to read the documents from. Defaults to None (`files.input.easyfatt`).
+        addresses (list[CustomerAddress], optional): Addresses already read from the database (and already geocoded
+            through `populate_cache`), used to generate many KML files without reloading them. Defaults to None.
+        report_metrics (bool, optional): Whether to print (and export) the geocoding cache metrics at the end. Defaults to True.
+
+    Returns:
+        str: The KML content.
+    """
+    metrics_start = search_location.metrics.copy()
+
     google_api_key = settings.features.kml_generation.google_api_key
     if google_api_key is None or google_api_key.strip() == "":
         raise Exception(
@@ -326,23 +353,29 @@ def generate_kml() -> str:
         search_type=settings.features.kml_generation.location_search_type,
     )
 
-    placemark_title = settings.features.kml_generation.placemark_title
-    database_path = settings.easyfatt.database.filename
+    placemark_title = SimpleFormatter().compile(
+        settings.features.kml_generation.placemark_title
+    )
+    if xml_path is None:
+        xml_path = settings.files.input.easyfatt
 
-    if database_path is None:
-        raise Exception(
-            "Database path not found in the configuration file. Cannot continue."
-        )
+    if addresses is None:
+        database_path = settings.easyfatt.database.filename
 
-    safe_formatter = SimpleFormatter()
+        if database_path is None:
+            raise Exception(
+                "Database path not found in the configuration file. Cannot continue."
+            )
 
-    logger.info(f"Database path: {database_path}")
-    logger.info(f"XML path: '{settings.files.input.easyfatt}'")
+        logger.info(f"Database path: {database_path}")
+        anagrafiche = get_all_addresses(database_path)
 
-    xml_object = read_xml(settings.files.input.easyfatt, convert_types=True)
-    anagrafiche = get_all_addresses(database_path)
+        populate_cache(google_api_key, addresses=anagrafiche)
+    else:
+        anagrafiche = addresses
 
-    populate_cache(google_api_key, addresses=anagrafiche)
+    logger.info(f"XML path: '{xml_path}'")
+    xml_object = read_xml(xml_path, convert_types=True)
 
     # Lista di indirizzi
     customer_locations: list[Placemark] = []
@@ -413,8 +446,7 @@ def generate_kml() -> str:
         if anagrafica.is_supplier:
             supplier_locations.append(
                 Placemark(
-                    name=safe_formatter.format(
-                        placemark_title,
+                    name=placemark_title(
                         customerName=anagrafica.name,
                         customerCode=anagrafica.code,
                         customerFiscalCode=anagrafica.fiscal_code,
@@ -489,8 +521,7 @@ def generate_kml() -> str:
 
                     customer_locations.append(
                         Placemark(
-                            name=safe_formatter.format(
-                                placemark_title,
+                            name=placemark_title(
                                 customerName=anagrafica.name,
                                 customerCode=anagrafica.code,
                                 customerFiscalCode=anagrafica.fiscal_code,
@@ -531,8 +562,7 @@ def generate_kml() -> str:
                             {
                                 "id": unknown_address.customer.code,
                                 "data": Placemark(
-                                    name=safe_formatter.format(
-                                        placemark_title,
+                                    name=placemark_title(
                                         customerName=unknown_address.customer.name,
                                         customerCode=unknown_address.customer.code,
                                         customerFiscalCode=unknown_address.customer.fiscal_code,
@@ -569,8 +599,7 @@ def generate_kml() -> str:
                 )
                 customer_locations.append(
                     Placemark(
-                        name=safe_formatter.format(
-                            placemark_title,
+                        name=placemark_title(
                             customerName=anagrafica.name,
                             customerCode=anagrafica.code,
                             customerFiscalCode=anagrafica.fiscal_code,
@@ -613,8 +642,7 @@ def generate_kml() -> str:
 
                 customer_locations.append(
                     Placemark(
-                        name=safe_formatter.format(
-                            placemark_title,
+                        name=placemark_title(
                             customerName=document.customer.name,
                             customerCode=document.customer.code,
                             customerFiscalCode=document.customer.fiscal_code,
@@ -637,7 +665,7 @@ def generate_kml() -> str:
             f"Added a total of {unknown_customer_documents} unknown customers"
         )
 
-    return kmlb.kml(
+    kml_content = kmlb.kml(
         name="Estrazione clienti e fornitori",
         description=f"This KML was automatically generated by VeryEasyfatt at {datetime.datetime.now():%d-%m-%Y %H:%M:%S}.",
         collapsed=False,
@@ -688,6 +716,11 @@ def generate_kml() -> str:
         ],
     )
 
+    if report_metrics:
+        report_cache_metrics("generate_kml", since=metrics_start)
+
+    return kml_content
+
 
 def populate_cache(
     google_api_key,
@@ -714,26 +747,38 @@ def populate_cache(
         swallow_exceptions=False,
     )
 
+    metrics_start = search_location.metrics.copy()
+
     logger.info("Cache initialization started (this may take a while...)")
     geocoding_errors = []
-    for address in addresses:
-        if dry_run:
-            logger.debug(
-                f"Search for '{address.address} {address.postcode}, {address.city}, {address.country}' ({address.code} - {address.name})"
-            )
-            continue
+    try:
+        for address in addresses:
+            if dry_run:
+                logger.debug(
+                    f"Search for '{address.address} {address.postcode}, {address.city}, {address.country}' ({address.code} - {address.name})"
+                )
+                continue
 
-        try:
-            search_result = search_location(
-                address=f"{address.address} {address.postcode}, {address.city}, {address.country}",
-                geocoder_fn=bulk_geocoder,  # Use the rate limited geocoder
-                search_type=settings.features.kml_generation.location_search_type,
-            )
-            logger.debug(f"Search returned {search_result}")
-        except GeocodingError as e:
-            logger.warning(f"Geocoding error: {e}")
-            geocoding_errors.append(str(e))
-            continue
+            try:
+                search_result = search_location(
+                    address=f"{address.address} {address.postcode}, {address.city}, {address.country}",
+                    geocoder_fn=bulk_geocoder,  # Use the rate limited geocoder
+                    search_type=settings.features.kml_generation.location_search_type,
+                )
+                logger.debug(f"Search returned {search_result}")
+            except GeocodingError as e:
+                logger.warning(f"Geocoding error: {e}")
+                geocoding_errors.append(str(e))
+                continue
+    finally:
+        # New locations are written in batches: save the remaining ones
+        search_location.flush()
+
+    cache_stats = search_location.stats()
+    logger.info(
+        f"Cache contains {cache_stats.entries} locations ({cache_stats.bytes_on_disk / 1024:.0f} KB on disk, {cache_stats.evictions} evicted)"
+    )
+    report_cache_metrics("populate_cache", since=metrics_start)
 
     unique_customers = set(
         [address.code for address in addresses if address.is_customer]
@@ -763,6 +808,43 @@ def populate_cache(
         raise Exception("Geocoding errors occurred. Fix them, then retry")
 
 
+def report_cache_metrics(
+    phase: str, since: caching.CacheMetrics
+) -> caching.CacheMetrics:
+    """Print a summary of the geocoding cache metrics of a phase (and export them to `files.output.cache_metrics`, if set).
+
+    Args:
+        phase (str): Name of the phase, used in the title of the summary and as key in the exported JSON.
+        since (caching.CacheMetrics): Copy of `search_location.metrics` taken at the start of the phase.
+
+    Returns:
+        caching.CacheMetrics: The metrics of the phase.
+    """
+    metrics = search_location.metrics - since
+
+    table = Table(title=f"Geocoding cache ({phase})")
+    table.add_column("Metric")
+    table.add_column("Value", justify="right")
+    table.add_row("Lookups", str(metrics.calls))
+    table.add_row("Cache hits", f"{metrics.hits} ({metrics.hit_ratio:.1%})")
+    table.add_row("Geocoding API calls (misses)", str(metrics.misses))
+    table.add_row("Calls with cache disabled", str(metrics.disabled))
+    table.add_row("Time in geocoding", f"{metrics.compute_seconds:.2f} s")
+    table.add_row(
+        "Time in cache serialization", f"{metrics.serialization_seconds:.2f} s"
+    )
+    table.add_row("Bytes written", f"{metrics.bytes_written:,}")
+    rich.console.Console().print(table)
+
+    export_filename = settings.files.output.cache_metrics
+    if export_filename is not None:
+        _cache_metrics_report[phase] = metrics.to_dict()
+        Path(export_filename).write_text(json.dumps(_cache_metrics_report, indent=4))
+        logger.info(f"Cache metrics exported to '{export_filename}'")
+
+    return metrics
+
+
 def get_all_addresses(database_path: Union[str, Path]) -> list[CustomerAddress]:
     """Get all the addresses from the database.
 
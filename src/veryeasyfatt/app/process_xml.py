@@ -1,12 +1,29 @@
+import dataclasses
+import glob
+import hashlib
+import shutil
+import time
 import xml.etree.ElementTree as ET
+import xml.parsers.expat
 from pathlib import Path
+from typing import IO, Any, Iterable, Optional, Union
 import logging
 
+from veryeasyfatt.app.xml_parser import carica_backend
 from veryeasyfatt.configuration import settings
 
 logger = logging.getLogger("danea-easyfatt.xml")
 logger.addHandler(logging.NullHandler())
 
+DIMENSIONE_LETTURA = 1024 * 1024
+""" Numero di byte letti (e copiati) alla volta dal file XML. """
+
+CAMPI_IDENTIFICATIVI = ("DocumentType", "Date", "Number", "Numbering")
+""" Campi che identificano un tag `Document` (tipo, data, numero e sezionale), usati per riconoscere i documenti duplicati. """
+
+CAMPI_NECESSARI = ("DocumentType", "Date", "Number")
+""" Campi identificativi che devono essere tutti valorizzati perché un documento possa essere riconosciuto tramite `CAMPI_IDENTIFICATIVI`. """
+
 
 def is_valid_xml(value):
     """Checks if the provided string is a valid XML.
@@ -24,63 +41,474 @@ def is_valid_xml(value):
     return True
 
 
-def modifica_xml() -> str:
-    """Aggiunge il contenuto di `additional_xml_file` all'interno di `easyfatt_xml`
+@dataclasses.dataclass
+class StrutturaXML:
+    """Posizione del tag `Documents` (e numero di documenti) all'interno di un XML di Easyfatt."""
+
+    encoding: str
+    """ Codifica del file (dichiarata nel prologo, `utf-8` se assente). """
+
+    totale_documents: int = 0
+    """ Numero di tag `Documents` figli dell'elemento radice. """
+
+    totale_document: int = 0
+    """ Numero di tag `Document` contenuti nei tag `Documents`. """
+
+    inizio_documents: Optional[int] = None
+    """ Posizione (in byte) del carattere `<` del primo tag `Documents`. """
+
+    chiavi: set[bytes] = dataclasses.field(default_factory=set)
+    """ Chiavi (vedi `chiave_documento`) dei tag `Document` trovati. """
+
+    senza_identificativi: list[int] = dataclasses.field(default_factory=list)
+    """ Posizioni (a partire da 0) dei tag `Document` privi di identificativi (vedi `impronte_documenti`). """
+
+
+@dataclasses.dataclass
+class ReportUnione:
+    """Riepilogo dell'inserimento del file `files.input.addition` nell'XML di Easyfatt."""
+
+    documenti_prima: int
+    """ Numero di tag `Document` presenti nell'XML di Easyfatt. """
+
+    documenti_aggiunti: int
+    """ Numero di tag `Document` aggiunti. """
+
+    documenti_duplicati: int
+    """ Numero di tag `Document` non aggiunti perché già presenti. """
+
+    file_aggiunti: int
+    """ Numero di file da cui sono stati letti i documenti da aggiungere. """
+
+    byte_letti: int
+    """ Dimensione (in byte) dei file letti (XML di Easyfatt e file aggiunti). """
+
+    byte_aggiunti: int
+    """ Dimensione (in byte) del contenuto inserito nell'XML. """
+
+    byte_scritti: int
+    """ Dimensione (in byte) dell'XML modificato. """
+
+    tempo_analisi: float
+    """ Tempo (in secondi) impiegato per analizzare i file. """
+
+    tempo_totale: float
+    """ Tempo (in secondi) impiegato per l'intera operazione (analisi e copia). """
+
+    @property
+    def documenti_dopo(self) -> int:
+        """Numero di tag `Document` presenti nell'XML modificato."""
+        return self.documenti_prima + self.documenti_aggiunti
+
+    def __str__(self) -> str:
+        return (
+            f"{self.documenti_aggiunti} documenti aggiunti da {self.file_aggiunti} file "
+            f"({self.documenti_prima} → {self.documenti_dopo}, {self.documenti_duplicati} duplicati), "
+            f"{self.byte_aggiunti} byte inseriti, {self.byte_scritti} byte scritti, "
+            f"analisi {self.tempo_analisi:.3f}s, totale {self.tempo_totale:.3f}s"
+        )
+
+
+def analizza_xml(source: Union[str, Path], chiavi: bool = False) -> StrutturaXML:
+    """Analizza l'XML in un'unica passata, senza costruire l'albero in memoria.
+
+    Args:
+        source (str | Path): Percorso all'XML di Easyfatt.
+        chiavi (bool, optional): Se calcolare la chiave (vedi `chiave_documento`) di ogni `Document`; le posizioni dei documenti privi di identificativi vengono salvate in `senza_identificativi`. Defaults to False.
+
+    Raises:
+        xml.parsers.expat.ExpatError: Se il file non contiene un XML valido.
+
+    Returns:
+        StrutturaXML: Codifica, posizione del tag `Documents`, numero e chiavi dei documenti.
+    """
+    struttura = StrutturaXML(encoding="utf-8")
+    parser = xml.parsers.expat.ParserCreate()
+    profondita = 0
+    dentro_documents = False
+
+    campi = CAMPI_IDENTIFICATIVI if chiavi else ()
+    valori: dict[str, str] = {}
+    testo: list[str] = []
+
+    def xml_decl(version, encoding, standalone):
+        if encoding:
+            struttura.encoding = encoding
+
+    def start_element(name, attributes):
+        nonlocal profondita, dentro_documents
+        profondita += 1
+
+        if profondita == 2 and name == "Documents":
+            dentro_documents = True
+            struttura.totale_documents += 1
+            if struttura.inizio_documents is None:
+                struttura.inizio_documents = parser.CurrentByteIndex
+        elif profondita == 3 and dentro_documents and name == "Document":
+            struttura.totale_document += 1
+            valori.clear()
+        elif profondita == 4 and dentro_documents and name in campi:
+            # Il testo viene raccolto solo all'interno dei campi identificativi
+            testo.clear()
+            parser.CharacterDataHandler = testo.append
+
+    def end_element(name):
+        nonlocal profondita, dentro_documents
+        if profondita == 2:
+            dentro_documents = False
+        elif profondita == 3 and dentro_documents and campi and name == "Document":
+            chiave = chiave_documento(valori)
+            if chiave is None:
+                struttura.senza_identificativi.append(struttura.totale_document - 1)
+            else:
+                struttura.chiavi.add(chiave)
+        elif profondita == 4 and parser.CharacterDataHandler is not None:
+            parser.CharacterDataHandler = None
+            valori[name] = "".join(testo)
+        profondita -= 1
+
+    parser.XmlDeclHandler = xml_decl
+    parser.StartElementHandler = start_element
+    parser.EndElementHandler = end_element
+
+    with open(source, "rb") as file:
+        parser.ParseFile(file)
+
+    return struttura
+
+
+def chiave_documento(valori: dict[str, Optional[str]]) -> Optional[bytes]:
+    """Calcola la chiave di un documento a partire dai valori dei suoi `CAMPI_IDENTIFICATIVI`.
+
+    Gli spazi iniziali e finali vengono ignorati e un campo vuoto equivale a un campo assente.
+
+    NOTA: I caratteri `\\x00` e `\\x1f` non possono comparire in un XML, per cui
+          possono essere usati per rappresentare i valori mancanti e separare i campi.
 
     Returns:
-        xml_text (str): Il testo XML modificato.
+        bytes | None: La chiave del documento, oppure `None` se uno dei `CAMPI_NECESSARI` non è valorizzato
+            (es. documenti scritti a mano): in questo caso il documento va riconosciuto con `impronta_documento`.
+    """
+    normalizzati = {
+        campo: (valori.get(campo) or "").strip() for campo in CAMPI_IDENTIFICATIVI
+    }
+    if not all(normalizzati[campo] for campo in CAMPI_NECESSARI):
+        return None
+
+    return hashlib.blake2b(
+        "\x1f".join(
+            normalizzati[campo] or "\x00" for campo in CAMPI_IDENTIFICATIVI
+        ).encode("utf-8"),
+        digest_size=16,
+    ).digest()
+
+
+def impronta_documento(elemento: Any) -> bytes:
+    """Calcola l'impronta di un tag `Document` a partire da tutto il suo contenuto.
+
+    Usata per i documenti privi di identificativi: due documenti hanno la stessa impronta
+    solo se hanno gli stessi tag, attributi e testi (senza spazi iniziali e finali, per cui
+    l'indentazione non conta), e non può coincidere con una chiave di `chiave_documento`.
     """
+    impronta = hashlib.blake2b(digest_size=16, person=b"documento")
+
+    def aggiungi(elemento: Any) -> None:
+        # I caratteri da `\x1c` a `\x1f` non possono comparire in un XML
+        impronta.update(f"\x1e{elemento.tag}".encode("utf-8"))
+        for nome, valore in sorted(elemento.attrib.items()):
+            impronta.update(f"\x1f{nome}={valore}".encode("utf-8"))
+        impronta.update(f"\x1d{(elemento.text or '').strip()}".encode("utf-8"))
+
+        for figlio in elemento:
+            # Commenti e istruzioni di elaborazione (con `lxml`) vengono ignorati
+            if isinstance(figlio.tag, str):
+                aggiungi(figlio)
+            impronta.update(f"\x1d{(figlio.tail or '').strip()}".encode("utf-8"))
+
+        impronta.update(b"\x1c")
+
+    aggiungi(elemento)
+    return impronta.digest()
+
+
+def impronte_documenti(
+    source: Union[str, Path], posizioni: Iterable[int]
+) -> list[bytes]:
+    """Calcola l'impronta (vedi `impronta_documento`) dei tag `Document` dell'XML nelle posizioni indicate.
+
+    Usata solo se l'XML contiene documenti privi di identificativi (vedi
+    `StrutturaXML.senza_identificativi`), per cui non rallenta l'analisi degli export di Easyfatt.
+
+    Args:
+        source (str | Path): Percorso all'XML.
+        posizioni (Iterable[int]): Posizioni (a partire da 0) dei tag `Document` all'interno del tag `Documents`.
+    """
+    etree: Any = carica_backend()
+    richieste = set(posizioni)
+    impronte: list[bytes] = []
+    profondita = 0
+    posizione = -1
+    dentro_documents = False
+
+    for evento, elemento in etree.iterparse(str(source), events=("start", "end")):
+        if evento == "start":
+            profondita += 1
+            if profondita == 2:
+                dentro_documents = elemento.tag == "Documents"
+            elif profondita == 3 and dentro_documents and elemento.tag == "Document":
+                posizione += 1
+            continue
+
+        if profondita == 3 and dentro_documents:
+            if elemento.tag == "Document" and posizione in richieste:
+                impronte.append(impronta_documento(elemento))
+            elemento.clear()
+        profondita -= 1
+
+    return impronte
+
+
+def trova_file_aggiunti(
+    valore: Union[str, Path, Iterable[Union[str, Path]], None],
+) -> list[Path]:
+    """Restituisce i file da aggiungere indicati in `files.input.addition`.
+
+    Args:
+        valore (str | Path | list): Uno o più percorsi, ognuno dei quali può essere un pattern glob (es. `aggiunte/*.xml`).
+
+    Returns:
+        list[Path]: I file da aggiungere, nell'ordine indicato (i file corrispondenti a un pattern sono in ordine alfabetico).
+    """
+    if valore is None:
+        return []
+
+    if isinstance(valore, (str, Path)):
+        valore = [valore]
+
+    files: list[Path] = []
+    for percorso in map(str, valore):
+        if glob.has_magic(percorso):
+            files.extend(sorted(Path(file) for file in glob.glob(percorso)))
+        else:
+            files.append(Path(percorso))
+
+    # Lo stesso file indicato più volte viene aggiunto una volta sola
+    return list(dict.fromkeys(files))
+
+
+def fine_tag_apertura(file: IO[bytes], inizio: int) -> tuple[int, bool]:
+    """Trova la fine del tag di apertura che inizia alla posizione indicata.
+
+    Args:
+        file (IO[bytes]): Il file XML.
+        inizio (int): Posizione (in byte) del carattere `<` del tag.
+
+    Returns:
+        tuple[int, bool]: Posizione del carattere `>` che chiude il tag e `True` se il tag è vuoto (`<Documents/>`).
+    """
+    file.seek(inizio)
+
+    posizione = inizio
+    virgolette: Optional[int] = None
+    precedente: Optional[int] = None
+    while blocco := file.read(4096):
+        for carattere in blocco:
+            if virgolette is not None:
+                if carattere == virgolette:
+                    virgolette = None
+            elif carattere in b"\"'":
+                virgolette = carattere
+            elif carattere == ord(">"):
+                return posizione, precedente == ord("/")
+
+            precedente = carattere
+            posizione += 1
+
+    raise ValueError(f"Tag di apertura alla posizione {inizio} non terminato")
+
+
+def modifica_xml(destinazione: Union[str, Path]) -> tuple[Path, ReportUnione]:
+    """Aggiunge il contenuto dei file `files.input.addition` all'interno di `easyfatt_xml`
+
+    L'XML di Easyfatt non viene caricato in memoria: dopo averne verificato la
+    struttura (un unico tag `Documents`) viene copiato così com'è nel file di
+    destinazione, inserendo il contenuto aggiunto subito dopo il tag `<Documents>`.
+    Tempo e memoria dipendono quindi solo dalla dimensione dei file, e non dal numero
+    di documenti.
+
+    Ogni file viene analizzato una sola volta: il numero di documenti prima e dopo
+    l'inserimento viene ricavato dai conteggi effettuati durante l'analisi.
+
+    Ogni file aggiunto può contenere un singolo tag `Document` oppure più tag `Document`
+    all'interno di un elemento radice (es. `Documents`). I documenti già presenti
+    (nell'XML di Easyfatt o in un file aggiunto in precedenza) vengono riconosciuti
+    tramite i campi `CAMPI_IDENTIFICATIVI` (o, per i documenti privi di tipo, data e
+    numero, tramite l'intero contenuto) e non vengono aggiunti di nuovo.
+
+    Args:
+        destinazione (str | Path): Percorso al file in cui salvare l'XML modificato.
+
+    Raises:
+        ValueError: Se non è stato indicato nessun file da aggiungere, se un file non contiene nessun tag `Document`
+            o se non viene aggiunto nessun documento (es. sono tutti già presenti).
+
+    Returns:
+        tuple[Path, ReportUnione]: Il percorso all'XML modificato e il riepilogo dell'operazione.
+    """
+    inizio = time.perf_counter()
+    etree: Any = carica_backend()
+    destinazione = Path(destinazione)
+
     easyfatt_xml_file = settings.files.input.easyfatt
-    additional_xml_file = settings.files.input.addition
+    additional_xml_files = trova_file_aggiunti(settings.files.input.addition)
 
-    if additional_xml_file is None:
+    if not additional_xml_files:
         raise ValueError("Il file da aggiungere non è stato specificato")
 
     logger.debug(
         f'File XML generato dal gestionale Danea Easyfatt: "{easyfatt_xml_file}"'
     )
-    logger.debug(f'File XML contenente il testo da inserire: "{additional_xml_file}"')
-
-    additional_xml_content = ""
-    with open(additional_xml_file, "r", encoding="utf-8") as file:
-        additional_xml_content = file.read()
 
-    if not is_valid_xml(additional_xml_content):
-        raise Exception(f"Il file '{additional_xml_file}' non contiene un XML valido")
-
-    tree = ET.parse(easyfatt_xml_file)
+    try:
+        struttura = analizza_xml(easyfatt_xml_file, chiavi=True)
+    except xml.parsers.expat.ExpatError as err:
+        raise Exception(
+            f"Il file '{easyfatt_xml_file}' non contiene un XML valido ({err})"
+        )
 
-    elementi_documents_trovati = tree.getroot().findall("./Documents")
-    if len(elementi_documents_trovati) != 1:
+    if struttura.totale_documents != 1 or struttura.inizio_documents is None:
         logger.error(
-            f"Il file '{additional_xml_file}' non contiene un tag 'Documents' valido."
+            f"Il file '{easyfatt_xml_file}' non contiene un tag 'Documents' valido."
         )
         logger.error(
-            f"Mi aspettavo di trovare 1 solo tag 'Documents' (trovati: {len(elementi_documents_trovati)})"
+            f"Mi aspettavo di trovare 1 solo tag 'Documents' (trovati: {struttura.totale_documents})"
         )
         raise Exception(
-            f"Il file '{additional_xml_file}' non contiene un tag 'Documents' valido."
+            f"Il file '{easyfatt_xml_file}' non contiene un tag 'Documents' valido."
         )
 
-    # Elemento 'Documents' contenente tutti i tag 'Document'
-    elemento_documents = elementi_documents_trovati[0]
-
-    totale_documents_prima = len(elemento_documents.findall("Document"))
+    totale_documents_prima = struttura.totale_document
     logger.debug(f"Trovati {totale_documents_prima} tag 'Document'")
 
-    logger.info(f"Aggiungo il contenuto del file '{additional_xml_file}'")
-    elemento_documents.insert(0, ET.fromstring(additional_xml_content))
+    # Indice dei documenti già presenti, per riconoscere i duplicati senza dover
+    # confrontare ogni documento con tutti gli altri.
+    indice: dict[bytes, Path] = dict.fromkeys(struttura.chiavi, Path(easyfatt_xml_file))
+    if struttura.senza_identificativi:
+        logger.debug(
+            f"Trovati {len(struttura.senza_identificativi)} tag 'Document' senza identificativi"
+        )
+        indice.update(
+            dict.fromkeys(
+                impronte_documenti(easyfatt_xml_file, struttura.senza_identificativi),
+                Path(easyfatt_xml_file),
+            )
+        )
+
+    contenuti_aggiunti: list[str] = []
+    documenti_duplicati = 0
+    byte_letti = 0
+    for additional_xml_file in additional_xml_files:
+        logger.debug(
+            f'File XML contenente il testo da inserire: "{additional_xml_file}"'
+        )
+
+        additional_xml_content = b""
+        with open(additional_xml_file, "rb") as file:
+            additional_xml_content = file.read()
+        byte_letti += len(additional_xml_content)
+
+        try:
+            radice = etree.fromstring(additional_xml_content)
+        except etree.ParseError:
+            raise Exception(
+                f"Il file '{additional_xml_file}' non contiene un XML valido"
+            )
 
-    totale_documents_dopo = len(elemento_documents.findall("Document"))
+        elementi = [radice] if radice.tag == "Document" else radice.findall("Document")
+        if not elementi:
+            raise ValueError(
+                f"Il file '{additional_xml_file}' non contiene nessun tag 'Document'"
+            )
 
-    if totale_documents_dopo <= totale_documents_prima:
-        raise ValueError("Non è stato aggiunto nessun tag 'Documenti'")
+        for elemento in elementi:
+            chiave = chiave_documento(
+                {campo: elemento.findtext(campo) for campo in CAMPI_IDENTIFICATIVI}
+            )
+            if chiave is None:
+                chiave = impronta_documento(elemento)
+            if chiave in indice:
+                documenti_duplicati += 1
+                logger.warning(
+                    f"Documento del file '{additional_xml_file}' già presente in '{indice[chiave]}': non verrà aggiunto"
+                )
+                continue
 
-    logger.debug(f"Trovati {totale_documents_dopo} tag 'Document'")
+            indice[chiave] = Path(additional_xml_file)
 
-    return ET.tostring(
-        tree.getroot(),
-        encoding="UTF-8",
-        xml_declaration=True,
-        short_empty_elements=False,
+            # Il contenuto aggiunto viene convertito nella codifica dell'XML di destinazione
+            elemento.tail = None
+            contenuti_aggiunti.append(etree.tostring(elemento, encoding="unicode"))
+
+        logger.info(f"Aggiungo il contenuto del file '{additional_xml_file}'")
+
+    tempo_analisi = time.perf_counter() - inizio
+
+    if not contenuti_aggiunti:
+        raise ValueError(
+            "Non è stato aggiunto nessun tag 'Documenti'"
+            + (
+                f" (tutti i {documenti_duplicati} documenti da aggiungere sono già presenti)"
+                if documenti_duplicati
+                else ""
+            )
+        )
+
+    contenuto_aggiunto = "".join(contenuti_aggiunti)
+    with (
+        open(easyfatt_xml_file, "rb") as sorgente,
+        open(destinazione, "wb") as output,
+    ):
+        fine_tag, tag_vuoto = fine_tag_apertura(sorgente, struttura.inizio_documents)
+
+        sorgente.seek(0)
+        if tag_vuoto:
+            # `<Documents/>` diventa `<Documents>...</Documents>`
+            _copia(sorgente, output, fine_tag - 1)
+            contenuto_aggiunto = f">{contenuto_aggiunto}</Documents>"
+            sorgente.seek(fine_tag + 1)
+        else:
+            _copia(sorgente, output, fine_tag + 1)
+
+        byte_aggiunti = output.write(
+            contenuto_aggiunto.encode(struttura.encoding, errors="xmlcharrefreplace")
+        )
+        shutil.copyfileobj(sorgente, output, DIMENSIONE_LETTURA)
+
+        byte_letti += sorgente.tell()
+        byte_scritti = output.tell()
+
+    report = ReportUnione(
+        documenti_prima=totale_documents_prima,
+        documenti_aggiunti=len(contenuti_aggiunti),
+        documenti_duplicati=documenti_duplicati,
+        file_aggiunti=len(additional_xml_files),
+        byte_letti=byte_letti,
+        byte_aggiunti=byte_aggiunti,
+        byte_scritti=byte_scritti,
+        tempo_analisi=tempo_analisi,
+        tempo_totale=time.perf_counter() - inizio,
     )
+    logger.debug(f"Trovati {report.documenti_dopo} tag 'Document'")
+
+    return destinazione, report
+
+
+def _copia(sorgente: IO[bytes], destinazione: IO[bytes], byte: int) -> None:
+    """Copia i primi `byte` byte (a partire dalla posizione corrente) da un file all'altro."""
+    while byte > 0:
+        blocco = sorgente.read(min(byte, DIMENSIONE_LETTURA))
+        if not blocco:
+            break
+
+        destinazione.write(blocco)
+        byte -= len(blocco)
@@ -0,0 +1,98 @@
+"""Selezione della libreria usata per analizzare gli XML di Easyfatt.
+
+Se installato viene usato `lxml` (scritto in C e sensibilmente più veloce sugli export
+di grandi dimensioni), altrimenti la libreria standard `xml.etree.ElementTree`.
+La scelta può essere forzata tramite la configurazione `options.xml.parser`.
+
+Le due librerie espongono le stesse funzioni usate dall'applicazione (`parse`,
+`fromstring`, `iterparse`, `ParseError`, ...), per cui il modulo restituito da
+`carica_backend` può essere usato al posto di `xml.etree.ElementTree`.
+"""
+
+import functools
+import types
+from typing import Any, Literal, Optional
+import xml.etree.ElementTree as ET
+import logging
+
+from veryeasyfatt.configuration import settings
+
+logger = logging.getLogger("danea-easyfatt.xml")
+logger.addHandler(logging.NullHandler())
+
+Backend = Literal["auto", "lxml", "etree"]
+
+BACKEND_DISPONIBILI: tuple[str, ...] = ("auto", "lxml", "etree")
+""" Valori accettati dalla configurazione `options.xml.parser`. """
+
+
+@functools.cache
+def lxml_disponibile() -> bool:
+    """Restituisce `True` se la libreria `lxml` è installata."""
+    try:
+        import lxml.etree  # noqa: F401
+    except ImportError:
+        return False
+
+    return True
+
+
+def nome_backend(backend: Optional[str] = None) -> Literal["lxml", "etree"]:
+    """Restituisce il nome della libreria da usare.
+
+    Args:
+        backend (str, optional): Libreria richiesta (`auto`, `lxml` o `etree`). Defaults to None (valore di `options.xml.parser`).
+
+    Raises:
+        ValueError: Se il valore non è valido o se è stato richiesto `lxml` ma non è installato.
+
+    Returns:
+        str: `lxml` oppure `etree`.
+    """
+    if backend is None:
+        backend = settings.options.xml.parser
+
+    if backend not in BACKEND_DISPONIBILI:
+        raise ValueError(
+            f"Parser XML '{backend}' non valido. Valori ammessi: {', '.join(BACKEND_DISPONIBILI)}"
+        )
+
+    if backend == "auto":
+        return "lxml" if lxml_disponibile() else "etree"
+
+    if backend == "lxml" and not lxml_disponibile():
+        raise ValueError(
+            "Il parser XML 'lxml' è stato richiesto ma la libreria non è installata"
+        )
+
+    return backend  # type: ignore[return-value]
+
+
+def carica_backend(backend: Optional[str] = None) -> types.ModuleType:
+    """Restituisce il modulo da usare per analizzare gli XML (`lxml.etree` o `xml.etree.ElementTree`).
+
+    Args:
+        backend (str, optional): Libreria richiesta (`auto`, `lxml` o `etree`). Defaults to None (valore di `options.xml.parser`).
+
+    Returns:
+        types.ModuleType: Il modulo scelto.
+    """
+    if nome_backend(backend) == "lxml":
+        import lxml.etree
+
+        return lxml.etree
+
+    return ET
+
+
+def is_elemento(value: Any) -> bool:
+    """Restituisce `True` se il valore è un elemento XML (di una qualsiasi delle due librerie)."""
+    if isinstance(value, ET.Element):
+        return True
+
+    if lxml_disponibile():
+        import lxml.etree
+
+        return isinstance(value, lxml.etree._Element)
+
+    return False
@@ -1,6 +1,7 @@
 """Entry point of the wrapper."""
 
 import datetime
+import multiprocessing
 import sys
 import webbrowser
 import argparse
@@ -185,6 +186,9 @@ def main() -> bool:
 
 
 if __name__ == "__main__":
+    # Necessario per avviare i processi secondari dall'eseguibile creato con PyInstaller
+    multiprocessing.freeze_support()
+
     success: bool
     try:
         success = main()
@@ -6,6 +6,36 @@ from veryeasyfatt import bundle
 from veryeasyfatt.configuration.schemas import SettingsSchema
 from veryeasyfatt.configuration.dynaconf_merge import Dynaconf
 
+_TRUE_VALUES = {"true", "1", "yes", "y", "on", "si", "sì"}
+_FALSE_VALUES = {"false", "0", "no", "n", "off"}
+
+
+def _parse_bool(value, default: bool) -> bool:
+    """Converts a boolean setting, also when written as a string (e.g. `"false"`).
+
+    Args:
+        value: The value read from the configuration.
+        default (bool): The value used when the setting is empty.
+
+    Raises:
+        ValueError: If the value is not a recognized boolean.
+
+    Returns:
+        bool: The parsed value.
+    """
+    if isinstance(value, bool):
+        return value
+
+    normalized = "" if value is None else str(value).strip().lower()
+    if normalized == "":
+        return default
+    elif normalized in _TRUE_VALUES:
+        return True
+    elif normalized in _FALSE_VALUES:
+        return False
+
+    raise ValueError(f"Invalid boolean value: {value!r}")
+
 
 def _get_settings() -> Dynaconf:
     """FOR INTERNAL USE ONLY!
@@ -53,9 +83,20 @@ def _get_settings() -> Dynaconf:
                 default=None,
                 when=Validator("files.input.addition", eq=""),
                 cast=lambda value: (
-                    None if value is None or str(value).strip() == "" else Path(value)
+                    None
+                    if value is None or value == [] or str(value).strip() == ""
+                    else (
+                        [Path(item) for item in value]
+                        if isinstance(value, list)
+                        else Path(value)
+                    )
                 ),
             ),
+            Validator(
+                "files.input.batch",
+                default="",
+                cast=lambda value: "" if value is None else str(value).strip(),
+            ),
             Validator(
                 "files.output.csv",
                 default=bundle.get_execution_directory() / "Documenti.csv",
@@ -76,6 +117,22 @@ def _get_settings() -> Dynaconf:
                     else Path(value)
                 ),
             ),
+            Validator(
+                "files.output.batch",
+                default=None,
+                when=Validator("files.output.batch", eq=""),
+                cast=lambda value: (
+                    None if value is None or str(value).strip() == "" else Path(value)
+                ),
+            ),
+            Validator(
+                "files.output.cache_metrics",
+                default=None,
+                when=Validator("files.output.cache_metrics", eq=""),
+                cast=lambda value: (
+                    None if value is None or str(value).strip() == "" else Path(value)
+                ),
+            ),
             Validator(
                 "easyfatt.customers.custom_field",
                 default=1,
@@ -86,10 +143,12 @@ def _get_settings() -> Dynaconf:
                 "easyfatt.customers.export_filename",
                 default=["Soggetti.xlsx", "Soggetti.ods"],
                 # when=Validator("easyfatt.customers.export_filename", eq=""),
+                # Un valore vuoto disabilita l'export (gli orari vengono letti dal database)
                 cast=lambda value: (
-                    [Path("Soggetti.xlsx"), Path("Soggetti.ods")]
+                    None
                     if (
-                        str(value).strip() == ""
+                        value is None
+                        or str(value).strip() == ""
                         or isinstance(value, list)
                         and len(value) == 0
                     )
@@ -110,6 +169,32 @@ def _get_settings() -> Dynaconf:
                     else str(value)
                 ),
             ),
+            Validator(
+                "options.output.parallel_workers",
+                default=1,
+                # Senza `when` il valore viene convertito anche se non è vuoto (es. "4")
+                cast=lambda value: (
+                    1 if value is None or str(value).strip() == "" else int(value)
+                ),
+                gte=0,
+            ),
+            Validator(
+                "options.batch.generate_kml",
+                default=False,
+                # Senza `when` il valore viene convertito anche se non è vuoto (es. "false")
+                cast=lambda value: _parse_bool(value, default=False),
+            ),
+            Validator(
+                "options.xml.parser",
+                default="auto",
+                # Senza `when` il valore viene normalizzato anche se non è vuoto (es. "LXML")
+                cast=lambda value: (
+                    "auto"
+                    if value is None or str(value).strip() == ""
+                    else str(value).strip().lower()
+                ),
+                is_in=["auto", "lxml", "etree"],
+            ),
             Validator(
                 "features.shipping.default_interval",
                 default="07:00-16:00",
@@ -23,13 +23,16 @@ class FilesSchema:
 @dataclasses.dataclass
 class InputFilesSchema:
     easyfatt: Path
-    addition: Path | None
+    addition: Path | list[Path] | None
+    batch: str
 
 
 @dataclasses.dataclass
 class OutputFilesSchema:
     kml: Path
     csv: Path
+    batch: Path | None
+    cache_metrics: Path | None
 
 
 @dataclasses.dataclass
@@ -46,17 +49,30 @@ class DatabaseEasyfattSchema:
 @dataclasses.dataclass
 class CustomersEasyfattSchema:
     custom_field: int
-    export_filename: list[Path]
+    export_filename: list[Path] | None
 
 
 @dataclasses.dataclass
 class OptionsSchema:
     output: "OutputOptionsSchema"
+    batch: "BatchOptionsSchema"
+    xml: "XmlOptionsSchema"
 
 
 @dataclasses.dataclass
 class OutputOptionsSchema:
     csv_template: str
+    parallel_workers: int
+
+
+@dataclasses.dataclass
+class BatchOptionsSchema:
+    generate_kml: bool
+
+
+@dataclasses.dataclass
+class XmlOptionsSchema:
+    parser: _Literal["auto", "lxml", "etree"]
 
 
 @dataclasses.dataclass
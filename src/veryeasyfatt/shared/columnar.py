@@ -0,0 +1,225 @@
+"""Minimal columnar storage for `pandas.DataFrame`s, based only on `numpy`.
+
+Every column is saved in its own `.npy` file, so a table can be loaded back
+(optionally only some of its columns) without parsing it again and, for numeric
+columns, by memory-mapping the file instead of reading it:
+
+- numeric, boolean and datetime columns are saved as they are;
+- text columns are dictionary-encoded: the distinct values are saved as a single
+  UTF-8 buffer (separated by `\\x1f`, which cannot appear in XML documents) and
+  every row only stores the (memory-mappable) position of its value. Repeated
+  values (e.g. cities, postcodes) are decoded only once and share the same object;
+- any other column falls back to a pickled array of objects.
+
+The index is not saved: tables are always loaded with a `RangeIndex`.
+"""
+
+import json
+import os
+from pathlib import Path
+import pickle
+import shutil
+from typing import Any, Iterable, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+FORMAT_VERSION = 1
+""" Version of the on-disk format (tables saved with a different version cannot be read). """
+
+METADATA_FILENAME = "table.json"
+
+_SEPARATOR = "\x1f"
+
+
+def write_table(df: pd.DataFrame, directory: Union[str, Path]) -> None:
+    """Saves the table in the given directory, replacing it if it already exists.
+
+    The table is first written to a temporary directory, which is then renamed:
+    readers never see a partially written table.
+
+    Args:
+        df (pd.DataFrame): The table to save. Column names must be strings.
+        directory (str | Path): The directory to create.
+    """
+    directory = Path(directory)
+    temporary = directory.with_name(f"{directory.name}.tmp-{os.getpid()}")
+    if temporary.exists():
+        shutil.rmtree(temporary)
+    temporary.mkdir(parents=True)
+
+    try:
+        columns = []
+        for position, name in enumerate(df.columns):
+            if not isinstance(name, str):
+                raise TypeError(f"Column names must be strings (found {name!r})")
+
+            filename = f"{position}.npy"
+            columns.append(
+                {
+                    "name": name,
+                    "dtype": str(df[name].dtype),
+                    "kind": _write_column(df[name], temporary / filename),
+                    "file": filename,
+                }
+            )
+
+        (temporary / METADATA_FILENAME).write_text(
+            json.dumps(
+                {"version": FORMAT_VERSION, "rows": len(df), "columns": columns}
+            ),
+            encoding="utf-8",
+        )
+
+        if directory.exists():
+            shutil.rmtree(directory)
+        os.replace(temporary, directory)
+    except BaseException:
+        shutil.rmtree(temporary, ignore_errors=True)
+        raise
+
+
+def read_table(
+    directory: Union[str, Path],
+    columns: Optional[Iterable[str]] = None,
+    mmap: bool = True,
+) -> pd.DataFrame:
+    """Loads a table saved with `write_table`.
+
+    Args:
+        directory (str | Path): The directory containing the table.
+        columns (Iterable[str], optional): The columns to load (missing ones are ignored). Defaults to None (all).
+        mmap (bool, optional): Whether to memory-map the numeric columns instead of reading them. The
+            mapping is copy-on-write: the table can be modified without changing the files. Defaults to True.
+
+    Raises:
+        ValueError: If the table was saved with a different format version.
+
+    Returns:
+        pd.DataFrame: The table, with a `RangeIndex`.
+    """
+    directory = Path(directory)
+    metadata = _read_metadata(directory)
+
+    wanted = set(columns) if columns is not None else None
+    rows = metadata["rows"]
+
+    data: dict[str, Any] = {}
+    for column in metadata["columns"]:
+        if wanted is not None and column["name"] not in wanted:
+            continue
+
+        data[column["name"]] = _read_column(
+            directory / column["file"], column["kind"], column["dtype"], rows, mmap
+        )
+
+    # NOTE: Without `copy=False` the memory-mapped columns would be copied in memory
+    return pd.DataFrame(data, index=pd.RangeIndex(rows), copy=False)
+
+
+def verify_table(directory: Union[str, Path]) -> None:
+    """Checks that every file of a table saved with `write_table` is present and complete.
+
+    The arrays are only memory-mapped (their data is not read), except for the pickled
+    columns, which have to be loaded.
+
+    Args:
+        directory (str | Path): The directory containing the table.
+
+    Raises:
+        OSError: If a file is missing or cannot be read.
+        ValueError: If the table was saved with a different format version or a file is truncated.
+    """
+    directory = Path(directory)
+    metadata = _read_metadata(directory)
+
+    for column in metadata["columns"]:
+        filename = directory / column["file"]
+        if column["kind"] == "object":
+            _load(filename, mmap=False, allow_pickle=True)
+            continue
+
+        _load(filename, mmap=True)
+        if column["kind"] == "string":
+            _load(filename.with_suffix(".values.npy"), mmap=True)
+
+
+def read_columns(directory: Union[str, Path]) -> list[str]:
+    """Returns the names of the columns of a table saved with `write_table`."""
+    metadata = json.loads(
+        (Path(directory) / METADATA_FILENAME).read_text(encoding="utf-8")
+    )
+    return [column["name"] for column in metadata["columns"]]
+
+
+def _read_metadata(directory: Path) -> dict[str, Any]:
+    metadata = json.loads((directory / METADATA_FILENAME).read_text(encoding="utf-8"))
+    if metadata.get("version", None) != FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported table format version: {metadata.get('version', None)!r}"
+        )
+
+    return metadata
+
+
+def _load(filename: Path, mmap: bool, allow_pickle: bool = False) -> np.ndarray:
+    """Loads an array, raising `ValueError` for truncated files (also when pickled)."""
+    try:
+        return np.load(
+            filename, mmap_mode="c" if mmap else None, allow_pickle=allow_pickle
+        )
+    except (EOFError, pickle.UnpicklingError) as err:
+        raise ValueError(f"Truncated file: {filename}") from err
+
+
+def _write_column(series: pd.Series, filename: Path) -> str:
+    if isinstance(series.dtype, np.dtype) and series.dtype != object:
+        np.save(filename, series.to_numpy(), allow_pickle=False)
+        return "numpy"
+
+    codes, uniques = pd.factorize(series.to_numpy(dtype=object))
+    if pd.api.types.infer_dtype(uniques, skipna=False) in ("string", "empty") and (
+        not any(_SEPARATOR in value for value in uniques)
+    ):
+        np.save(filename, codes.astype(np.int32), allow_pickle=False)
+        np.save(
+            filename.with_suffix(".values.npy"),
+            np.frombuffer(
+                "".join(_SEPARATOR + value for value in uniques).encode("utf-8"),
+                dtype=np.uint8,
+            ),
+            allow_pickle=False,
+        )
+        return "string"
+
+    np.save(filename, series.to_numpy(dtype=object), allow_pickle=True)
+    return "object"
+
+
+def _read_column(
+    filename: Path, kind: str, dtype: str, rows: int, mmap: bool
+) -> Union[np.ndarray, pd.Series]:
+    if kind == "numpy":
+        # A plain view (not a copy) of the `np.memmap`, which `pandas` would otherwise expose
+        return _load(filename, mmap).view(np.ndarray)
+
+    if kind == "string":
+        codes = _load(filename, mmap)
+        buffer = _load(filename.with_suffix(".values.npy"), mmap=False)
+
+        # Every distinct value is preceded by the separator
+        text = buffer.tobytes().decode("utf-8")
+        uniques = np.array(
+            [*(text[1:].split(_SEPARATOR) if text else []), np.nan], dtype=object
+        )
+
+        # The missing values (code `-1`) pick the last element, which is `NaN`
+        values = uniques[codes]
+    elif kind == "object":
+        values = _load(filename, mmap=False, allow_pickle=True)
+    else:
+        raise ValueError(f"Unknown column kind: {kind!r}")
+
+    # NOTE: The `dtype` must be explicit, otherwise `pandas` may infer a different one
+    column = pd.Series(values, dtype=object)
+    return column if dtype == "object" else column.astype(dtype)
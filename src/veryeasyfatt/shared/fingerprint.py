@@ -0,0 +1,119 @@
+"""Cheap change detection for input files.
+
+A file is first compared through its size and modification time, which only
+requires a `stat` call. The content hash is computed (streaming the file in
+fixed-size chunks, so memory usage does not depend on the file size) only when
+the cheap check is not enough to tell whether the file changed.
+"""
+
+import dataclasses
+import hashlib
+import os
+from pathlib import Path
+from typing import Any, Optional, Union
+
+CHUNK_SIZE = 1024 * 1024
+""" Number of bytes read at a time when hashing a file. """
+
+
+@dataclasses.dataclass(frozen=True)
+class FileFingerprint:
+    """Size, modification time and (optionally) content hash of a file."""
+
+    size: int
+    mtime_ns: int
+    digest: Optional[str] = None
+
+    @classmethod
+    def of(cls, path: Union[str, Path], with_digest: bool = False) -> "FileFingerprint":
+        """Returns the fingerprint of the given file.
+
+        Args:
+            path (str | Path): The file.
+            with_digest (bool, optional): Whether to also compute the content hash. Defaults to False.
+        """
+        stat = os.stat(path)
+
+        return cls(
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            digest=file_digest(path) if with_digest else None,
+        )
+
+    @classmethod
+    def from_dict(cls, value: Any) -> Optional["FileFingerprint"]:
+        """Rebuilds a fingerprint saved with `to_dict` (returns `None` if the value is not valid)."""
+        try:
+            return cls(
+                size=int(value["size"]),
+                mtime_ns=int(value["mtime_ns"]),
+                digest=value.get("digest", None),
+            )
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return None
+
+    def to_dict(self) -> dict[str, Any]:
+        return dataclasses.asdict(self)
+
+    def same_stat(self, other: "FileFingerprint") -> bool:
+        """Returns `True` if both size and modification time are the same."""
+        return self.size == other.size and self.mtime_ns == other.mtime_ns
+
+    def with_digest(self, path: Union[str, Path]) -> "FileFingerprint":
+        """Returns a copy of the fingerprint including the content hash of `path`."""
+        if self.digest is not None:
+            return self
+
+        return dataclasses.replace(self, digest=file_digest(path))
+
+
+def file_digest(path: Union[str, Path], chunk_size: int = CHUNK_SIZE) -> str:
+    """Computes the (BLAKE2b, 128 bit) hash of a file, reading it in chunks.
+
+    Args:
+        path (str | Path): The file to hash.
+        chunk_size (int, optional): Number of bytes read at a time. Defaults to CHUNK_SIZE.
+
+    Returns:
+        str: The hexadecimal digest.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+
+    with open(path, "rb") as file:
+        while chunk := file.read(chunk_size):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def is_unchanged(
+    stored: Optional[FileFingerprint], path: Union[str, Path]
+) -> tuple[bool, FileFingerprint]:
+    """Checks whether a file has changed since its fingerprint was stored.
+
+    The content hash is only computed when size and modification time are not
+    enough to tell: a different size means the file changed, while the same size
+    with a different modification time (e.g. the file was exported again) requires
+    comparing the content.
+
+    Args:
+        stored (FileFingerprint, optional): The fingerprint previously stored (`None` if missing).
+        path (str | Path): The file to check.
+
+    Returns:
+        tuple[bool, FileFingerprint]: Whether the file is unchanged, and its current fingerprint (to be stored).
+            The current fingerprint includes the content hash whenever it was computed or can be carried over.
+    """
+    current = FileFingerprint.of(path)
+
+    if stored is None:
+        return False, current
+
+    if current.same_stat(stored):
+        return True, dataclasses.replace(current, digest=stored.digest)
+
+    if current.size != stored.size or stored.digest is None:
+        return False, current
+
+    current = current.with_digest(path)
+    return current.digest == stored.digest, current
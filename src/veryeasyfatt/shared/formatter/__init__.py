@@ -61,65 +61,236 @@ class SimpleFormatter(string.Formatter):
 
     def format_field(self, value, format_spec):
         if isinstance(value, str) and format_spec.startswith(self.command_prefix):
-            command_stack = [
-                command.strip()
-                for command in format_spec.split(self.command_separator)[1:]
-            ]
+            value = self.apply_commands(value, self.parse_commands(format_spec))
             format_spec = ""
 
-            for command in command_stack:
-                if command == FormatterCommands.UPPER.value:
-                    value = value.upper()
+        return super().format_field(value, format_spec)
+
+    def parse_commands(self, format_spec: str) -> list[tuple[FormatterCommands, tuple]]:
+        """Parse the command chain contained in a format spec (e.g. `s->uppercase->substring(0, 5)`).
+
+        Args:
+            format_spec (str): The format spec, starting with the command prefix.
+
+        Raises:
+            ValueError: If a command requiring parameters has none.
+            UnknownCommandError: If a command is not recognized.
+
+        Returns:
+            list[tuple[FormatterCommands, tuple]]: The commands along with their (already parsed) arguments.
+        """
+        command_stack = [
+            command.strip() for command in format_spec.split(self.command_separator)[1:]
+        ]
+
+        commands: list[tuple[FormatterCommands, tuple]] = []
+        for command in command_stack:
+            if command == FormatterCommands.UPPER.value:
+                commands.append((FormatterCommands.UPPER, ()))
+
+            elif command == FormatterCommands.LOWER.value:
+                commands.append((FormatterCommands.LOWER, ()))
+
+            elif command == FormatterCommands.CAPITALIZE.value:
+                commands.append((FormatterCommands.CAPITALIZE, ()))
+
+            elif command == FormatterCommands.TITLE.value:
+                commands.append((FormatterCommands.TITLE, ()))
 
-                elif command == FormatterCommands.LOWER.value:
-                    value = value.lower()
+            elif command.startswith(FormatterCommands.SUBSTRING.value):
+                if command.count("(") != 1 or command.count(")") != 1:
+                    raise ValueError(f"Command '{command}' MUST have parameters")
 
-                elif command == FormatterCommands.CAPITALIZE.value:
-                    value = value.capitalize()
+                command_args = command.split("(")[1].split(")")[0].split(",")
+                start = int(command_args[0])
+                end = int(command_args[1]) if len(command_args) > 1 else None
 
-                elif command == FormatterCommands.TITLE.value:
-                    value = value.title()
+                commands.append((FormatterCommands.SUBSTRING, (start, end)))
 
-                elif command.startswith(FormatterCommands.SUBSTRING.value):
-                    if command.count("(") != 1 or command.count(")") != 1:
-                        raise ValueError(f"Command '{command}' MUST have parameters")
+            elif command.startswith(FormatterCommands.REPLACE.value):
+                if command.count("(") != 1 or command.count(")") != 1:
+                    raise ValueError(f"Command '{command}' MUST have parameters")
 
-                    command_args = command.split("(")[1].split(")")[0].split(",")
-                    start = int(command_args[0])
-                    end = int(command_args[1]) if len(command_args) > 1 else None
+                # Remove quotes only if they are at the beginning and at the end of the string
+                command_args = [
+                    (
+                        arg[1:-1]
+                        if (arg.startswith('"') and arg.endswith('"'))
+                        or (arg.startswith("'") and arg.endswith("'"))
+                        else arg
+                    )
+                    for arg in (
+                        arg.strip()
+                        for arg in command.split("(")[1].split(")")[0].split(",")
+                    )
+                ]
 
-                    if end is not None:
-                        value = value[start:end]
-                    else:
-                        value = value[start:]
+                search = str(command_args[0])
+                replace = str(command_args[1])
 
-                elif command.startswith(FormatterCommands.REPLACE.value):
-                    if command.count("(") != 1 or command.count(")") != 1:
-                        raise ValueError(f"Command '{command}' MUST have parameters")
+                commands.append((FormatterCommands.REPLACE, (search, replace)))
 
-                    # Remove quotes only if they are at the beginning and at the end of the string
-                    command_args = [
-                        (
-                            arg[1:-1]
-                            if (arg.startswith('"') and arg.endswith('"'))
-                            or (arg.startswith("'") and arg.endswith("'"))
-                            else arg
-                        )
-                        for arg in (
-                            arg.strip()
-                            for arg in command.split("(")[1].split(")")[0].split(",")
-                        )
-                    ]
+            else:
+                raise UnknownCommandError(f"Invalid formatting command {command}")
 
-                    search = str(command_args[0])
-                    replace = str(command_args[1])
+        return commands
 
-                    value = value.replace(search, replace)
+    @staticmethod
+    def apply_commands(
+        value: str, commands: list[tuple[FormatterCommands, tuple]]
+    ) -> str:
+        """Apply the commands returned by `parse_commands` to a string.
 
+        Args:
+            value (str): The string to transform.
+            commands (list[tuple[FormatterCommands, tuple]]): The parsed commands.
+
+        Returns:
+            str: The transformed string.
+        """
+        for command, command_args in commands:
+            if command == FormatterCommands.UPPER:
+                value = value.upper()
+
+            elif command == FormatterCommands.LOWER:
+                value = value.lower()
+
+            elif command == FormatterCommands.CAPITALIZE:
+                value = value.capitalize()
+
+            elif command == FormatterCommands.TITLE:
+                value = value.title()
+
+            elif command == FormatterCommands.SUBSTRING:
+                start, end = command_args
+
+                if end is not None:
+                    value = value[start:end]
                 else:
-                    raise UnknownCommandError(f"Invalid formatting command {command}")
+                    value = value[start:]
 
-        return super().format_field(value, format_spec)
+            elif command == FormatterCommands.REPLACE:
+                search, replace = command_args
+
+                value = value.replace(search, replace)
+
+        return value
+
+    def compile(self, format_string: str) -> "CompiledTemplate":
+        """Parse a format string once, so that it can be rendered many times without re-parsing it.
+
+        Field names are validated immediately, so a sandboxed formatter raises
+        `InvalidFormatError` at compile time instead of on the first render.
+
+        Args:
+            format_string (str): The format string to compile.
+
+        Returns:
+            CompiledTemplate: A callable accepting the same arguments as `format`.
+
+        Example:
+            ```pycon
+            >>> template = SimpleFormatter().compile("{name:s->uppercase} ({code})")
+            >>> template(name="Mario Rossi", code="00001")
+            'MARIO ROSSI (00001)'
+            ```
+        """
+        return CompiledTemplate(self, format_string)
+
+
+class CompiledTemplate(object):
+    """A format string parsed by `SimpleFormatter.compile`.
+
+    Calling the object renders the template with the given arguments, producing
+    the same result as `SimpleFormatter.format` would.
+    """
+
+    def __init__(self, formatter: SimpleFormatter, format_string: str, _depth=2):
+        if _depth < 0:
+            raise ValueError("Max string recursion exceeded")
+
+        self.formatter = formatter
+        self.format_string = format_string
+        self._fields: list[tuple] = []
+
+        auto_arg_index: int | bool = 0
+        for literal_text, field_name, format_spec, conversion in formatter.parse(
+            format_string
+        ):
+            if field_name is None:
+                self._fields.append((literal_text, None))
+                continue
+
+            # Handle automatic field numbering (like `string.Formatter`)
+            if field_name == "":
+                if auto_arg_index is False:
+                    raise ValueError(
+                        "cannot switch from manual field specification to automatic field numbering"
+                    )
+                field_name = str(auto_arg_index)
+                auto_arg_index += 1
+            elif field_name.isdigit():
+                if auto_arg_index:
+                    raise ValueError(
+                        "cannot switch from manual field specification to automatic field numbering"
+                    )
+                auto_arg_index = False
+
+            if formatter.sandboxed and ("." in field_name or "[" in field_name):
+                raise InvalidFormatError(
+                    'Invalid format string (field name cannot contain "." or "[")'
+                )
+
+            # Nested replacement fields in the format spec must be rendered every time
+            spec: str | CompiledTemplate = format_spec or ""
+            commands = None
+            if "{" in spec:
+                spec = CompiledTemplate(formatter, spec, _depth=_depth - 1)
+            elif spec.startswith(formatter.command_prefix):
+                commands = formatter.parse_commands(spec)
+
+            simple_field = "." not in field_name and "[" not in field_name
+            key = int(field_name) if field_name.isdigit() else field_name
+
+            self._fields.append(
+                (
+                    literal_text,
+                    (field_name, key, simple_field, conversion, spec, commands),
+                )
+            )
+
+    def __call__(self, *args, **kwargs) -> str:
+        formatter = self.formatter
+        result = []
+
+        for literal_text, field in self._fields:
+            if literal_text:
+                result.append(literal_text)
+
+            if field is None:
+                continue
+
+            field_name, key, simple_field, conversion, spec, commands = field
+
+            if simple_field:
+                value = formatter.get_value(key, args, kwargs)
+            else:
+                value, _ = formatter.get_field(field_name, args, kwargs)
+
+            if conversion is not None:
+                value = formatter.convert_field(value, conversion)
+
+            if commands is not None and isinstance(value, str):
+                result.append(formatter.apply_commands(value, commands))
+            elif isinstance(spec, CompiledTemplate):
+                result.append(formatter.format_field(value, spec(*args, **kwargs)))
+            else:
+                result.append(formatter.format_field(value, spec))
+
+        return "".join(result)
+
+    def __repr__(self) -> str:
+        return f"CompiledTemplate({self.format_string!r})"
 
 
 if __name__ == "__main__":
@@ -1,12 +1,34 @@
-"""This module contains the unit registry used for all measurements in the application."""
+"""This module contains the unit registry used for all measurements in the application.
 
-import pint
+The registry is only built the first time `unit_registry` is accessed, since creating
+it takes a noticeable amount of time and it is only needed to display the results.
+"""
 
-unit_registry = pint.UnitRegistry(
-    autoconvert_offset_to_baseunit=True, on_redefinition="raise"
-)
-""" The unit registry used for all measurements in the application. """
+import functools
+from typing import TYPE_CHECKING
 
+if TYPE_CHECKING:
+    import pint
 
-unit_registry.default_format = "~P"
-unit_registry.define("quintal = 100 * kg = q = centner")
+    unit_registry: pint.UnitRegistry
+
+
+@functools.cache
+def get_unit_registry() -> "pint.UnitRegistry":
+    """Returns the unit registry used for all measurements in the application (built on first use)."""
+    import pint
+
+    registry = pint.UnitRegistry(
+        autoconvert_offset_to_baseunit=True, on_redefinition="raise"
+    )
+    registry.default_format = "~P"
+    registry.define("quintal = 100 * kg = q = centner")
+
+    return registry
+
+
+def __getattr__(name: str):
+    if name == "unit_registry":
+        return get_unit_registry()
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,72 @@
+"""Fast parser for the weights exported by Easyfatt (e.g. `12,5 Kg`).
+
+Unlike `pint`, which parses every single value through its own expression parser,
+this module only knows the handful of mass units that Easyfatt actually emits and
+converts a whole column at once using vectorized `pandas` operations.
+
+`pint` (see `veryeasyfatt.shared.measuring`) should only be used to display the result.
+"""
+
+import pandas as pd
+
+WEIGHT_UNITS: dict[str, float] = {
+    **dict.fromkeys(
+        ["mg", "milligram", "milligrams", "milligrammo", "milligrammi"], 1e-3
+    ),
+    **dict.fromkeys(["g", "gram", "grams", "grammo", "grammi"], 1.0),
+    **dict.fromkeys(
+        [
+            "kg",
+            "kgs",
+            "kilo",
+            "kilogram",
+            "kilograms",
+            "chilo",
+            "chili",
+            "chilogrammo",
+            "chilogrammi",
+        ],
+        1e3,
+    ),
+    **dict.fromkeys(["q", "quintal", "quintals", "quintale", "quintali"], 1e5),
+    **dict.fromkeys(["t", "tonne", "tonnes", "tonnellata", "tonnellate"], 1e6),
+}
+""" Conversion factor to grams of every unit spelling (lowercase) accepted by `parse_weights`. """
+
+_WEIGHT_PATTERN = (
+    r"^\s*(?P<number>[0-9][0-9.]*(?:,[0-9]*)?)\s*(?P<unit>[^\W\d_]*)\.?\s*$"
+)
+
+
+def parse_weights(values: pd.Series) -> pd.Series:
+    """Converts a column of weights in the Italian format (e.g. `1.234,5 Kg`) to grams.
+
+    The `.` is treated as the thousands separator and the `,` as the decimal separator,
+    while the unit is case insensitive and must be one of `WEIGHT_UNITS`.
+
+    Args:
+        values (pd.Series): The weights to parse. Missing values (`None`/`NaN`) are allowed.
+
+    Raises:
+        ValueError: If one or more values are not valid weights (e.g. an unknown or missing unit).
+
+    Returns:
+        pd.Series: The weights in grams (`NaN` for missing values), with the same index as `values`.
+    """
+    present = values.notna()
+    text = values[present].astype(str).str.lower()
+
+    parts = text.str.extract(_WEIGHT_PATTERN)
+    factors = parts["unit"].map(WEIGHT_UNITS)
+
+    invalid = factors.isna()
+    if invalid.any():
+        raise ValueError(
+            "Invalid weight(s): " + ", ".join(map(repr, text[invalid].unique()[:5]))
+        )
+
+    grams = parts["number"].str.replace(".", "", regex=False).str.replace(
+        ",", ".", regex=False
+    ).astype(float) * factors.astype(float)
+
+    return grams.reindex(values.index)
@@ -0,0 +1,232 @@
+"""Tests for the insertion of the `files.input.addition` content into the Easyfatt XML."""
+
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+# Hack needed to include scripts from the `scripts` directory (under root)
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent.parent))
+
+import veryeasyfatt.app.process_xml as process_xml
+
+_ADDITION = "<Document><CustomerCode>00000</CustomerCode><CustomerName>Partenza</CustomerName></Document>"
+_IDENTIFIERS = "<DocumentType>C</DocumentType><Date>2024-01-02</Date><Number>{number}</Number>"
+
+
+class AdditionTestCase(unittest.TestCase):
+    """Tests for `modifica_xml`."""
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.directory = Path(self._directory.name)
+
+        self.addition = self.directory / "addition.xml"
+        self.addition.write_text(_ADDITION, encoding="utf-8")
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def _modifica_xml(self, content: bytes, addition=None) -> bytes:
+        """Run `modifica_xml` on the given Easyfatt XML and return the resulting file content."""
+        return self._modifica_xml_report(content, addition)[0]
+
+    def _modifica_xml_report(self, content: bytes, addition=None):
+        """Run `modifica_xml` on the given Easyfatt XML and return the resulting file content and the report."""
+        easyfatt = self.directory / "Documenti.DefXml"
+        easyfatt.write_bytes(content)
+
+        settings = MagicMock()
+        settings.files.input.easyfatt = easyfatt
+        settings.files.input.addition = addition or self.addition
+
+        with patch("veryeasyfatt.app.process_xml.settings", settings):
+            output, report = process_xml.modifica_xml(self.directory / "output.DefXml")
+
+        self.assertEqual(report.byte_scritti, output.stat().st_size)
+        return output.read_bytes(), report
+
+    def test_insert_after_documents(self):
+        """Test that the addition is inserted as the first child of `Documents`, leaving the rest untouched."""
+        prefix = b'<?xml version="1.0" encoding="UTF-8"?>\n<EasyfattDocuments AppVersion="2">\n<Company><Name>A > B</Name></Company>\n<Documents Note="a > b">'
+        suffix = b"\n<Document><CustomerCode>00001</CustomerCode></Document>\n</Documents>\n</EasyfattDocuments>\n"
+
+        self.assertEqual(
+            self._modifica_xml(prefix + suffix),
+            prefix + _ADDITION.encode("utf-8") + suffix,
+        )
+
+    def test_report(self):
+        """Test that the report is built from the tallies of the single parse."""
+        easyfatt = self.directory / "Documenti.DefXml"
+        easyfatt.write_bytes(
+            b"<EasyfattDocuments><Documents><Document/><Document/><Other/></Documents></EasyfattDocuments>"
+        )
+
+        settings = MagicMock()
+        settings.files.input.easyfatt = easyfatt
+        settings.files.input.addition = self.addition
+
+        with patch("veryeasyfatt.app.process_xml.settings", settings):
+            _, report = process_xml.modifica_xml(self.directory / "output.DefXml")
+
+        self.assertEqual(report.documenti_prima, 2)
+        self.assertEqual(report.documenti_aggiunti, 1)
+        self.assertEqual(report.documenti_dopo, 3)
+        self.assertEqual(report.byte_aggiunti, len(_ADDITION))
+        self.assertEqual(
+            report.byte_letti, easyfatt.stat().st_size + self.addition.stat().st_size
+        )
+        self.assertEqual(report.byte_scritti, easyfatt.stat().st_size + len(_ADDITION))
+        self.assertGreaterEqual(report.tempo_totale, report.tempo_analisi)
+
+    def test_empty_documents(self):
+        """Test that an empty (self-closing) `Documents` tag is expanded."""
+        self.assertEqual(
+            self._modifica_xml(b"<EasyfattDocuments><Documents /></EasyfattDocuments>"),
+            b"<EasyfattDocuments><Documents >"
+            + _ADDITION.encode("utf-8")
+            + b"</Documents></EasyfattDocuments>",
+        )
+
+    def test_encoding(self):
+        """Test that the addition is converted to the encoding of the Easyfatt XML."""
+        self.addition.write_text(
+            "<Document><CustomerName>Caffè</CustomerName></Document>", encoding="utf-8"
+        )
+
+        self.assertEqual(
+            self._modifica_xml(
+                '<?xml version="1.0" encoding="ISO-8859-1"?><EasyfattDocuments><Documents></Documents></EasyfattDocuments>'.encode(
+                    "iso-8859-1"
+                )
+            ).decode("iso-8859-1"),
+            '<?xml version="1.0" encoding="ISO-8859-1"?><EasyfattDocuments><Documents><Document><CustomerName>Caffè</CustomerName></Document></Documents></EasyfattDocuments>',
+        )
+
+    def test_multiple_files(self):
+        """Test that several addition files (paths and glob patterns) are merged in order."""
+        stops = self.directory / "stops"
+        stops.mkdir()
+        (stops / "b.xml").write_text(
+            "<Document><CustomerCode>B</CustomerCode></Document>", encoding="utf-8"
+        )
+        (stops / "a.xml").write_text(
+            "<Documents><Document><CustomerCode>A1</CustomerCode></Document>\n"
+            "<Document><CustomerCode>A2</CustomerCode></Document></Documents>",
+            encoding="utf-8",
+        )
+
+        content, report = self._modifica_xml_report(
+            b"<EasyfattDocuments><Documents></Documents></EasyfattDocuments>",
+            addition=[self.addition, stops / "*.xml"],
+        )
+
+        self.assertEqual(
+            content,
+            b"<EasyfattDocuments><Documents>"
+            + _ADDITION.encode("utf-8")
+            + b"<Document><CustomerCode>A1</CustomerCode></Document>"
+            b"<Document><CustomerCode>A2</CustomerCode></Document>"
+            b"<Document><CustomerCode>B</CustomerCode></Document>"
+            b"</Documents></EasyfattDocuments>",
+        )
+        self.assertEqual(report.file_aggiunti, 3)
+        self.assertEqual(report.documenti_aggiunti, 4)
+        self.assertEqual(report.documenti_duplicati, 0)
+
+    def test_duplicates(self):
+        """Test that documents already in the Easyfatt XML or in a previous addition are skipped."""
+        duplicate = self.directory / "duplicate.xml"
+        duplicate.write_text(
+            "<Documents>"
+            "<Document>\n  <CustomerCode> 00000 </CustomerCode>\n  <CustomerName>Partenza</CustomerName>\n</Document>"
+            "<Document><CustomerCode>00002</CustomerCode>" + _IDENTIFIERS.format(number=1) + "</Document>"
+            "<Document><CustomerCode>00001</CustomerCode>" + _IDENTIFIERS.format(number=2) + "</Document>"
+            "</Documents>",
+            encoding="utf-8",
+        )
+
+        content, report = self._modifica_xml_report(
+            b"<EasyfattDocuments><Documents>"
+            b"<Document><CustomerCode>00001</CustomerCode>"
+            + _IDENTIFIERS.format(number="\n1\n").encode("utf-8")
+            + b"<Rows/></Document>"
+            b"</Documents></EasyfattDocuments>",
+            addition=[self.addition, duplicate],
+        )
+
+        self.assertEqual(report.documenti_aggiunti, 2)
+        self.assertEqual(report.documenti_duplicati, 2)
+        self.assertEqual(report.documenti_dopo, 3)
+        self.assertEqual(content.count(b"00000</CustomerCode>"), 1)
+        self.assertNotIn(b"00002", content)
+        self.assertIn(b"<Number>2</Number>", content)
+
+    def test_additions_without_identifiers(self):
+        """Test that documents without type, date and number are only skipped if their whole content is the same."""
+        self.addition.write_text(
+            "<Documents>"
+            "<Document><CustomerCode>00001</CustomerCode><DeliveryAddress>VIA APPIA, 1</DeliveryAddress><Notes>Consegna</Notes></Document>"
+            "<Document><CustomerCode>00001</CustomerCode><DeliveryAddress>VIA APPIA, 1</DeliveryAddress><Notes>Ritiro</Notes></Document>"
+            "<Document><CustomerCode>00002</CustomerCode><DeliveryAddress>VIA APPIA, 2</DeliveryAddress></Document>"
+            "</Documents>",
+            encoding="utf-8",
+        )
+
+        content, report = self._modifica_xml_report(
+            b"<EasyfattDocuments><Documents>"
+            b"<Document><CustomerCode>00001</CustomerCode>"
+            + _IDENTIFIERS.format(number=1).encode("utf-8")
+            + b"</Document>"
+            b"<Document>\n<CustomerCode>00002</CustomerCode>\n<DeliveryAddress> VIA APPIA, 2 </DeliveryAddress>\n</Document>"
+            b"</Documents></EasyfattDocuments>"
+        )
+
+        self.assertEqual(report.documenti_aggiunti, 2)
+        self.assertEqual(report.documenti_duplicati, 1)
+        self.assertIn(b"<Notes>Consegna</Notes>", content)
+        self.assertIn(b"<Notes>Ritiro</Notes>", content)
+
+    def test_only_duplicates(self):
+        """Test that an addition whose documents are all already present is an error."""
+        document = (
+            "<Document><CustomerCode>00001</CustomerCode>"
+            + _IDENTIFIERS.format(number=1)
+            + "</Document>"
+        )
+        self.addition.write_text(document, encoding="utf-8")
+
+        with self.assertRaisesRegex(ValueError, "già presenti"):
+            self._modifica_xml(
+                b"<EasyfattDocuments><Documents>"
+                + document.encode("utf-8")
+                + b"</Documents></EasyfattDocuments>"
+            )
+
+        self.assertFalse((self.directory / "output.DefXml").exists())
+
+    def test_invalid_documents(self):
+        """Test that exactly one `Documents` tag is required."""
+        for content in [
+            b"<EasyfattDocuments></EasyfattDocuments>",
+            b"<EasyfattDocuments><Documents/><Documents/></EasyfattDocuments>",
+            b"<EasyfattDocuments><Company><Documents/></Company></EasyfattDocuments>",
+        ]:
+            with self.subTest(content=content), self.assertRaises(Exception):
+                self._modifica_xml(content)
+
+    def test_invalid_addition(self):
+        """Test that the addition must be a valid `Document` tag."""
+        for addition in ["<Document>", "<Row><Code>1</Code></Row>", "<Documents/>"]:
+            self.addition.write_text(addition, encoding="utf-8")
+
+            with self.subTest(addition=addition), self.assertRaises(Exception):
+                self._modifica_xml(
+                    b"<EasyfattDocuments><Documents></Documents></EasyfattDocuments>"
+                )
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,173 @@
+"""Tests for the batch generation of many CSV files in a single run."""
+
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+# Hack needed to include scripts from the `scripts` directory (under root)
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent.parent))
+
+# Mock the private `easyfatt_db_connector` package (unavailable in test environments)
+# before importing any veryeasyfatt module that transitively depends on it.
+_mock_edb = MagicMock()
+sys.modules.setdefault("easyfatt_db_connector", _mock_edb)
+sys.modules.setdefault("easyfatt_db_connector.xml", _mock_edb.xml)
+sys.modules.setdefault("easyfatt_db_connector.xml.document", _mock_edb.xml.document)
+
+from veryeasyfatt.app.process_batch import genera_batch, trova_file_batch
+
+_XML_TEMPLATE = """\
+<?xml version="1.0" encoding="UTF-8"?>
+<EasyfattDocuments AppVersion="2">
+<Documents>
+    <Document>
+        <CustomerCode>{code}</CustomerCode>
+        <CustomerName>{name}</CustomerName>
+        <CustomerAddress>VIA APPIA, 1</CustomerAddress>
+        <CustomerPostcode>00179</CustomerPostcode>
+        <CustomerCity>ROMA</CustomerCity>
+        <TransportedWeight>2 Kg</TransportedWeight>
+    </Document>
+</Documents>
+</EasyfattDocuments>
+"""
+
+
+def _make_mock_settings() -> MagicMock:
+    """Create a mock settings object with the required attributes for testing."""
+    mock = MagicMock()
+    mock.easyfatt.customers.export_filename = []
+    mock.easyfatt.database.filename = None
+    mock.options.output.csv_template = (
+        "@{CustomerName} {CustomerCode}@{eval_IndirizzoSpedizione} {eval_CAPSpedizione} "
+        "{eval_CittaSpedizione}(20){eval_intervalloSpedizione}^{eval_pesoSpedizione}^"
+    )
+    mock.options.output.parallel_workers = 1
+    mock.features.shipping.default_interval = "07:00-16:00"
+    return mock
+
+
+class BatchTestCase(unittest.TestCase):
+    """Tests for the batch generation of many CSV files in a single run."""
+
+    def setUp(self):
+        """Create a temporary directory containing some `*.DefXml` files."""
+        self._directory = tempfile.TemporaryDirectory()
+        self.input_directory = Path(self._directory.name)
+
+        for code, name in [("00001", "Mario Rossi"), ("00002", "Luigi Verdi")]:
+            (self.input_directory / f"Documenti-{code}.DefXml").write_text(
+                _XML_TEMPLATE.format(code=code, name=name)
+            )
+        (self.input_directory / "notes.txt").write_text("Not an export")
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        self._directory.cleanup()
+
+    def test_find_files(self):
+        """Test that both directories and glob patterns are accepted."""
+        expected = [
+            self.input_directory / "Documenti-00001.DefXml",
+            self.input_directory / "Documenti-00002.DefXml",
+        ]
+
+        self.assertEqual(trova_file_batch(self.input_directory), expected)
+        self.assertEqual(
+            trova_file_batch(self.input_directory / "Documenti-*.DefXml"), expected
+        )
+        self.assertEqual(trova_file_batch(self.input_directory / "*.csv"), [])
+
+    def test_batch(self):
+        """Test that one CSV is generated for every input, sequentially or concurrently."""
+        files = trova_file_batch(self.input_directory)
+
+        for processi in [1, 2]:
+            with (
+                self.subTest(processi=processi),
+                tempfile.TemporaryDirectory() as output_directory,
+                patch("veryeasyfatt.app.process_csv.settings", _make_mock_settings()),
+                patch("veryeasyfatt.app.process_batch.settings", _make_mock_settings()),
+            ):
+                risultati = genera_batch(
+                    files, cartella_output=output_directory, processi=processi
+                )
+
+                self.assertTrue(all(risultato.successo for risultato in risultati))
+                self.assertEqual(
+                    [risultato.csv.name for risultato in risultati],
+                    ["Documenti-00001.csv", "Documenti-00002.csv"],
+                )
+                self.assertEqual(
+                    [risultato.csv.read_text() for risultato in risultati],
+                    [
+                        "@Mario Rossi 00001@VIA APPIA, 1 00179 ROMA(20)07:00>>16:00^2^",
+                        "@Luigi Verdi 00002@VIA APPIA, 1 00179 ROMA(20)07:00>>16:00^2^",
+                    ],
+                )
+
+    def test_errors_do_not_stop_the_batch(self):
+        """Test that an invalid file is reported without affecting the others."""
+        (self.input_directory / "Documenti-00003.DefXml").write_text("<Invalid")
+
+        with patch("veryeasyfatt.app.process_csv.settings", _make_mock_settings()):
+            risultati = genera_batch(trova_file_batch(self.input_directory), processi=1)
+
+        self.assertEqual(
+            [risultato.successo for risultato in risultati], [True, True, False]
+        )
+        self.assertTrue((self.input_directory / "Documenti-00001.csv").exists())
+
+    def test_same_name_in_different_directories(self):
+        """Test that inputs with the same name keep their relative path in the output directory."""
+        for year in ["2023", "2024"]:
+            (self.input_directory / year).mkdir()
+            (self.input_directory / year / "Documenti.DefXml").write_text(
+                _XML_TEMPLATE.format(code=year, name="Mario Rossi")
+            )
+
+        files = trova_file_batch(self.input_directory / "*" / "Documenti.DefXml")
+        with (
+            tempfile.TemporaryDirectory() as output_directory,
+            patch("veryeasyfatt.app.process_csv.settings", _make_mock_settings()),
+        ):
+            risultati = genera_batch(
+                files, cartella_output=output_directory, processi=1
+            )
+
+            self.assertTrue(all(risultato.successo for risultato in risultati))
+            self.assertEqual(
+                [risultato.csv for risultato in risultati],
+                [
+                    Path(output_directory) / "2023" / "Documenti.csv",
+                    Path(output_directory) / "2024" / "Documenti.csv",
+                ],
+            )
+            self.assertIn("Mario Rossi 2024", risultati[1].csv.read_text())
+
+    def test_output_collision(self):
+        """Test that an input whose CSV would overwrite another one is reported as an error."""
+        (self.input_directory / "Documenti-00001.xml").write_text(
+            _XML_TEMPLATE.format(code="00003", name="Anna Bianchi")
+        )
+
+        files = trova_file_batch(self.input_directory / "Documenti-*")
+        with (
+            tempfile.TemporaryDirectory() as output_directory,
+            patch("veryeasyfatt.app.process_csv.settings", _make_mock_settings()),
+        ):
+            risultati = genera_batch(
+                files, cartella_output=output_directory, processi=1
+            )
+
+            self.assertEqual(
+                [risultato.successo for risultato in risultati], [True, False, True]
+            )
+            self.assertIsInstance(risultati[1].errore, FileExistsError)
+            self.assertIn("Mario Rossi 00001", risultati[0].csv.read_text())
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
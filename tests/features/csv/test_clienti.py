@@ -0,0 +1,396 @@
+"""Tests for the customer data read by `veryeasyfatt.app.clienti` (export and database)."""
+
+import contextlib
+import datetime
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+
+# Hack needed to include scripts from the `scripts` directory (under root)
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent.parent))
+
+import veryeasyfatt.app.clienti as clienti
+from veryeasyfatt.app.fogli import leggi_foglio
+import veryeasyfatt.app.process_csv as process_csv
+
+
+class CustomersCacheTestCase(unittest.TestCase):
+    """Tests for the cache of `get_customers_dataframe`."""
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.directory = Path(self._directory.name)
+
+        self.export = self.directory / "Soggetti.xlsx"
+        self._write_export(["8 a 12", "7-16"])
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def _write_export(self, intervals: list[str]):
+        pd.DataFrame(
+            {
+                "Cod.": [f"{i:05d}" for i in range(1, len(intervals) + 1)],
+                "Denominazione": [f"Cliente {i}" for i in range(len(intervals))],
+                "Extra 1": intervals,
+            }
+        ).to_excel(self.export, index=False)
+
+    def _touch(self):
+        stat = self.export.stat()
+        os.utime(self.export, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    def _get_customers_data(self):
+        with self.assertLogs("danea-easyfatt.clienti", level="INFO") as logs:
+            data = clienti.get_customers_data(self.export, cache_path=self.directory)
+
+        return data, "\n".join(logs.output)
+
+    def test_unchanged_file(self):
+        """Test that an untouched export is loaded from the cache without reading it."""
+        data, logs = self._get_customers_data()
+        self.assertIn("Salvato file di cache", logs)
+
+        with (
+            patch("veryeasyfatt.shared.fingerprint.file_digest") as file_digest,
+            patch("pandas.read_excel") as read_excel,
+        ):
+            cached, logs = self._get_customers_data()
+
+        self.assertIn("Carico i dati dal file di cache", logs)
+        self.assertEqual(cached, data)
+        file_digest.assert_not_called()
+        read_excel.assert_not_called()
+
+    def test_same_content(self):
+        """Test that an export saved again with the same content is recognized through its hash."""
+        data, _ = self._get_customers_data()
+        self._touch()
+
+        with patch("pandas.read_excel") as read_excel:
+            cached, logs = self._get_customers_data()
+        self.assertIn("Carico i dati dal file di cache", logs)
+        self.assertEqual(cached, data)
+        read_excel.assert_not_called()
+
+        # The new modification time is stored, so the hash is not computed again
+        with patch("veryeasyfatt.shared.fingerprint.file_digest") as file_digest:
+            self._get_customers_data()
+        file_digest.assert_not_called()
+
+    def test_dataframe(self):
+        """Test that the cached table is loaded back as the same DataFrame."""
+        self._write_export(["8 a 12", None, "7-16"])
+
+        expected = clienti.get_customers_dataframe(
+            self.export, cache_path=self.directory
+        )
+        with patch("pandas.read_excel") as read_excel:
+            cached = clienti.get_customers_dataframe(
+                self.export, cache_path=self.directory
+            )
+
+        read_excel.assert_not_called()
+        pd.testing.assert_frame_equal(cached, expected)
+        self.assertTrue(pd.isna(cached["Extra 1"][1]))
+
+    def test_changed_file(self):
+        """Test that a modified export invalidates the cache."""
+        self._get_customers_data()
+        self._write_export(["9 a 13", "7-16"])
+        self._touch()
+
+        data, logs = self._get_customers_data()
+        self.assertIn("Salvato file di cache", logs)
+        self.assertEqual(data[0]["Extra 1"], "9 a 13")
+
+
+class DeliveryIntervalsTestCase(unittest.TestCase):
+    """Tests for `get_intervallo_spedizioni`."""
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.directory = Path(self._directory.name)
+        self.export = self.directory / "Soggetti.xlsx"
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def _get_intervallo_spedizioni(self, df: pd.DataFrame, extra_field_id=1):
+        df.to_excel(self.export, index=False)
+
+        with patch.object(clienti.bundle, "get_execution_directory") as directory:
+            directory.return_value = self.directory
+            return clienti.get_intervallo_spedizioni(self.export, extra_field_id)
+
+    def test_intervals(self):
+        """Test that valid intervals are normalized and the others are skipped."""
+        self.assertEqual(
+            self._get_intervallo_spedizioni(
+                pd.DataFrame(
+                    {
+                        "Cod.": ["00001", "00002", "00003", "00004", "00005"],
+                        "Extra 1": ["", "7-16", "  8 a 12 ", None, "invalid"],
+                        "Extra 2": ["14 >> 18", "9:30 > 13", "  ", "8-12", None],
+                    }
+                ),
+                extra_field_id=2,
+            ),
+            {"00001": "14:00>>18:00", "00002": "09:30>>13:00", "00004": "08:00>>12:00"},
+        )
+
+    def test_missing_code(self):
+        """Test that customers without a code (or with a blank one) raise an error."""
+        for code in [None, "   "]:
+            with (
+                self.subTest(code=code),
+                self.assertRaisesRegex(Exception, "NON VALORIZZATO(.|\\n)*Cliente 2"),
+            ):
+                self._get_intervallo_spedizioni(
+                    pd.DataFrame(
+                        {
+                            "Cod.": ["00001", code],
+                            "Denominazione": ["Cliente 1", "Cliente 2"],
+                            "Extra 1": ["8 a 12", "7-16"],
+                        }
+                    )
+                )
+
+    def test_cache(self):
+        """Test that the intervals are cached until the export or the extra field change."""
+        df = pd.DataFrame(
+            {"Cod.": ["00001"], "Extra 1": ["8 a 12"], "Extra 2": ["7-16"]}
+        )
+        self.assertEqual(self._get_intervallo_spedizioni(df), {"00001": "08:00>>12:00"})
+
+        def get_intervallo_spedizioni(extra_field_id=1):
+            return clienti.get_intervallo_spedizioni(
+                self.export, extra_field_id, cache_path=self.directory / ".cache"
+            )
+
+        with patch.object(
+            clienti, "get_customers_dataframe", wraps=clienti.get_customers_dataframe
+        ) as get_customers_dataframe:
+            self.assertEqual(get_intervallo_spedizioni(), {"00001": "08:00>>12:00"})
+            get_customers_dataframe.assert_not_called()
+
+            self.assertEqual(get_intervallo_spedizioni(2), {"00001": "07:00>>16:00"})
+            get_customers_dataframe.assert_called_once()
+
+            df.loc[0, "Extra 2"] = "9-13"
+            stat = self.export.stat()
+            df.to_excel(self.export, index=False)
+            os.utime(
+                self.export, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000)
+            )
+            self.assertEqual(get_intervallo_spedizioni(2), {"00001": "09:00>>13:00"})
+            self.assertEqual(get_customers_dataframe.call_count, 2)
+
+
+class SQLiteEasyfattDB:
+    """Stand-in for `EasyfattFDB`, backed by a SQLite database with the same tables."""
+
+    def __init__(self, database: Path):
+        self.database = database
+        self.queries: list[str] = []
+
+    @contextlib.contextmanager
+    def connect(self):
+        with contextlib.closing(sqlite3.connect(self.database)) as connection:
+            connection.row_factory = sqlite3.Row
+            yield SQLiteConnection(connection, self.queries)
+
+
+class SQLiteConnection:
+    """Exposes the subset of the `fdb` connection API used by the application."""
+
+    def __init__(self, connection: sqlite3.Connection, queries: list[str]):
+        self.connection = connection
+        self.queries = queries
+
+    def cursor(self):
+        return self
+
+    def execute(self, query: str):
+        self.queries.append(query)
+        self._cursor = self.connection.execute(query)
+        return self
+
+    def fetchallmap(self):
+        return [dict(row) for row in self._cursor.fetchall()]
+
+
+class DatabaseIntervalsTestCase(unittest.TestCase):
+    """Tests for `get_intervallo_spedizioni_database`."""
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.database = Path(self._directory.name) / "database.sqlite"
+
+        with contextlib.closing(sqlite3.connect(self.database)) as connection:
+            connection.execute("""
+                CREATE TABLE "TAnagrafica" (
+                    "IDAnagr" INTEGER PRIMARY KEY, "CodAnagr" TEXT, "Nome" TEXT,
+                    "Indirizzo" TEXT, "Cap" TEXT, "Citta" TEXT, "Prov" TEXT,
+                    "PartitaIva" TEXT, "Cliente" INTEGER, "Fornitore" INTEGER,
+                    "Extra1" TEXT, "Extra2" TEXT, "Extra3" TEXT
+                )
+                """)
+            connection.executemany(
+                """
+                INSERT INTO "TAnagrafica" ("CodAnagr", "Nome", "Cliente", "Fornitore", "Extra1", "Extra2")
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    ("00001", "Cliente 1", 1, 0, "8 a 12", "7-16"),
+                    ("00002", "Cliente 2", 1, 1, None, "  9 > 13 "),
+                    ("00003", "Cliente 3", 1, 0, "", "invalid"),
+                    (None, "Fornitore", 0, 1, "8-12", None),
+                ],
+            )
+            connection.commit()
+
+        self.connector = SQLiteEasyfattDB(self.database)
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def test_intervals(self):
+        """Test that the intervals are read from the customers in `TAnagrafica`."""
+        self.assertEqual(
+            clienti.get_intervallo_spedizioni_database(self.connector),
+            {"00001": "08:00>>12:00"},
+        )
+        self.assertEqual(
+            clienti.get_intervallo_spedizioni_database(self.connector, 2),
+            {"00001": "07:00>>16:00", "00002": "09:00>>13:00"},
+        )
+
+        # A single query, reading only the requested extra field
+        self.assertEqual(len(self.connector.queries), 2)
+        self.assertIn('"Extra2"', self.connector.queries[-1])
+        self.assertNotIn('"Extra1"', self.connector.queries[-1])
+
+    def test_missing_code(self):
+        """Test that customers without a code raise the same error as the export."""
+        with contextlib.closing(sqlite3.connect(self.database)) as connection:
+            connection.execute(
+                """UPDATE "TAnagrafica" SET "CodAnagr" = ' ' WHERE "Nome" = 'Cliente 3'"""
+            )
+            connection.commit()
+
+        with self.assertRaisesRegex(Exception, "NON VALORIZZATO(.|\\n)*Cliente 3"):
+            clienti.get_intervallo_spedizioni_database(self.connector)
+
+    def test_unreadable_database(self):
+        """Test that an unreadable database falls back to the default intervals (other errors are raised)."""
+        settings = MagicMock()
+        settings.easyfatt.customers.export_filename = []
+        settings.easyfatt.database.filename = "missing.fdb"
+
+        with patch.object(process_csv, "settings", settings), patch.object(
+            process_csv,
+            "get_intervallo_spedizioni_database",
+            side_effect=OSError("connection refused"),
+        ):
+            with self.assertLogs("danea-easyfatt.csv", level="ERROR") as logs:
+                self.assertEqual(process_csv._carica_intervallo_spedizioni(), {})
+
+        self.assertIn("connection refused", "\n".join(logs.output))
+
+        with patch.object(process_csv, "settings", settings), patch.object(
+            process_csv,
+            "get_intervallo_spedizioni_database",
+            side_effect=Exception("NON VALORIZZATO"),
+        ):
+            with self.assertRaisesRegex(Exception, "NON VALORIZZATO"):
+                process_csv._carica_intervallo_spedizioni()
+
+    def test_no_firebird_download(self):
+        """Test that Firebird is downloaded only if explicitly requested."""
+        connector = MagicMock()
+        connector.EasyfattFDB.return_value = self.connector
+
+        with patch.dict(sys.modules, {"easyfatt_db_connector": connector}):
+            clienti.get_intervallo_spedizioni_database("database.eft")
+            connector.EasyfattFDB.assert_called_with(
+                "database.eft", download_firebird=False
+            )
+
+            clienti.get_intervallo_spedizioni_database(
+                "database.eft", download_firebird=True
+            )
+            connector.EasyfattFDB.assert_called_with(
+                "database.eft", download_firebird=True
+            )
+
+
+class SpreadsheetTestCase(unittest.TestCase):
+    """Tests for the column-projected reader of `veryeasyfatt.app.fogli`."""
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.directory = Path(self._directory.name)
+
+        self.df = pd.DataFrame(
+            {
+                "Cod.": ["00001", "2", None, "  ", "NA"],
+                "Denominazione": ["A  B", "Caffè", None, "x\ny", "Bar"],
+                "Cap": [182, 2.5, None, 179, 10100],
+                "Data": [datetime.datetime(2020, 1, 2), None, None, None, None],
+                "Extra 1": ["8 a 12", "", None, "7-16", "  9 - 10 "],
+            }
+        )
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def test_same_as_read_excel(self):
+        """Test that the projected columns are the same returned by `pd.read_excel`."""
+        for extension in ["xlsx", "ods"]:
+            export = self.directory / f"Soggetti.{extension}"
+            # NOTE: The engine is chosen from the extension only if the path is a string
+            self.df.to_excel(str(export), index=False)
+            expected = pd.read_excel(export, dtype=str)
+
+            for columns in [
+                ["Cod.", "Extra 1"],
+                ["Extra 1", "Denominazione", "Cap", "Data", "Missing"],
+                list(self.df.columns),
+            ]:
+                with self.subTest(extension=extension, columns=columns):
+                    pd.testing.assert_frame_equal(
+                        leggi_foglio(export, columns),
+                        expected[[c for c in expected.columns if c in columns]],
+                    )
+
+    def test_cached_columns(self):
+        """Test that the cache is only used if it contains all the requested columns."""
+        export = self.directory / "Soggetti.xlsx"
+        self.df.to_excel(export, index=False)
+
+        def get_customers_dataframe(columns):
+            return clienti.get_customers_dataframe(
+                export, cache_path=self.directory, colonne=columns
+            )
+
+        get_customers_dataframe(["Cod.", "Extra 1", "Cap"])
+        with patch("veryeasyfatt.app.clienti.leggi_foglio") as read:
+            self.assertEqual(
+                list(get_customers_dataframe(["Extra 1", "Cod."]).columns),
+                ["Cod.", "Extra 1"],
+            )
+        read.assert_not_called()
+
+        df = get_customers_dataframe(["Cod.", "Denominazione"])
+        self.assertEqual(list(df.columns), ["Cod.", "Denominazione"])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -1,16 +1,66 @@
 from xml.sax.saxutils import escape
 from pathlib import Path
+import os
 import re
+import stat
 import sys
+import tempfile
 import unittest
+from unittest.mock import patch
 
 import veryeasyfatt.app.process_csv as csv
+from veryeasyfatt.app.documenti import CacheDocumenti, DocumentiEasyfatt
+from veryeasyfatt.shared import columnar
 
 # Hack needed to include scripts from the `scripts` directory (under root)
 sys.path.append(str(Path(__file__).resolve().parent.parent.parent.parent))
 
 from tests.utils.decorators import with_temporary_file
 
+STREAMING_DOCUMENTS = """<?xml version="1.0" encoding="UTF-8"?>
+        <EasyfattDocuments AppVersion="2">
+        <Documents>
+            <Document>
+                <CustomerCode>00001</CustomerCode>
+                <CustomerName>Mario Rossi</CustomerName>
+                <CustomerAddress>VIA TUSCOLANA, 0</CustomerAddress>
+                <CustomerPostcode>00182</CustomerPostcode>
+                <CustomerCity>ROMA</CustomerCity>
+                <DeliveryAddress>VIA TUSCOLANA, 1000</DeliveryAddress>
+                <DeliveryPostcode>00174</DeliveryPostcode>
+                <DeliveryCity>ROMA</DeliveryCity>
+                <TransportedWeight>12,5 Kg</TransportedWeight>
+                <CustomField4>8 a 12</CustomField4>
+            </Document>
+            <Document>
+                <CustomerCode>00002</CustomerCode>
+                <CustomerName>Luigi Verdi</CustomerName>
+                <CustomerAddress>VIA APPIA, 1</CustomerAddress>
+                <CustomerPostcode>00179</CustomerPostcode>
+                <CustomerCity>ROMA</CustomerCity>
+            </Document>
+            <Document>
+                <CustomerCode>00003</CustomerCode>
+                <CustomerName>Anna Bianchi</CustomerName>
+                <CustomerAddress>VIA CASILINA, 2</CustomerAddress>
+                <CustomerPostcode>00176</CustomerPostcode>
+                <CustomerCity>ROMA</CustomerCity>
+                <DeliveryAddress></DeliveryAddress>
+                <DeliveryPostcode></DeliveryPostcode>
+                <DeliveryCity></DeliveryCity>
+            </Document>
+        </Documents>
+        </EasyfattDocuments>
+    """
+""" Export used by the streaming tests (same rows whatever the block size, backend or cache). """
+
+STREAMING_ROWS = [
+    "@Mario Rossi 00001@VIA TUSCOLANA, 1000 00174 ROMA(20)08:00>>12:00^12,5^",
+    "@Luigi Verdi 00002@VIA APPIA, 1 00179 ROMA(20)07:00>>16:00^0^",
+    "@Anna Bianchi 00003@VIA CASILINA, 2 00176 ROMA(20)07:00>>16:00^0^",
+]
+""" Rows generated from `STREAMING_DOCUMENTS`. """
+
 
 class XMLDocumentTestCase(unittest.TestCase):
     _executable_name = Path("./src/veryeasyfatt/bootstrap.py").resolve()
@@ -572,5 +622,252 @@ class XMLDocumentTestCase(unittest.TestCase):
             )
 
 
+    @with_temporary_file(
+        file_prefix="Documenti-",
+        file_suffix=".DefXml",
+        content=STREAMING_DOCUMENTS,
+    )
+    def test_block_size(self, xml_document: Path):
+        """Test that the streaming generator produces the same rows regardless of the block size."""
+        self.assertEqual(csv.genera_csv(xml_document.read_text(encoding="utf8")), STREAMING_ROWS)
+
+        for dimensione_blocco in [1, 2, 1000]:
+            self.assertEqual(
+                list(csv.genera_righe_csv(xml_document, dimensione_blocco=dimensione_blocco)),
+                STREAMING_ROWS,
+            )
+
+    @with_temporary_file(
+        file_prefix="Documenti-",
+        file_suffix=".DefXml",
+        content=STREAMING_DOCUMENTS,
+    )
+    def test_parallel_workers(self, xml_document: Path):
+        """Test that blocks rendered by multiple processes are merged in the original order."""
+        self.assertEqual(
+            list(csv.genera_righe_csv(xml_document, dimensione_blocco=1, processi=2)),
+            STREAMING_ROWS,
+        )
+
+    @with_temporary_file(
+        file_prefix="Documenti-",
+        file_suffix=".DefXml",
+        content=STREAMING_DOCUMENTS,
+    )
+    def test_xml_parsers(self, xml_document: Path):
+        """Test that both XML parsers produce the same rows."""
+        for backend in ["etree", "lxml"]:
+            self.assertEqual(
+                list(csv.genera_righe_csv(DocumentiEasyfatt(xml_document, conserva=[], backend=backend))),
+                STREAMING_ROWS,
+            )
+
+    @with_temporary_file(
+        file_prefix="Documenti-",
+        file_suffix=".DefXml",
+        content=STREAMING_DOCUMENTS,
+    )
+    def test_row_cache(self, xml_document: Path):
+        """Test that the rows of unchanged documents are reused from the cache of the previous run."""
+        with tempfile.TemporaryDirectory() as cache_path:
+            with self.assertLogs("danea-easyfatt.csv", level="INFO") as logs:
+                self.assertEqual(
+                    list(csv.genera_righe_csv(xml_document, cache=True, cache_path=cache_path)),
+                    STREAMING_ROWS,
+                )
+            self.assertIn("riutilizzate dalla cache: 0, generate: 3", "\n".join(logs.output))
+
+            modified = xml_document.read_text(encoding="utf8").replace("Luigi Verdi", "Luigi Neri")
+            with self.assertLogs("danea-easyfatt.csv", level="INFO") as logs:
+                self.assertEqual(
+                    csv.genera_csv(modified, cache=True, cache_path=cache_path),
+                    [STREAMING_ROWS[0], STREAMING_ROWS[1].replace("Luigi Verdi", "Luigi Neri"), STREAMING_ROWS[2]],
+                )
+            self.assertIn("riutilizzate dalla cache: 2, generate: 1", "\n".join(logs.output))
+
+    @with_temporary_file(
+        file_prefix="Documenti-",
+        file_suffix=".DefXml",
+        content=STREAMING_DOCUMENTS,
+    )
+    def test_row_cache_interrupted_write(self, xml_document: Path):
+        """Test that a failed save of the row cache leaves the previous file untouched."""
+        with tempfile.TemporaryDirectory() as cache_path:
+            list(csv.genera_righe_csv(xml_document, cache=True, cache_path=cache_path))
+            cache_file = Path(cache_path) / csv.CACHE_RIGHE_FILENAME
+            content = cache_file.read_bytes()
+
+            with patch.object(csv.pickle, "dump", side_effect=KeyboardInterrupt), self.assertRaises(KeyboardInterrupt):
+                list(csv.genera_righe_csv(xml_document, cache=True, cache_path=cache_path))
+
+            self.assertEqual(cache_file.read_bytes(), content)
+            self.assertEqual([path.name for path in Path(cache_path).iterdir()], [cache_file.name])
+
+    @with_temporary_file(
+        file_prefix="Documenti-",
+        file_suffix=".DefXml",
+        content=STREAMING_DOCUMENTS,
+    )
+    @unittest.skipIf(os.name == "nt", "Permissions are not supported on Windows")
+    def test_row_cache_file_mode(self, xml_document: Path):
+        """Test that saving the row cache keeps the permissions of the previous file."""
+        with tempfile.TemporaryDirectory() as cache_path:
+            cache_file = Path(cache_path) / csv.CACHE_RIGHE_FILENAME
+            cache_file.touch()
+            cache_file.chmod(0o640)
+
+            list(csv.genera_righe_csv(xml_document, cache=True, cache_path=cache_path))
+            self.assertEqual(stat.S_IMODE(cache_file.stat().st_mode), 0o640)
+
+    @with_temporary_file(
+        file_prefix="Documenti-",
+        file_suffix=".DefXml",
+        content=STREAMING_DOCUMENTS,
+    )
+    def test_document_cache(self, xml_document: Path):
+        """Test that the documents of an unchanged export (same file or same content) are loaded from the cache."""
+        with tempfile.TemporaryDirectory() as cache_path:
+            first = DocumentiEasyfatt(xml_document, cache=True, cache_path=cache_path)
+            self.assertEqual(list(csv.genera_righe_csv(first)), STREAMING_ROWS)
+
+            copy = Path(cache_path) / "copy.DefXml"
+            copy.write_bytes(xml_document.read_bytes())
+            for source in [xml_document, copy]:
+                with self.assertLogs("danea-easyfatt.documenti", level="INFO") as logs:
+                    documenti = DocumentiEasyfatt(source, cache=True, cache_path=cache_path)
+                    self.assertEqual(list(csv.genera_righe_csv(documenti)), STREAMING_ROWS)
+                self.assertIn("caricati dalla cache (3 documenti)", "\n".join(logs.output))
+                self.assertTrue(documenti.dataframe.equals(first.dataframe))
+
+            # Only the most recently used entries are kept
+            copy.write_bytes(xml_document.read_bytes().replace(b"Luigi Verdi", b"Luigi Neri"))
+            cache = CacheDocumenti(Path(cache_path) / "documenti", max_voci=1)
+            list(cache.salva(copy, DocumentiEasyfatt(copy).blocchi()))
+            self.assertEqual(len(list(cache.cartella.iterdir())), 1)
+            self.assertIsNone(cache.carica(xml_document))
+            self.assertIsNotNone(cache.carica(copy))
+
+    @with_temporary_file(
+        file_prefix="Documenti-",
+        file_suffix=".DefXml",
+        content=STREAMING_DOCUMENTS,
+    )
+    def test_document_cache_blocks(self, xml_document: Path):
+        """Test that the document cache is written and read back one block at a time."""
+        with tempfile.TemporaryDirectory() as cache_path:
+            cache = CacheDocumenti(Path(cache_path) / "documenti")
+
+            # An interrupted read does not leave an entry behind
+            blocchi = cache.salva(xml_document, DocumentiEasyfatt(xml_document, dimensione_blocco=1).blocchi())
+            next(blocchi)
+            blocchi.close()
+            self.assertEqual(list(cache.cartella.iterdir()), [])
+
+            documenti = DocumentiEasyfatt(xml_document, dimensione_blocco=1, cache=True, cache_path=cache_path)
+            for blocco in documenti.blocchi():
+                # Every block is saved as soon as it is read
+                self.assertEqual(len(blocco), 1)
+
+            (voce,) = cache.cartella.iterdir()
+            self.assertEqual(sorted(path.name for path in voce.iterdir() if path.is_dir()), ["0", "1", "2"])
+
+            salvati = cache.carica(xml_document)
+            self.assertIsNotNone(salvati)
+            self.assertEqual([len(blocco) for blocco in salvati], [1, 1, 1])
+
+        # Saved blocks larger than the requested size are split
+        with tempfile.TemporaryDirectory() as cache_path:
+            list(DocumentiEasyfatt(xml_document, cache=True, cache_path=cache_path).blocchi())
+
+            documenti = DocumentiEasyfatt(xml_document, dimensione_blocco=2, cache=True, cache_path=cache_path)
+            with self.assertLogs("danea-easyfatt.documenti", level="INFO"):
+                self.assertEqual([len(blocco) for blocco in documenti.blocchi()], [2, 1])
+
+    @with_temporary_file(
+        file_prefix="Documenti-",
+        file_suffix=".DefXml",
+        content=STREAMING_DOCUMENTS,
+    )
+    def test_damaged_document_cache(self, xml_document: Path):
+        """Test that a damaged document cache entry is dropped and the XML is parsed again."""
+        def documenti(cache_path):
+            return DocumentiEasyfatt(xml_document, dimensione_blocco=1, cache=True, cache_path=cache_path)
+
+        # Detected before reading (`verify_table`) or while reading the blocks
+        for verify in [True, False]:
+            with self.subTest(verify=verify), tempfile.TemporaryDirectory() as cache_path:
+                list(documenti(cache_path).blocchi())
+                (voce,) = (Path(cache_path) / "documenti").iterdir()
+                column = voce / "1" / "0.npy"
+                column.write_bytes(column.read_bytes()[:-4])
+
+                with patch.object(columnar, "verify_table", wraps=columnar.verify_table if verify else lambda directory: None):
+                    self.assertEqual(list(csv.genera_righe_csv(documenti(cache_path))), STREAMING_ROWS)
+
+                # The entry is saved again
+                with self.assertLogs("danea-easyfatt.documenti", level="INFO") as logs:
+                    self.assertEqual(list(csv.genera_righe_csv(documenti(cache_path))), STREAMING_ROWS)
+                self.assertIn("caricati dalla cache (3 documenti)", "\n".join(logs.output))
+
+    @with_temporary_file(
+        file_prefix="Documenti-",
+        file_suffix=".DefXml",
+        content="""<?xml version="1.0" encoding="UTF-8"?>
+        <EasyfattDocuments AppVersion="2">
+        <Documents>
+            <Document>
+                <CustomerCode>00001</CustomerCode>
+                <CustomerName>Mario Rossi</CustomerName>
+                <CustomerAddress>VIA TUSCOLANA, 1000</CustomerAddress>
+                <CustomerPostcode>00174</CustomerPostcode>
+                <CustomerCity>1</CustomerCity>
+                <DeliveryAddress>0</DeliveryAddress>
+                <DeliveryPostcode>00100</DeliveryPostcode>
+                <DeliveryCity>2</DeliveryCity>
+                <TransportedWeight>12</TransportedWeight>
+            </Document>
+            <Document>
+                <CustomerCode>00002</CustomerCode>
+                <CustomerName>Luigi Verdi</CustomerName>
+                <CustomerAddress>VIA APPIA, 1</CustomerAddress>
+                <CustomerPostcode>00179</CustomerPostcode>
+                <CustomerCity>ROMA</CustomerCity>
+                <DeliveryAddress>VIA APPIA, 2</DeliveryAddress>
+                <DeliveryPostcode>00179</DeliveryPostcode>
+                <DeliveryCity>ROMA</DeliveryCity>
+                <TransportedWeight>12,5 Kg</TransportedWeight>
+            </Document>
+            <Document>
+                <CustomerCode>00003</CustomerCode>
+                <CustomerName>Anna Bianchi</CustomerName>
+                <CustomerAddress>VIA CASILINA, 2</CustomerAddress>
+                <CustomerPostcode>00176</CustomerPostcode>
+                <CustomerCity>1</CustomerCity>
+                <TransportedWeight>3.5</TransportedWeight>
+            </Document>
+        </Documents>
+        </EasyfattDocuments>
+    """,
+    )
+    def test_block_types(self, xml_document: Path):
+        """Test that numeric-looking values are rendered as written, whichever block they fall in."""
+        expected = [
+            "@Mario Rossi 00001@0 00100 2(20)07:00>>16:00^12^",
+            "@Luigi Verdi 00002@VIA APPIA, 2 00179 ROMA(20)07:00>>16:00^12,5^",
+            "@Anna Bianchi 00003@VIA CASILINA, 2 00176 1(20)07:00>>16:00^3.5^",
+        ]
+
+        for dimensione_blocco in [1, 2, 1000]:
+            self.assertEqual(
+                list(csv.genera_righe_csv(xml_document, dimensione_blocco=dimensione_blocco)),
+                expected,
+            )
+
+        self.assertEqual(
+            list(csv.genera_righe_csv(xml_document, dimensione_blocco=1, processi=2)),
+            expected,
+        )
+
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)
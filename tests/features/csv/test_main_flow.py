@@ -140,10 +140,12 @@ def _make_mock_settings(input_xml_path: Path, output_csv_path: Path) -> MagicMoc
     mock.files.input.addition = None
     mock.files.output.csv = output_csv_path
     mock.easyfatt.customers.export_filename = []
+    mock.easyfatt.database.filename = None
     mock.options.output.csv_template = (
         "@{CustomerName} {CustomerCode}@{eval_IndirizzoSpedizione} {eval_CAPSpedizione} "
         "{eval_CittaSpedizione}(20){eval_intervalloSpedizione}^{eval_pesoSpedizione}^"
     )
+    mock.options.output.parallel_workers = 1
     mock.features.shipping.default_interval = "07:00-16:00"
     return mock
 
@@ -157,9 +159,13 @@ class CSVFlowTestCase(unittest.TestCase):
         os.close(fd)
         self._output_csv = Path(temp_file)
 
+        # Keep the CSV row cache out of the execution directory
+        self._execution_directory = tempfile.TemporaryDirectory()
+
     def tearDown(self):
         """Remove the temporary output CSV file after each test."""
         self._output_csv.unlink(missing_ok=True)
+        self._execution_directory.cleanup()
 
     def _run_main_with_mocks(
         self,
@@ -182,6 +188,10 @@ class CSVFlowTestCase(unittest.TestCase):
         with (
             patch("veryeasyfatt.app.main.settings", mock_settings),
             patch("veryeasyfatt.app.process_csv.settings", mock_settings),
+            patch(
+                "veryeasyfatt.app.process_csv.bundle.get_execution_directory",
+                return_value=Path(self._execution_directory.name),
+            ),
             patch(
                 "veryeasyfatt.app.main.Confirm.ask",
                 side_effect=[confirm_clipboard, confirm_open_file],
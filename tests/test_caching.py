@@ -0,0 +1,447 @@
+import itertools
+import json
+import os
+import pickle
+import sqlite3
+import stat
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from veryeasyfatt.app import caching
+
+
+class PersistToFileTestCase(unittest.TestCase):
+    # Do not use the docstring as the test name.
+    shortDescription = lambda self: None
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.directory = Path(self._directory.name)
+        self.calls: list[tuple] = []
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def _cached(self, file_name: Path, backend=caching.Backend.SQLITE, **kwargs):
+        @caching.persist_to_file(
+            file_name, backend=backend, include=[0], enabled="cache", **kwargs
+        )
+        def square(x, cache=True):
+            self.calls.append((x, cache))
+            return {"value": x * x}
+
+        return square
+
+    def test_backends(self):
+        """Test that the cached value is returned, also by a new decorated function."""
+        for backend in [caching.Backend.PICKLE, caching.Backend.SQLITE]:
+            with self.subTest(backend=backend):
+                self.calls.clear()
+                file_name = self.directory / f"cache.{backend.value}"
+
+                square = self._cached(file_name, backend)
+                self.assertEqual(square(3), {"value": 9})
+                self.assertEqual(square(3), {"value": 9})
+                self.assertEqual(self._cached(file_name, backend)(3), {"value": 9})
+                self.assertEqual(len(self.calls), 1)
+
+    def test_sqlite_rows(self):
+        """Test that every miss is stored as a single row of the SQLite database."""
+        file_name = self.directory / "cache.sqlite"
+        square = self._cached(file_name)
+
+        for x in range(5):
+            square(x)
+        square(5, cache=False)
+
+        with sqlite3.connect(file_name) as connection:
+            self.assertEqual(
+                connection.execute("SELECT COUNT(*) FROM cache").fetchone()[0], 5
+            )
+            self.assertEqual(
+                connection.execute("PRAGMA journal_mode").fetchone()[0], "wal"
+            )
+
+        # A value computed with the cache disabled is not persisted
+        self._cached(file_name)(5)
+        self.assertEqual(self.calls[-2:], [(5, False), (5, True)])
+
+    def test_sqlite_lazy_connection(self):
+        """Test that the database is not created until the function is called."""
+        file_name = self.directory / "cache.sqlite"
+        square = self._cached(file_name)
+
+        self.assertFalse(file_name.exists())
+        square(2)
+        self.assertTrue(file_name.exists())
+
+    def test_lazy_load(self):
+        """Test that the cache file is not read until the function is called."""
+        file_name = self.directory / "cache.pickle"
+        self._cached(file_name, caching.Backend.PICKLE)(3)
+
+        with patch("builtins.open", wraps=open) as mocked_open:
+            square = self._cached(file_name, caching.Backend.PICKLE)
+            mocked_open.assert_not_called()
+
+            self.assertEqual(square(3), {"value": 9})
+            mocked_open.assert_called_once()
+
+        self.assertEqual(len(self.calls), 1)
+
+    def test_warm(self):
+        """Test that `warm()` loads the cache, also from a background thread."""
+        for backend in [caching.Backend.PICKLE, caching.Backend.SQLITE]:
+            with self.subTest(backend=backend):
+                self.calls.clear()
+                file_name = self.directory / f"warm.{backend.value}"
+                self._cached(file_name, backend)(3)
+
+                square = self._cached(file_name, backend)
+                self.assertIsNone(square.warm())
+
+                square = self._cached(file_name, backend)
+                thread = square.warm(background=True)
+                thread.join()
+
+                with patch("builtins.open") as mocked_open:
+                    self.assertEqual(square(3), {"value": 9})
+                    mocked_open.assert_not_called()
+
+                self.assertEqual(len(self.calls), 1)
+
+    def test_migration(self):
+        """Test that the entries of a pickle cache are imported in a new SQLite database."""
+        pickle_file = self.directory / "cache.pickle"
+        self._cached(pickle_file, caching.Backend.PICKLE)(4)
+        self.assertEqual(len(self.calls), 1)
+
+        # Same format written by previous versions (tuple keys under "data")
+        with open(pickle_file, "rb") as f:
+            self.assertEqual(pickle.load(f)["data"], {(4,): {"value": 16}})
+
+        square = self._cached(self.directory / "cache.sqlite", migrate_from=pickle_file)
+        self.assertEqual(square(4), {"value": 16})
+        self.assertEqual(len(self.calls), 1)
+
+    def test_missing_migration_source(self):
+        """Test that a missing pickle cache is ignored."""
+        square = self._cached(
+            self.directory / "cache.sqlite",
+            migrate_from=self.directory / "missing.pickle",
+        )
+
+        self.assertEqual(square(2), {"value": 4})
+
+    def test_write_behind(self):
+        """Test that new entries are written every `flush_every` misses or on `flush()`."""
+        for backend in [caching.Backend.PICKLE, caching.Backend.SQLITE]:
+            with self.subTest(backend=backend):
+                file_name = self.directory / f"batched.{backend.value}"
+                square = self._cached(
+                    file_name,
+                    backend,
+                    write_behind=True,
+                    flush_every=3,
+                    flush_interval=None,
+                )
+
+                for x in range(4):
+                    square(x)
+                self.assertEqual(self._stored_keys(file_name, backend), {0, 1, 2})
+
+                square.flush()
+                self.assertEqual(self._stored_keys(file_name, backend), {0, 1, 2, 3})
+
+    def test_flush_interval(self):
+        """Test that new entries are written when `flush_interval` seconds have passed."""
+        file_name = self.directory / "cache.pickle"
+        with patch.object(caching.time, "monotonic", side_effect=[0, 1, 5, 11, 11]):
+            square = self._cached(
+                file_name,
+                caching.Backend.PICKLE,
+                write_behind=True,
+                flush_every=None,
+                flush_interval=10,
+            )
+
+            square(1)
+            square(2)
+            self.assertFalse(file_name.exists())
+
+            square(3)
+            self.assertEqual(
+                self._stored_keys(file_name, caching.Backend.PICKLE), {1, 2, 3}
+            )
+
+    def test_flush_at_exit(self):
+        """Test that the pending entries are written at interpreter exit."""
+        with patch.object(caching.atexit, "register") as register:
+            square = self._cached(
+                self.directory / "cache.pickle",
+                caching.Backend.PICKLE,
+                write_behind=True,
+            )
+
+        square(2)
+        self.assertFalse((self.directory / "cache.pickle").exists())
+
+        (flush_at_exit,) = register.call_args.args
+        flush_at_exit()
+        self.assertEqual(
+            self._stored_keys(self.directory / "cache.pickle", caching.Backend.PICKLE),
+            {2},
+        )
+
+    def test_atomic_write(self):
+        """Test that a failed write leaves the previous file untouched."""
+        file_name = self.directory / "cache.pickle"
+
+        @caching.persist_to_file(file_name)
+        def identity(x):
+            return x
+
+        identity(1)
+        content = file_name.read_bytes()
+
+        with self.assertRaises(Exception):
+            identity(lambda: None)  # Can not be pickled
+
+        self.assertEqual(file_name.read_bytes(), content)
+        self.assertEqual(
+            [path.name for path in self.directory.iterdir()], ["cache.pickle"]
+        )
+
+    def test_truncated_file(self):
+        """Test that a truncated or corrupted file is treated as an empty cache."""
+        file_name = self.directory / "cache.pickle"
+        self._cached(file_name, caching.Backend.PICKLE)(3)
+        content = file_name.read_bytes()
+
+        for damaged in [content[: len(content) // 2], b"", b"\x00" * 8]:
+            with self.subTest(damaged=damaged[:8]):
+                file_name.write_bytes(damaged)
+                self.calls.clear()
+
+                square = self._cached(file_name, caching.Backend.PICKLE)
+                self.assertEqual(square(3), {"value": 9})
+                self.assertEqual(len(self.calls), 1)
+
+    @unittest.skipIf(os.name == "nt", "Permissions are not supported on Windows")
+    def test_file_mode(self):
+        """Test that a rewritten file keeps its permissions (new files follow the umask)."""
+        file_name = self.directory / "cache.pickle"
+        square = self._cached(file_name, caching.Backend.PICKLE)
+
+        square(1)
+        self.assertEqual(
+            stat.S_IMODE(file_name.stat().st_mode), 0o666 & ~caching._UMASK
+        )
+
+        file_name.chmod(0o640)
+        square(2)
+        self.assertEqual(stat.S_IMODE(file_name.stat().st_mode), 0o640)
+
+    def test_max_entries(self):
+        """Test that the least recently hit entries are evicted when writing."""
+        for backend in [caching.Backend.PICKLE, caching.Backend.SQLITE]:
+            with self.subTest(backend=backend):
+                self.calls.clear()
+                file_name = self.directory / f"bounded.{backend.value}"
+
+                with patch.object(caching.time, "time", side_effect=itertools.count()):
+                    square = self._cached(file_name, backend, max_entries=2)
+                    square(1)
+                    square(2)
+                    square(1)  # Hit: 2 is now the least recently used
+                    square(3)
+
+                    self.assertEqual(self._stored_keys(file_name, backend), {1, 3})
+                    self.assertEqual(square.stats().evictions, 1)
+
+                    square = self._cached(file_name, backend, max_entries=2)
+                    square(3)
+                    square(2)
+
+                self.assertEqual([x for x, _ in self.calls], [1, 2, 3, 2])
+                self.assertEqual(self._stored_keys(file_name, backend), {2, 3})
+
+    def test_max_bytes(self):
+        """Test that entries are evicted until the cache fits in `max_bytes`."""
+        file_name = self.directory / "cache.sqlite"
+        with patch.object(caching.time, "time", side_effect=itertools.count()):
+            square = self._cached(file_name, max_bytes=100)
+            for x in range(10):
+                square(x)
+
+        with sqlite3.connect(file_name) as connection:
+            (size,) = connection.execute(
+                "SELECT SUM(length(key) + length(value)) FROM cache"
+            ).fetchone()
+
+        self.assertLessEqual(size, 100)
+        self.assertIn(9, self._stored_keys(file_name, caching.Backend.SQLITE))
+        self.assertNotIn(0, self._stored_keys(file_name, caching.Backend.SQLITE))
+
+    def test_sqlite_eviction_queries(self):
+        """Test that the SQLite eviction uses the indexes instead of sorting the table."""
+        file_name = self.directory / "cache.sqlite"
+        statements: list[str] = []
+        connect = sqlite3.connect
+
+        def traced_connect(*args, **kwargs):
+            connection = connect(*args, **kwargs)
+            connection.set_trace_callback(statements.append)
+            return connection
+
+        with patch.object(caching._sqlite3, "connect", side_effect=traced_connect):
+            square = self._cached(file_name, max_entries=2, max_bytes=100, ttl=60)
+            for x in range(5):
+                square(x)
+
+        # Only the total size (needed by `max_bytes`) reads every row
+        queries = [
+            statement
+            for statement in statements
+            if statement.startswith(("SELECT", "DELETE")) and "SUM(" not in statement
+        ]
+        self.assertTrue(any("ORDER BY last_hit" in query for query in queries))
+        with sqlite3.connect(file_name) as connection:
+            for query in queries:
+                with self.subTest(query=query):
+                    plan = " ".join(
+                        row[-1]
+                        for row in connection.execute(f"EXPLAIN QUERY PLAN {query}")
+                    )
+                    self.assertNotIn("TEMP B-TREE", plan)
+                    self.assertIn("USING", plan)
+
+    def test_ttl(self):
+        """Test that expired entries are recomputed and evicted when writing."""
+        for backend in [caching.Backend.PICKLE, caching.Backend.SQLITE]:
+            with self.subTest(backend=backend):
+                self.calls.clear()
+                file_name = self.directory / f"expiring.{backend.value}"
+
+                with patch.object(caching.time, "time") as now:
+                    square = self._cached(file_name, backend, ttl=10)
+
+                    now.return_value = 0
+                    square(1)
+                    now.return_value = 1
+                    square(2)
+                    now.return_value = 5
+                    square(1)
+
+                    now.return_value = 12
+                    square(1)  # Expired: computed again (2 is evicted)
+
+                self.assertEqual(self.calls, [(1, True), (2, True), (1, True)])
+                self.assertEqual(self._stored_keys(file_name, backend), {1})
+                self.assertEqual(square.stats().evictions, 1)
+
+    def test_stats(self):
+        """Test the number of entries and the size reported by `stats()`."""
+        for backend in [caching.Backend.PICKLE, caching.Backend.SQLITE]:
+            with self.subTest(backend=backend):
+                file_name = self.directory / f"stats.{backend.value}"
+                square = self._cached(file_name, backend, write_behind=True)
+                self.assertEqual(square.stats().entries, 0)
+
+                square(1)
+                square(2)
+                self.assertEqual(square.stats().entries, 2)
+
+                square.flush()
+                stats = square.stats()
+                self.assertEqual(stats.entries, 2)
+                self.assertGreater(stats.bytes_on_disk, 0)
+                if backend == caching.Backend.PICKLE:
+                    self.assertEqual(stats.bytes_on_disk, file_name.stat().st_size)
+
+    def test_metrics(self):
+        """Test the hits, misses, disabled calls and bytes counted in `metrics`."""
+        for backend in [caching.Backend.PICKLE, caching.Backend.SQLITE]:
+            with self.subTest(backend=backend):
+                file_name = self.directory / f"metrics.{backend.value}"
+                square = self._cached(file_name, backend)
+                start = square.metrics.copy()
+
+                square(1)
+                square(1)
+                square(2, cache=False)
+                square(1, cache=False)
+
+                metrics = square.metrics - start
+                self.assertEqual(
+                    (metrics.hits, metrics.misses, metrics.disabled), (2, 2, 2)
+                )
+                self.assertEqual(metrics.calls, 4)
+                self.assertEqual(metrics.hit_ratio, 0.5)
+                self.assertGreater(metrics.bytes_written, 0)
+                self.assertGreater(metrics.serialization_seconds, 0)
+
+                exported = json.loads(json.dumps(metrics.to_dict()))
+                self.assertEqual(exported["misses"], 2)
+                self.assertEqual(exported["hit_ratio"], 0.5)
+
+    def test_compute_time(self):
+        """Test that the time spent in the function is counted, also when it fails."""
+
+        @caching.persist_to_file(self.directory / "cache.pickle")
+        def fail(x):
+            raise ValueError(x)
+
+        fail.warm()
+
+        # Cache lookup (0 -> 0), then the function call (10 -> 14)
+        with patch.object(caching.time, "perf_counter", side_effect=[0, 0, 10, 14]):
+            with self.assertRaises(ValueError):
+                fail(1)
+
+        self.assertEqual(fail.metrics.misses, 1)
+        self.assertEqual(fail.metrics.compute_seconds, 4)
+
+    def test_legacy_sqlite_schema(self):
+        """Test that a database without timestamps is upgraded."""
+        file_name = self.directory / "cache.sqlite"
+        with sqlite3.connect(file_name) as connection:
+            connection.execute(
+                "CREATE TABLE cache (key TEXT PRIMARY KEY, value BLOB NOT NULL)"
+            )
+            connection.execute(
+                "INSERT INTO cache VALUES (?, ?)",
+                (json.dumps([4]), pickle.dumps({"value": 16})),
+            )
+        connection.close()
+
+        square = self._cached(file_name, max_entries=1)
+        self.assertEqual(square(4), {"value": 16})
+        square(5)
+
+        self.assertEqual(self.calls, [(5, True)])
+        self.assertEqual(self._stored_keys(file_name, caching.Backend.SQLITE), {5})
+
+    @staticmethod
+    def _stored_keys(file_name: Path, backend: caching.Backend) -> set:
+        """Returns the (first argument of the) keys written to the cache file."""
+        if backend == caching.Backend.SQLITE:
+            with sqlite3.connect(file_name) as connection:
+                return {
+                    json.loads(key)[0]
+                    for (key,) in connection.execute("SELECT key FROM cache")
+                }
+
+        with open(file_name, "rb") as f:
+            return {key[0] for key in pickle.load(f)["data"]}
+
+    def test_invalid_backend(self):
+        """Test that an unknown backend raises an error."""
+        with self.assertRaises(ValueError):
+            caching.persist_to_file("cache", backend="xml")  # type: ignore[arg-type]
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,184 @@
+import os
+from pathlib import Path
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from veryeasyfatt.shared import columnar
+from veryeasyfatt.shared.fingerprint import FileFingerprint, is_unchanged
+
+
+class ColumnarTestCase(unittest.TestCase):
+    # Do not use the docstring as the test name.
+    shortDescription = lambda self: None
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.directory = Path(self._directory.name)
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def test_round_trip(self):
+        """Test that values and dtypes are preserved (missing values are loaded as `NaN`)."""
+        df = pd.DataFrame(
+            {
+                "text": ["ROMA", np.nan, "", "ROMA", "Caffè"],
+                "integer": [1, 2, 3, 4, 5],
+                "float": [1.5, np.nan, 2.0, 0.0, -1.0],
+                "boolean": [True, False, True, True, False],
+                "date": pd.to_datetime(["2023-01-30"] * 5),
+                "mixed": pd.Series([1, "a", np.nan, 2.5, "b"], dtype=object),
+                "empty": pd.Series([np.nan] * 5, dtype=object),
+            }
+        )
+
+        columnar.write_table(df, self.directory / "table")
+        pd.testing.assert_frame_equal(columnar.read_table(self.directory / "table"), df)
+        pd.testing.assert_frame_equal(
+            columnar.read_table(self.directory / "table", mmap=False), df
+        )
+
+    def test_projection(self):
+        """Test that only the requested columns are loaded."""
+        df = pd.DataFrame({"a": ["x", "y"], "b": [1, 2], "c": [0.5, 1.5]})
+        columnar.write_table(df, self.directory / "table")
+
+        self.assertEqual(
+            columnar.read_columns(self.directory / "table"), ["a", "b", "c"]
+        )
+        pd.testing.assert_frame_equal(
+            columnar.read_table(self.directory / "table", columns=["c", "a", "z"]),
+            df[["a", "c"]],
+        )
+
+    def test_empty_table(self):
+        """Test that a table without rows keeps its columns."""
+        df = pd.DataFrame({"a": ["x"], "b": [1]}).iloc[:0]
+        columnar.write_table(df, self.directory / "table")
+
+        self.assertEqual(
+            list(columnar.read_table(self.directory / "table").columns), ["a", "b"]
+        )
+
+    def test_replace(self):
+        """Test that an existing table is replaced, without leaving temporary files behind."""
+        columnar.write_table(pd.DataFrame({"a": [1]}), self.directory / "table")
+        columnar.write_table(pd.DataFrame({"b": ["x"]}), self.directory / "table")
+
+        self.assertEqual(
+            columnar.read_table(self.directory / "table").to_dict("list"), {"b": ["x"]}
+        )
+        self.assertEqual([path.name for path in self.directory.iterdir()], ["table"])
+
+    def test_mmap(self):
+        """Test that numeric columns stay memory-mapped and can be modified without changing the files."""
+        df = pd.DataFrame({"text": ["x", "y", "z"], "integer": [1, 2, 3]})
+        columnar.write_table(df, self.directory / "table")
+
+        def memory_mapped(values: np.ndarray) -> bool:
+            while values is not None:
+                if isinstance(values, np.memmap):
+                    return True
+                values = values.base
+            return False
+
+        loaded = columnar.read_table(self.directory / "table")
+        self.assertTrue(memory_mapped(loaded["integer"].to_numpy()))
+        self.assertFalse(
+            memory_mapped(
+                columnar.read_table(self.directory / "table", mmap=False)[
+                    "integer"
+                ].to_numpy()
+            )
+        )
+
+        loaded.loc[0, "integer"] = 10
+        loaded["integer"] += 1
+        self.assertEqual(loaded["integer"].tolist(), [11, 3, 4])
+        pd.testing.assert_frame_equal(columnar.read_table(self.directory / "table"), df)
+
+    def test_verify(self):
+        """Test that missing or truncated column files are detected."""
+        df = pd.DataFrame(
+            {
+                "text": ["ROMA", "MILANO"],
+                "integer": [1, 2],
+                "mixed": pd.Series([1, "a"], dtype=object),
+            }
+        )
+
+        for damage in ["0.npy", "0.values.npy", "1.npy", "2.npy"]:
+            with self.subTest(damage=damage):
+                table = self.directory / "table"
+                columnar.write_table(df, table)
+                columnar.verify_table(table)
+
+                content = (table / damage).read_bytes()
+                (table / damage).write_bytes(content[: len(content) - 4])
+                with self.assertRaises(ValueError):
+                    columnar.verify_table(table)
+
+                (table / damage).unlink()
+                with self.assertRaises(OSError):
+                    columnar.verify_table(table)
+
+
+class FingerprintTestCase(unittest.TestCase):
+    # Do not use the docstring as the test name.
+    shortDescription = lambda self: None
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.file = Path(self._directory.name) / "file.txt"
+        self.file.write_text("content")
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def _touch(self):
+        stat = self.file.stat()
+        os.utime(self.file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    def test_same_stat(self):
+        """Test that an untouched file is unchanged, without computing its hash."""
+        unchanged, current = is_unchanged(FileFingerprint.of(self.file), self.file)
+
+        self.assertTrue(unchanged)
+        self.assertIsNone(current.digest)
+
+    def test_same_content(self):
+        """Test that the hash is compared when only the modification time changed."""
+        stored = FileFingerprint.of(self.file, with_digest=True)
+        self._touch()
+
+        unchanged, current = is_unchanged(stored, self.file)
+        self.assertTrue(unchanged)
+        self.assertEqual(current.digest, stored.digest)
+        self.assertNotEqual(current.mtime_ns, stored.mtime_ns)
+
+        self.file.write_text("CONTENT")
+        self._touch()
+        self.assertFalse(is_unchanged(stored, self.file)[0])
+
+    def test_different_size(self):
+        """Test that a file with a different size is changed."""
+        stored = FileFingerprint.of(self.file, with_digest=True)
+        self.file.write_text("longer content")
+
+        self.assertFalse(is_unchanged(stored, self.file)[0])
+        self.assertFalse(is_unchanged(None, self.file)[0])
+
+    def test_serialization(self):
+        """Test that fingerprints can be saved as a dictionary."""
+        fingerprint = FileFingerprint.of(self.file, with_digest=True)
+
+        self.assertEqual(FileFingerprint.from_dict(fingerprint.to_dict()), fingerprint)
+        self.assertIsNone(FileFingerprint.from_dict({"size": 1}))
+        self.assertIsNone(FileFingerprint.from_dict(None))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -3,6 +3,8 @@ import sys
 from typing import Literal
 import unittest
 
+from dynaconf import ValidationError
+
 from veryeasyfatt.configuration import _get_settings
 
 # Hack needed to include scripts from the `scripts` directory (under root)
@@ -157,6 +159,105 @@ class ConfigurationValuesTestCase(unittest.TestCase):
             [Path("Soggetti.xlsx"), Path("Soggetti.ods")],
         )
 
+    @with_temporary_file(
+        file_prefix="veryeasyfatt-",
+        file_suffix=".toml",
+        content="""
+        [easyfatt.customers]
+        export_filename = ""
+    """,
+    )
+    def test_disabled(self, temp_config_file: Path):
+        settings = _get_settings()
+        settings.reload_settings(temp_config_file)
+
+        self.assertHasKey(settings, "easyfatt.customers.export_filename")
+        self.assertIsNone(settings.easyfatt.customers.export_filename)
+
+    @with_temporary_file(
+        file_prefix="veryeasyfatt-",
+        file_suffix=".toml",
+        content="""
+        [options.batch]
+        generate_kml = "false"
+    """,
+    )
+    def test_boolean_string(self, temp_config_file: Path):
+        settings = _get_settings()
+        settings.reload_settings(temp_config_file)
+
+        self.assertIs(settings.options.batch.generate_kml, False)
+
+    @with_temporary_file(
+        file_prefix="veryeasyfatt-",
+        file_suffix=".toml",
+        content="""
+        [options.batch]
+        generate_kml = true
+    """,
+    )
+    def test_boolean(self, temp_config_file: Path):
+        settings = _get_settings()
+        settings.reload_settings(temp_config_file)
+
+        self.assertIs(settings.options.batch.generate_kml, True)
+
+    @with_temporary_file(
+        file_prefix="veryeasyfatt-",
+        file_suffix=".toml",
+        content="""
+        [options.output]
+        parallel_workers = " 4 "
+    """,
+    )
+    def test_integer_string(self, temp_config_file: Path):
+        settings = _get_settings()
+        settings.reload_settings(temp_config_file)
+
+        self.assertEqual(settings.options.output.parallel_workers, 4)
+
+    @with_temporary_file(
+        file_prefix="veryeasyfatt-",
+        file_suffix=".toml",
+        content="""
+        [options.output]
+        parallel_workers = -1
+    """,
+    )
+    def test_negative_integer(self, temp_config_file: Path):
+        settings = _get_settings()
+
+        with self.assertRaises(ValidationError):
+            settings.reload_settings(temp_config_file)
+
+    @with_temporary_file(
+        file_prefix="veryeasyfatt-",
+        file_suffix=".toml",
+        content="""
+        [options.xml]
+        parser = " LXML "
+    """,
+    )
+    def test_case_insensitive_choice(self, temp_config_file: Path):
+        settings = _get_settings()
+        settings.reload_settings(temp_config_file)
+
+        self.assertEqual(settings.options.xml.parser, "lxml")
+
+    @with_temporary_file(
+        file_prefix="veryeasyfatt-",
+        file_suffix=".toml",
+        content="""
+        [options.xml]
+        parser = "sax"
+    """,
+    )
+    def test_invalid_choice(self, temp_config_file: Path):
+        settings = _get_settings()
+
+        with self.assertRaises(ValidationError):
+            settings.reload_settings(temp_config_file)
+
 
 if __name__ == "__main__":
     unittest.main(verbosity=2)
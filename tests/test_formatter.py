@@ -88,4 +88,60 @@ class FormatterCommandsTestCase(unittest.TestCase):
         self.assertEqual(
             self.formatter.format('{var!a}', var="HeLlO WOrLD!"),
             "'HeLlO WOrLD!'",
-        )
\ No newline at end of file
+        )
+
+class CompiledTemplateTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.formatter = simpleformatter.SimpleFormatter()
+        return super().setUp()
+
+    def test_same_as_format(self):
+        """ The compiled template must render exactly like `format` """
+        for template in [
+            '{var:s->lowercase}',
+            '{var:s->uppercase->substring(6)}',
+            '{var:s->substring(6, -1)}',
+            '{var:s->replace("HeLlO ", " GooDByE ")->title}',
+            '{var:.5}',
+            '{var:*>20}',
+            '{var!r:s->uppercase}',
+            '{var:{width}}|',
+            '@{var} {other}@{var:s->capitalize}^',
+            'no fields at all',
+        ]:
+            self.assertEqual(
+                self.formatter.compile(template)(var="HeLlO WOrLD!", other=12, width=15),
+                self.formatter.format(template, var="HeLlO WOrLD!", other=12, width=15),
+                f"Template '{template}' should render like `format`"
+            )
+
+    def test_positional(self):
+        self.assertEqual(self.formatter.compile('{} {}')("a", "b"), "a b")
+        self.assertEqual(self.formatter.compile('{1} {0:s->uppercase}')("a", "b"), "b A")
+
+        with self.assertRaises(ValueError):
+            self.formatter.compile('{} {0}')
+
+    def test_reusable(self):
+        template = self.formatter.compile('{name:s->title} ({code})')
+
+        self.assertEqual(template(name="mario rossi", code="00001"), "Mario Rossi (00001)")
+        self.assertEqual(template(name="LUIGI VERDI", code="00002"), "Luigi Verdi (00002)")
+
+    def test_sandboxed(self):
+        """ Sandboxing rules are enforced when the template is compiled """
+        with self.assertRaises(simpleformatter.InvalidFormatError):
+            self.formatter.compile('{var[test]}')
+
+        with self.assertRaises(simpleformatter.InvalidFormatError):
+            self.formatter.compile('{var.__class__}')
+
+        unsafe_formatter = simpleformatter.SimpleFormatter(sandboxed=False)
+        self.assertEqual(
+            unsafe_formatter.compile('{var[test]}')(var={"test": "value"}),
+            "value",
+        )
+
+    def test_unknown_command(self):
+        with self.assertRaises(simpleformatter.UnknownCommandError):
+            self.formatter.compile('{var:s->unknown}')
@@ -0,0 +1,63 @@
+import unittest
+
+import pandas as pd
+
+from veryeasyfatt.shared.measuring import unit_registry
+from veryeasyfatt.shared.weights import parse_weights
+
+
+class WeightsTestCase(unittest.TestCase):
+    # Do not use the docstring as the test name.
+    shortDescription = lambda self: None
+
+    def test_italian_format(self):
+        """Test that `.` is parsed as the thousands separator and `,` as the decimal one."""
+        self.assertEqual(
+            parse_weights(
+                pd.Series(["12,5 Kg", "1.234,5 kg", "1.000 g", "7kg"])
+            ).tolist(),
+            [12_500.0, 1_234_500.0, 1_000.0, 7_000.0],
+        )
+
+    def test_units(self):
+        """Test that all the supported units are converted to grams."""
+        self.assertEqual(
+            parse_weights(
+                pd.Series(
+                    ["500 mg", "1 G", "2 Kg", "1,5 q", "1 T", "3 Chili", "2 quintali"]
+                )
+            ).tolist(),
+            [0.5, 1.0, 2_000.0, 150_000.0, 1_000_000.0, 3_000.0, 200_000.0],
+        )
+
+    def test_missing_values(self):
+        """Test that missing values are kept as NaN and ignored by the sum."""
+        result = parse_weights(pd.Series([None, "2 kg", float("nan")], index=[3, 4, 5]))
+
+        self.assertEqual(result.index.tolist(), [3, 4, 5])
+        self.assertTrue(result[[3, 5]].isna().all())
+        self.assertEqual(result.sum(), 2_000.0)
+
+    def test_invalid_values(self):
+        """Test that values without a known unit are rejected."""
+        for value in ["12,5", "12 lb", "kg", "abc"]:
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                parse_weights(pd.Series(["1 kg", value]))
+
+    def test_same_as_pint(self):
+        """Test that the result is the same as the one computed by `pint`."""
+        values = ["12,5 Kg", "1.234,5 kg", "350 g", "1,5 q", "2 t"]
+
+        self.assertEqual(
+            parse_weights(pd.Series(values)).tolist(),
+            [
+                unit_registry.Quantity(v.replace(".", "").replace(",", ".").lower())
+                .to("g")
+                .magnitude
+                for v in values
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)